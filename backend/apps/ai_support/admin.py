@@ -5,6 +5,9 @@ from .models import OrderSummary
 
 @admin.register(OrderSummary)
 class OrderSummaryAdmin(admin.ModelAdmin):
-    list_display = ('user', 'last_updated')
+    list_display = ('user', 'last_updated', 'rebuilt_at', 'regenerations', 'average_prompt_tokens')
     search_fields = ('user__email',)
-    readonly_fields = ('user', 'summary', 'last_updated')
\ No newline at end of file
+    readonly_fields = (
+        'user', 'summary', 'last_updated', 'last_order', 'rebuilt_at',
+        'regenerations', 'prompt_tokens_total', 'average_prompt_tokens',
+    )
\ No newline at end of file
@@ -1,84 +1,229 @@
 # week5/backend/apps/ai_support/management/commands/generate_initial_summaries.py
 
 import asyncio
-from django.core.management.base import BaseCommand
+import json
+import os
+import time
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from apps.orders.models import Order
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.utils import timezone
+from apps.orders.models import Order, OrderItem
+from apps.products.ai_utils import AsyncRateLimiter
 from apps.ai_support.models import OrderSummary
-from asgiref.sync import sync_to_async
+from apps.ai_support.summaries import (
+    NEWEST_ORDER_FIRST, estimate_tokens, format_order, full_history_prompt, prompt_token_count,
+)
 
 User = get_user_model()
 
+
 class Command(BaseCommand):
     help = 'Generates initial order summaries for all users with existing orders.'
 
-    async def _generate_summary(self, user):
-        """Asynchronous helper to generate summary for a single user."""
-        self.stdout.write(f"Processing user: {user.email}")
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=5, help='Maximum simultaneous model calls.')
+        parser.add_argument('--rate-limit', type=float, default=60, help='Maximum model calls per minute.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Users loaded, written (and checkpointed) together.')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many users.')
+        parser.add_argument('--checkpoint', type=str, default='generate_initial_summaries_checkpoint.json',
+                            help='File recording progress, so an interrupted run resumes where it stopped.')
+        parser.add_argument('--reset', action='store_true', help='Ignore the checkpoint and start from the beginning.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Build the prompts and report their size without calling the model or writing anything.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        if not options['dry_run'] and not getattr(settings, 'GEMINI_API_KEY', None):
+            raise CommandError("GEMINI_API_KEY is not configured.")
+
+        self.checkpoint = self.load_checkpoint()
+        self.started = time.perf_counter()
+        self.processed = self.updated = self.discarded = self.prompt_tokens = 0
+        self.failures = []
+        self.completed = False
 
-        # Use sync_to_async to query the database asynchronously
-        orders = await sync_to_async(list)(
-            Order.objects.filter(user=user).prefetch_related(
-                'items', 'items__product', 'items__product__category'
-            ).order_by('-created_at')
+        self.stdout.write(
+            f"{'Dry run: ' if options['dry_run'] else ''}Generating order summaries for users after ID {self.checkpoint['last_id']} "
+            f"(retrying {len(self.checkpoint['failed_ids'])} failed earlier)..."
         )
+        asyncio.run(self.run())
+        if self.completed and not options['dry_run']:
+            if self.checkpoint['failed_ids']:
+                self.stdout.write(f"{len(self.checkpoint['failed_ids'])} failed users will be retried on the next run.")
+            else:
+                self.clear_checkpoint()
 
-        if not orders:
-            self.stdout.write(f"No orders found for {user.email}. Skipping.")
-            return
+        elapsed = time.perf_counter() - self.started
+        for user_id, reason in self.failures[:20]:
+            self.stderr.write(f"User {user_id}: {reason}")
+        average = round(self.prompt_tokens / self.updated) if self.updated else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Finished. {self.updated} {'would be generated' if options['dry_run'] else 'generated'}, "
+            f"{len(self.failures)} failed, {self.discarded} kept a newer summary, {self.processed} processed in {elapsed:.1f}s "
+            f"({self.processed / elapsed if elapsed else 0:.2f} users/sec, {average} prompt tokens on average)."
+        ))
+
+    def users(self):
+        has_orders = Exists(Order.objects.filter(user_id=OuterRef('pk')))
+        return User.objects.filter(has_orders).order_by('pk').only('id', 'email')
 
-        order_details_list = []
+    def load_orders(self, user_ids) -> dict:
+        """
+        Every order of the given users, newest first, grouped by user.
+        Two queries for the whole batch: the orders and their items.
+        """
+        items = OrderItem.objects.select_related('product__category').only(
+            'order_id', 'quantity', 'product__name', 'product__category__name'
+        )
+        orders = Order.objects.filter(user_id__in=user_ids).order_by(*NEWEST_ORDER_FIRST)\
+            .only('id', 'user_id', 'created_at', 'total_price')\
+            .prefetch_related(Prefetch('items', queryset=items))
+        by_user = defaultdict(list)
         for order in orders:
-            item_list = ", ".join([
-                f"{item.quantity}x {item.product.name} (Category: {item.product.category.name})"
-                for item in order.items.all()
-            ])
-            # NOTE: Assumes a 'status' field might exist on your Order model.
-            # Defaults to 'Shipped' if not present.
-            status = getattr(order, 'status', 'Shipped')
-            order_details_list.append(
-                f"- Order #{order.id} on {order.created_at.strftime('%Y-%m-%d')}: "
-                f"Items: {item_list}. Status: {status}."
+            by_user[order.user_id].append(order)
+        return by_user
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        limiter = AsyncRateLimiter(self.options['rate_limit'])
+        limit = self.options['limit']
+        llm = None
+        if not self.options['dry_run']:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=settings.GEMINI_API_KEY)
+
+        # Users that failed in an earlier run are retried first; the ones
+        # failing in this run are only recorded for the next one
+        retry_ids = self.checkpoint['failed_ids']
+        failed_ids = []
+
+        while limit is None or self.processed < limit:
+            size = self.options['batch_size'] if limit is None else min(self.options['batch_size'], limit - self.processed)
+            if retry_ids:
+                ids, retry_ids = retry_ids[:size], retry_ids[size:]
+                users = await sync_to_async(list)(self.users().filter(pk__in=ids))
+            else:
+                # Keyset pagination on the primary key, resuming from the checkpoint
+                users = await sync_to_async(list)(self.users().filter(pk__gt=self.checkpoint['last_id'])[:size])
+                if not users:
+                    self.completed = True
+                    break
+                self.checkpoint['last_id'] = users[-1].pk
+            user_ids = [user.pk for user in users]
+            orders = await sync_to_async(self.load_orders)(user_ids)
+            previous = await sync_to_async(self.load_previous)(user_ids)
+
+            failures_before = len(self.failures)
+            results = await asyncio.gather(*(
+                self.summarize(user, orders.get(user.pk, []), llm, semaphore, limiter) for user in users
+            ))
+            summaries = [summary for summary in results if summary is not None]
+            self.prompt_tokens += sum(summary.prompt_tokens_total for summary in summaries)
+            written = len(summaries)
+            if summaries and not self.options['dry_run']:
+                written = await sync_to_async(self.save_summaries)(summaries, previous)
+
+            self.processed += len(users)
+            self.updated += written
+            self.discarded += len(summaries) - written
+            failed_ids += [user_id for user_id, _ in self.failures[failures_before:]]
+            self.checkpoint['failed_ids'] = retry_ids + failed_ids
+            if not self.options['dry_run']:
+                self.save_checkpoint()
+
+            elapsed = time.perf_counter() - self.started
+            self.stdout.write(
+                f"{self.processed} processed, {self.updated} generated, {len(self.failures)} failed "
+                f"({self.processed / elapsed:.2f} users/sec, {self.prompt_tokens} prompt tokens)"
             )
-        order_history_text = "\n".join(order_details_list)
 
-        prompt = f"""
-        Based on the following order history for a customer, provide a very concise, one-paragraph summary.
-        Mention key product categories they seem interested in and the status of their most recent orders.
+    async def summarize(self, user, orders, llm, semaphore, limiter):
+        """
+        Returns an unsaved OrderSummary for the user, or None if it failed.
+        """
+        if not orders:
+            return None
+        prompt = full_history_prompt("\n".join(format_order(order) for order in orders))
+        summary = OrderSummary(
+            user_id=user.pk,
+            last_order_id=orders[0].id,
+            last_order_at=orders[0].created_at,
+            regenerations=1,
+            prompt_tokens_total=estimate_tokens(prompt),
+        )
+        if llm is None:
+            return summary
+
+        async with semaphore:
+            await limiter.wait()
+            try:
+                ai_response = await llm.ainvoke(prompt)
+            except Exception as e:
+                self.failures.append((user.pk, str(e)))
+                return None
 
-        Order History:
-        {order_history_text}
+        summary.summary = ai_response.content.strip()
+        summary.prompt_tokens_total = prompt_token_count(ai_response, prompt)
+        summary.rebuilt_at = timezone.now()
+        return summary
 
-        Summary:
+    def load_previous(self, user_ids) -> dict:
+        """
+        The newest order each existing summary of these users covers.
         """
+        return dict(OrderSummary.objects.filter(user_id__in=user_ids).values_list('user_id', 'last_order_id'))
 
-        try:
-            llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=settings.GEMINI_API_KEY)
-            ai_response = await llm.ainvoke(prompt)
-            summary_text = ai_response.content.strip()
+    @transaction.atomic
+    def save_summaries(self, summaries, previous) -> int:
+        """
+        Creates the missing summaries with one insert. An existing summary is
+        only replaced if it still covers the order it covered when the batch
+        was read (the guard save_summary uses), so a newer summary written
+        meanwhile by the background job is kept. Returns how many were written.
+        """
+        new = [summary for summary in summaries if summary.user_id not in previous]
+        # A summary created meanwhile is newer than the one generated here
+        OrderSummary.objects.bulk_create(new, ignore_conflicts=True)
 
-            # Use sync_to_async for the database update
-            await sync_to_async(OrderSummary.objects.update_or_create)(
-                user=user,
-                defaults={'summary': summary_text}
+        written = len(new)
+        for summary in summaries:
+            if summary.user_id not in previous:
+                continue
+            written += OrderSummary.objects.filter(
+                user_id=summary.user_id, last_order_id=previous[summary.user_id]
+            ).update(
+                summary=summary.summary,
+                last_order_id=summary.last_order_id,
+                last_order_at=summary.last_order_at,
+                rebuilt_at=summary.rebuilt_at,
+                last_updated=timezone.now(),
+                regenerations=F('regenerations') + 1,
+                prompt_tokens_total=F('prompt_tokens_total') + summary.prompt_tokens_total,
             )
-            self.stdout.write(self.style.SUCCESS(f"Successfully generated summary for {user.email}"))
+        return written
 
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"Failed to generate summary for {user.email}: {e}"))
+    def load_checkpoint(self) -> dict:
+        path = self.options['checkpoint']
+        if self.options['reset'] or not os.path.exists(path):
+            return {'last_id': 0, 'failed_ids': []}
+        try:
+            with open(path) as f:
+                return {'failed_ids': [], **json.load(f)}
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read checkpoint {path}: {e}. Use --reset to start over.")
 
-    def handle(self, *args, **options):
-        """The main entry point for the management command."""
-        async def main():
-            # Get users with orders asynchronously
-            users_with_orders = await sync_to_async(list)(
-                User.objects.filter(orders__isnull=False).distinct()
-            )
-            tasks = [self._generate_summary(user) for user in users_with_orders]
-            await asyncio.gather(*tasks)
+    def save_checkpoint(self):
+        path = self.options['checkpoint']
+        # Write then rename, so a crash never leaves a half-written checkpoint
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(f'{path}.tmp', path)
 
-        self.stdout.write("Starting generation of initial order summaries...")
-        asyncio.run(main())
-        self.stdout.write(self.style.SUCCESS("Finished processing all users."))
\ No newline at end of file
+    def clear_checkpoint(self):
+        if os.path.exists(self.options['checkpoint']):
+            os.remove(self.options['checkpoint'])
@@ -0,0 +1,64 @@
+# apps/ai_support/management/commands/refresh_stale_summaries.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from apps.ai_support.summaries import MAX_WORKERS, generate_summary_in_background, summary_health, users_needing_summary
+
+
+def refresh(user_id) -> bool:
+    try:
+        return generate_summary_in_background(user_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Regenerates the order summaries that are missing or do not reflect the newest order.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Summaries generated at the same time.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Users loaded together.')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many users.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many summaries would be refreshed.')
+
+    def handle(self, *args, **options):
+        health = summary_health()
+        self.stdout.write(f"{health['missing']} missing and {health['stale']} stale summaries.")
+        if options['dry_run'] or not (health['missing'] or health['stale']):
+            return
+        if not getattr(settings, 'GEMINI_API_KEY', None):
+            raise CommandError("GEMINI_API_KEY is not configured.")
+
+        limit = options['limit']
+        started = time.perf_counter()
+        processed = updated = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='summary-refresh') as executor:
+            while limit is None or processed < limit:
+                size = options['batch_size'] if limit is None else min(options['batch_size'], limit - processed)
+                # Keyset pagination: refreshed users drop out of the selection, the rest are after last_id
+                user_ids = list(
+                    users_needing_summary().filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:size]
+                )
+                if not user_ids:
+                    break
+
+                results = list(executor.map(refresh, user_ids))
+                processed += len(user_ids)
+                updated += sum(results)
+                last_id = user_ids[-1]
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{processed} processed, {updated} refreshed, {processed - updated} not updated "
+                    f"({processed / elapsed:.2f} users/sec)"
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Finished. {updated} of {processed} summaries refreshed in {elapsed:.1f}s. "
+            f"Failures are logged by apps.ai_support.summaries."
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_support', '0001_initial'),
+        ('orders', '0006_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordersummary',
+            name='last_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orders.order'),
+        ),
+        migrations.AddField(
+            model_name='ordersummary',
+            name='prompt_tokens_total',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ordersummary',
+            name='rebuilt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ordersummary',
+            name='regenerations',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_order_at(apps, schema_editor):
+    OrderSummary = apps.get_model('ai_support', 'OrderSummary')
+    Order = apps.get_model('orders', 'Order')
+    created_at = Order.objects.filter(pk=models.OuterRef('last_order_id')).values('created_at')[:1]
+    OrderSummary.objects.filter(last_order__isnull=False).update(last_order_at=models.Subquery(created_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_support', '0002_ordersummary_incremental'),
+        ('orders', '0006_order_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordersummary',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_last_order_at, migrations.RunPython.noop),
+    ]
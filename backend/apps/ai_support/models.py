@@ -16,6 +16,28 @@ class OrderSummary(models.Model):
         help_text="AI-generated summary of the user's order history."
     )
     last_updated = models.DateTimeField(auto_now=True)
+    # Newest order the summary covers; later orders are folded in incrementally
+    last_order = models.ForeignKey(
+        'orders.Order',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    # Creation time of that order, to find the orders placed after it and to
+    # tell how far behind a stale summary is
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    # When the summary was last rebuilt from the complete order history
+    rebuilt_at = models.DateTimeField(null=True, blank=True)
+    # Regenerations so far and the prompt tokens they sent to the model
+    regenerations = models.PositiveIntegerField(default=0)
+    prompt_tokens_total = models.PositiveBigIntegerField(default=0)
 
     def __str__(self):
-        return f"Order Summary for {self.user.email}"
\ No newline at end of file
+        return f"Order Summary for {self.user.email}"
+
+    @property
+    def average_prompt_tokens(self):
+        if not self.regenerations:
+            return None
+        return round(self.prompt_tokens_total / self.regenerations)
\ No newline at end of file
@@ -0,0 +1,363 @@
+# apps/ai_support/summaries.py
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery
+from django.utils import timezone
+from apps.orders.models import Order
+from .models import OrderSummary
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# A summary is regenerated once no new order arrived for DEBOUNCE_SECONDS,
+# but never later than MAX_DELAY_SECONDS after the first pending order
+DEBOUNCE_SECONDS = 30
+MAX_DELAY_SECONDS = 5 * 60
+# How long a worker waits on exit for the pending summaries to be written
+FLUSH_TIMEOUT_SECONDS = 2 * 60
+# Summaries generated at the same time (one LLM call each)
+MAX_WORKERS = 2
+# Incremental updates send the model only the previous summary and the new
+# orders. The summary is rebuilt from the whole history once it is this old,
+# or when more orders than this arrived since it was written.
+FULL_REBUILD_AFTER = timedelta(days=30)
+FULL_REBUILD_MAX_NEW_ORDERS = 20
+
+# The newest order is the first one in this order, which is also the order
+# of order_user_created_idx and of the order history
+NEWEST_ORDER_FIRST = ('-created_at', '-id')
+
+_condition = threading.Condition()
+# user_id -> (due, first_requested), on the time.monotonic() clock
+_pending = {}
+_running = set()
+_scheduler = None
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='order-summary')
+
+
+def request_summary(user_id: int):
+    """
+    Schedules a regeneration of the user's order summary. Requests for the
+    same user coalesce into one job that runs after a quiet period, and a
+    user is never summarized twice at the same time. Call it through
+    transaction.on_commit so the job sees the committed order.
+    Requests only live in this process: call flush_pending_summaries()
+    before it exits. A request lost anyway (a crash) leaves the summary
+    behind the newest order, so refresh_stale_summaries regenerates it.
+    """
+    now = time.monotonic()
+    with _condition:
+        _, first_requested = _pending.get(user_id, (None, now))
+        _pending[user_id] = (min(now + DEBOUNCE_SECONDS, first_requested + MAX_DELAY_SECONDS), first_requested)
+        _ensure_scheduler()
+        _condition.notify_all()
+
+
+def flush_pending_summaries(timeout: float = FLUSH_TIMEOUT_SECONDS) -> bool:
+    """
+    Makes every pending request due now and waits until all summary jobs
+    have finished. Returns False if some were still pending or running
+    after `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    with _condition:
+        if not _pending and not _running:
+            return True
+        now = time.monotonic()
+        for user_id, (_, first_requested) in _pending.items():
+            _pending[user_id] = (now, first_requested)
+        _ensure_scheduler()
+        _condition.notify_all()
+        while _pending or _running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"{len(_pending) + len(_running)} order summaries were not written before exiting")
+                return False
+            _condition.wait(remaining)
+    return True
+
+
+def _ensure_scheduler():
+    global _scheduler
+    if _scheduler is None or not _scheduler.is_alive():
+        _scheduler = threading.Thread(target=_scheduler_loop, name='order-summary-scheduler', daemon=True)
+        _scheduler.start()
+
+
+def _take_due(now: float) -> list:
+    """
+    Moves the requests that are due, except for users whose summary is
+    being generated, from _pending to _running. Call with _condition held.
+    """
+    due = [user_id for user_id, (when, _) in _pending.items() if when <= now and user_id not in _running]
+    for user_id in due:
+        del _pending[user_id]
+        _running.add(user_id)
+    return due
+
+
+def _scheduler_loop():
+    while True:
+        with _condition:
+            now = time.monotonic()
+            due = _take_due(now)
+            if not due:
+                # Sleep until the next job is due, or until a request or a finished job wakes us
+                waiting = [when for user_id, (when, _) in _pending.items() if user_id not in _running]
+                timeout = max(min(waiting) - now, 0) if waiting else None
+                _condition.wait(timeout)
+                continue
+        for user_id in due:
+            _executor.submit(_run_job, user_id)
+
+
+def _run_job(user_id):
+    try:
+        generate_summary_in_background(user_id)
+    finally:
+        close_old_connections()
+        with _condition:
+            _running.discard(user_id)
+            # A request that arrived during the job may be due already
+            _condition.notify_all()
+
+
+def format_order(order) -> str:
+    item_list = ", ".join([
+        f"{item.quantity}x {item.product.name} (Category: {item.product.category.name})"
+        for item in order.items.all()
+    ])
+    status = getattr(order, 'status', 'Shipped')
+    return (
+        f"- Order #{order.id} on {order.created_at.strftime('%Y-%m-%d')}: "
+        f"Items: {item_list}. Status: {status}. Total: ${order.total_price}"
+    )
+
+
+def full_history_prompt(order_history_text: str) -> str:
+    return f"""
+        Based on the following order history for a customer, provide a comprehensive but concise summary that includes:
+        
+        1. Their  orders with specific order numbers and key items (make sure to add all orders with details)
+        2. Overall purchasing patterns and favorite product categories  
+        3. Order frequency and typical purchase amounts
+        4. Any recent order statuses
+        
+        The summary should enable answering questions like "what was my second last order" or "what did I buy before that".
+
+        Order History:
+        {order_history_text}
+
+        Provide a detailed summary (a few sentences):
+        """
+
+
+def incremental_prompt(previous_summary: str, new_orders_text: str) -> str:
+    return f"""
+        Below is the current summary of a customer's order history, followed by the orders they placed since it was written.
+        Rewrite the summary so it also covers the new orders. Keep the same structure:
+
+        1. Their  orders with specific order numbers and key items (keep every order already listed and add the new ones)
+        2. Overall purchasing patterns and favorite product categories
+        3. Order frequency and typical purchase amounts
+        4. Any recent order statuses
+
+        The summary should enable answering questions like "what was my second last order" or "what did I buy before that".
+
+        Current Summary:
+        {previous_summary}
+
+        New Orders:
+        {new_orders_text}
+
+        Provide the updated summary (a few sentences):
+        """
+
+
+def placed_after(summary) -> Q:
+    """
+    The orders after the newest order the summary covers, in NEWEST_ORDER_FIRST order.
+    """
+    if summary.last_order_at is None:
+        return Q(id__gt=summary.last_order_id)
+    return Q(created_at__gt=summary.last_order_at) | Q(created_at=summary.last_order_at, id__gt=summary.last_order_id)
+
+
+def needs_full_rebuild(summary, new_order_count: int) -> bool:
+    """
+    A summary is rebuilt from the whole history when it does not say which
+    orders it covers, when it was last rebuilt too long ago, or when too
+    many orders arrived since; otherwise only the new orders are folded in.
+    """
+    if summary is None or summary.last_order_id is None or summary.rebuilt_at is None:
+        return True
+    if new_order_count > FULL_REBUILD_MAX_NEW_ORDERS:
+        return True
+    return timezone.now() - summary.rebuilt_at > FULL_REBUILD_AFTER
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return max(len(text) // 4, 1)
+
+
+def prompt_token_count(response, prompt: str) -> int:
+    usage = getattr(response, 'usage_metadata', None) or {}
+    return usage.get('input_tokens') or estimate_tokens(prompt)
+
+
+def save_summary(user_id, previous, text: str, last_order, full: bool, prompt_tokens: int) -> bool:
+    """
+    Stores a regenerated summary. An existing summary is only replaced if it
+    still covers the orders it covered when the job read it, so a summary
+    written meanwhile by another process is never rolled back.
+    """
+    now = timezone.now()
+    if previous is None:
+        _, created = OrderSummary.objects.get_or_create(user_id=user_id, defaults={
+            'summary': text,
+            'last_order_id': last_order.id,
+            'last_order_at': last_order.created_at,
+            'rebuilt_at': now,
+            'regenerations': 1,
+            'prompt_tokens_total': prompt_tokens,
+        })
+        return created
+
+    fields = {
+        'summary': text,
+        'last_order_id': last_order.id,
+        'last_order_at': last_order.created_at,
+        'last_updated': now,
+        'regenerations': F('regenerations') + 1,
+        'prompt_tokens_total': F('prompt_tokens_total') + prompt_tokens,
+    }
+    if full:
+        fields['rebuilt_at'] = now
+    updated = OrderSummary.objects.filter(pk=previous.pk, last_order_id=previous.last_order_id).update(**fields)
+    return bool(updated)
+
+
+def generate_summary_in_background(user_id: int) -> bool:
+    """
+    Regenerates the user's order summary. Runs on the summary worker pool,
+    never on the request thread.
+    Only the orders placed since the last summary are sent to the model,
+    together with that summary; see needs_full_rebuild for when the whole
+    history is read instead. Returns True if a new summary was written.
+    """
+    try:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        # Check API key
+        if not hasattr(settings, 'GEMINI_API_KEY') or not settings.GEMINI_API_KEY:
+            logger.error("Background: GEMINI_API_KEY not configured")
+            return False
+
+        previous = OrderSummary.objects.filter(user_id=user_id).first()
+        orders = Order.objects.filter(user_id=user_id).prefetch_related(
+            'items', 'items__product', 'items__product__category'
+        ).order_by(*NEWEST_ORDER_FIRST)
+
+        full = True
+        if previous is not None and previous.last_order_id is not None:
+            # One more than the limit is enough to know the delta is too large
+            new_orders = list(orders.filter(placed_after(previous))[:FULL_REBUILD_MAX_NEW_ORDERS + 1])
+            if not new_orders:
+                logger.info(f"Background: Summary for user ID {user_id} already covers every order")
+                return False
+            full = needs_full_rebuild(previous, len(new_orders))
+        if full:
+            new_orders = list(orders)
+            if not new_orders:
+                logger.warning(f"Background: No orders found for user ID {user_id}")
+                return False
+
+        order_details_list = []
+        for order in new_orders:
+            try:
+                order_details_list.append(format_order(order))
+            except Exception as e:
+                logger.error(f"Background: Error processing order #{order.id}: {e}")
+                continue
+
+        if not order_details_list:
+            logger.warning(f"Background: No valid order details for user ID {user_id}")
+            return False
+
+        order_history_text = "\n".join(order_details_list)
+        if full:
+            prompt = full_history_prompt(order_history_text)
+        else:
+            prompt = incremental_prompt(previous.summary, order_history_text)
+
+        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=settings.GEMINI_API_KEY)
+        ai_response = llm.invoke(prompt)
+        summary_text = ai_response.content.strip()
+        prompt_tokens = prompt_token_count(ai_response, prompt)
+
+        if save_summary(user_id, previous, summary_text, new_orders[0], full, prompt_tokens):
+            logger.info(
+                f"Background: Updated summary for user ID {user_id} "
+                f"({'full rebuild' if full else 'incremental'}, {len(new_orders)} orders, {prompt_tokens} prompt tokens)"
+            )
+            return True
+        logger.info(f"Background: Summary for user ID {user_id} changed during generation, result discarded")
+        return False
+
+    except Exception as e:
+        logger.error(f"Background: Error generating summary for user {user_id}: {e}", exc_info=True)
+        return False
+
+
+def with_latest_order(users):
+    """
+    Annotates every user with the id and time of their newest order (None
+    without orders). Each lookup is one probe of order_user_created_idx.
+    """
+    latest = Order.objects.filter(user_id=OuterRef('pk')).order_by(*NEWEST_ORDER_FIRST)
+    return users.annotate(
+        latest_order_id=Subquery(latest.values('id')[:1]),
+        latest_order_at=Subquery(latest.values('created_at')[:1]),
+    )
+
+
+# The user has orders their summary does not reflect (or no summary at all).
+# A summary is up to date when the newest order it covers is the user's newest order.
+MISSING_SUMMARY = Q(order_summary__isnull=True)
+STALE_SUMMARY = Q(order_summary__isnull=False) & (
+    Q(order_summary__last_order__isnull=True) | ~Q(order_summary__last_order_id=F('latest_order_id'))
+)
+
+
+def users_needing_summary():
+    """
+    Users with orders whose summary is missing or older than their newest order.
+    """
+    return with_latest_order(User.objects.all()).filter(
+        MISSING_SUMMARY | STALE_SUMMARY, latest_order_id__isnull=False
+    )
+
+
+def summary_health() -> dict:
+    """
+    Counts users with orders, missing and stale summaries, and summaries of
+    users without orders, in one aggregate query.
+    """
+    has_orders = Q(latest_order_id__isnull=False)
+    return with_latest_order(User.objects.all()).aggregate(
+        users=Count('pk'),
+        users_with_orders=Count('pk', filter=has_orders),
+        summaries=Count('pk', filter=Q(order_summary__isnull=False)),
+        missing=Count('pk', filter=has_orders & MISSING_SUMMARY),
+        stale=Count('pk', filter=has_orders & STALE_SUMMARY),
+        orphaned=Count('pk', filter=~has_orders & Q(order_summary__isnull=False)),
+        stalest_last_order_at=Min('order_summary__last_order_at', filter=has_orders & STALE_SUMMARY),
+    )
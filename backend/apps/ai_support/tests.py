@@ -1,3 +1,387 @@
-from django.test import TestCase
+# apps/ai_support/tests.py
 
-# Create your tests here.
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem
+from apps.orders.tests import seed_orders
+from apps.products.models import Category, Product
+from . import summaries
+from .models import OrderSummary
+from .summaries import (
+    DEBOUNCE_SECONDS, FULL_REBUILD_MAX_NEW_ORDERS, MAX_DELAY_SECONDS, NEWEST_ORDER_FIRST,
+    generate_summary_in_background, summary_health, users_needing_summary,
+)
+
+User = get_user_model()
+
+
+class FakeLLM:
+    """
+    Stands in for ChatGoogleGenerativeAI and records every prompt it is sent.
+    """
+    prompts = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(
+            content=f'Summary #{len(self.prompts)}',
+            usage_metadata={'input_tokens': len(prompt) // 4},
+        )
+
+    async def ainvoke(self, prompt):
+        if 'Fail' in prompt:
+            raise RuntimeError('model unavailable')
+        return self.invoke(prompt)
+
+
+class SummarySchedulerTests(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.generated = []
+        patches = [
+            mock.patch('apps.ai_support.summaries.time.monotonic', lambda: self.now),
+            mock.patch('apps.ai_support.summaries.generate_summary_in_background', self.generated.append),
+            # The scheduler is driven by hand through _take_due, on state
+            # a scheduler thread left by another test never sees
+            mock.patch('apps.ai_support.summaries._ensure_scheduler'),
+            mock.patch('apps.ai_support.summaries._condition', threading.Condition()),
+            mock.patch('apps.ai_support.summaries._pending', {}),
+            mock.patch('apps.ai_support.summaries._running', set()),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def take_due(self, seconds_later):
+        self.now += seconds_later
+        with summaries._condition:
+            return summaries._take_due(self.now)
+
+    def test_requests_coalesce_until_a_quiet_period(self):
+        summaries.request_summary(1)
+        self.assertEqual(self.take_due(DEBOUNCE_SECONDS - 1), [])
+        summaries.request_summary(1)
+        summaries.request_summary(2)
+        self.assertEqual(self.take_due(DEBOUNCE_SECONDS - 1), [])
+        self.assertEqual(sorted(self.take_due(1)), [1, 2])
+        self.assertEqual(summaries._pending, {})
+
+    def test_steady_requests_are_delayed_at_most_max_delay(self):
+        summaries.request_summary(1)
+        due = []
+        for _ in range(MAX_DELAY_SECONDS // 10):
+            due += self.take_due(10)
+            summaries.request_summary(1)
+        self.assertEqual(due, [1])
+
+    def test_running_user_is_not_summarized_twice_at_once(self):
+        summaries.request_summary(1)
+        self.assertEqual(self.take_due(DEBOUNCE_SECONDS), [1])
+        summaries.request_summary(1)
+        self.assertEqual(self.take_due(DEBOUNCE_SECONDS), [])
+
+        summaries._run_job(1)
+        self.assertEqual(self.generated, [1])
+        self.assertEqual(self.take_due(0), [1])
+
+    def test_new_order_requests_a_summary_once_committed(self):
+        user = User.objects.create_user(email='scheduled@example.com', password='pass')
+        with mock.patch('apps.ai_support.signals.request_summary') as request:
+            with self.captureOnCommitCallbacks() as callbacks, self.assertLogs('apps.ai_support.signals', 'INFO'):
+                Order.objects.create(user=user, total_price=Decimal('10.00'))
+            request.assert_not_called()
+            for callback in callbacks:
+                callback()
+            request.assert_called_once_with(user.id)
+
+
+class SummaryFlushTests(TestCase):
+
+    def setUp(self):
+        self.generated = []
+        patcher = mock.patch('apps.ai_support.summaries.generate_summary_in_background', self.generated.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flush_runs_pending_requests_before_exit(self):
+        summaries.request_summary(1)
+        summaries.request_summary(2)
+        self.assertEqual(self.generated, [])
+
+        self.assertTrue(summaries.flush_pending_summaries(timeout=10))
+        self.assertEqual(sorted(self.generated), [1, 2])
+        self.assertEqual((summaries._pending, summaries._running), ({}, set()))
+
+    def test_flush_gives_up_after_the_timeout(self):
+        # Without a scheduler thread nothing ever runs
+        with mock.patch('apps.ai_support.summaries._ensure_scheduler'), \
+                mock.patch('apps.ai_support.summaries._condition', threading.Condition()), \
+                mock.patch('apps.ai_support.summaries._pending', {}):
+            summaries.request_summary(1)
+            with self.assertLogs('apps.ai_support.summaries', 'WARNING'):
+                self.assertFalse(summaries.flush_pending_summaries(timeout=0.01))
+
+    def test_inbox_worker_flushes_on_exit(self):
+        with mock.patch('apps.orders.management.commands.process_stripe_inbox.flush_pending_summaries',
+                        return_value=True) as flush:
+            call_command('process_stripe_inbox', '--once', stdout=StringIO())
+        flush.assert_called_once_with()
+
+
+@mock.patch('langchain_google_genai.ChatGoogleGenerativeAI', FakeLLM)
+class IncrementalSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='buyer@example.com', password='pass')
+        cls.orders = seed_orders(cls.user, orders=10)
+
+    def setUp(self):
+        FakeLLM.prompts = []
+
+    def add_orders(self, count):
+        product = self.orders[0].items.first().product
+        orders = Order.objects.bulk_create([
+            Order(user=self.user, total_price=Decimal('10.00'), paid=True) for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=Decimal('10.00'), quantity=1) for order in orders
+        ])
+        return orders
+
+    def test_first_summary_reads_the_full_history(self):
+        generate_summary_in_background(self.user.id)
+
+        summary = OrderSummary.objects.get(user=self.user)
+        self.assertEqual(summary.last_order_id, max(o.id for o in self.orders))
+        self.assertIsNotNone(summary.rebuilt_at)
+        self.assertEqual(summary.regenerations, 1)
+        self.assertEqual(summary.prompt_tokens_total, len(FakeLLM.prompts[0]) // 4)
+        for order in self.orders:
+            self.assertIn(f'Order #{order.id} ', FakeLLM.prompts[0])
+
+    def test_new_orders_are_folded_into_the_previous_summary(self):
+        generate_summary_in_background(self.user.id)
+        new_orders = self.add_orders(2)
+        generate_summary_in_background(self.user.id)
+
+        prompt = FakeLLM.prompts[1]
+        self.assertIn('Summary #1', prompt)
+        for order in new_orders:
+            self.assertIn(f'Order #{order.id} ', prompt)
+        for order in self.orders:
+            self.assertNotIn(f'Order #{order.id} ', prompt)
+        self.assertLess(len(prompt), len(FakeLLM.prompts[0]))
+
+        summary = OrderSummary.objects.get(user=self.user)
+        self.assertEqual(summary.summary, 'Summary #2')
+        self.assertEqual(summary.last_order_id, new_orders[-1].id)
+        self.assertEqual(summary.regenerations, 2)
+        self.assertEqual(summary.average_prompt_tokens, round(summary.prompt_tokens_total / 2))
+
+    def test_orders_placed_at_the_same_moment_are_not_missed(self):
+        generate_summary_in_background(self.user.id)
+        summary = OrderSummary.objects.get(user=self.user)
+        tied = self.add_orders(1)[0]
+        Order.objects.filter(pk=tied.pk).update(created_at=summary.last_order_at)
+
+        self.assertEqual(list(users_needing_summary().values_list('pk', flat=True)), [self.user.id])
+        generate_summary_in_background(self.user.id)
+        self.assertIn(f'Order #{tied.id} ', FakeLLM.prompts[1])
+        self.assertEqual(OrderSummary.objects.get(user=self.user).last_order_id, tied.id)
+
+    def test_up_to_date_summary_is_not_regenerated(self):
+        generate_summary_in_background(self.user.id)
+        generate_summary_in_background(self.user.id)
+        self.assertEqual(len(FakeLLM.prompts), 1)
+
+    def test_large_delta_triggers_a_full_rebuild(self):
+        generate_summary_in_background(self.user.id)
+        self.add_orders(FULL_REBUILD_MAX_NEW_ORDERS + 1)
+        generate_summary_in_background(self.user.id)
+
+        self.assertNotIn('Summary #1', FakeLLM.prompts[1])
+        self.assertIn(f'Order #{self.orders[0].id} ', FakeLLM.prompts[1])
+
+    def test_old_summary_triggers_a_full_rebuild(self):
+        generate_summary_in_background(self.user.id)
+        OrderSummary.objects.filter(user=self.user).update(rebuilt_at=timezone.now() - timedelta(days=60))
+        self.add_orders(1)
+        generate_summary_in_background(self.user.id)
+
+        self.assertNotIn('Summary #1', FakeLLM.prompts[1])
+        summary = OrderSummary.objects.get(user=self.user)
+        self.assertGreater(summary.rebuilt_at, timezone.now() - timedelta(minutes=1))
+
+    def test_summary_written_meanwhile_is_not_rolled_back(self):
+        generate_summary_in_background(self.user.id)
+        newer = self.add_orders(1)[0]
+
+        def write_concurrently(prompt):
+            OrderSummary.objects.filter(user=self.user).update(summary='Newer', last_order_id=newer.id)
+            return SimpleNamespace(content='Stale', usage_metadata=None)
+
+        with mock.patch.object(FakeLLM, 'invoke', side_effect=write_concurrently):
+            generate_summary_in_background(self.user.id)
+
+        self.assertEqual(OrderSummary.objects.get(user=self.user).summary, 'Newer')
+
+
+@mock.patch('langchain_google_genai.ChatGoogleGenerativeAI', FakeLLM)
+class SummaryCommandTests(TransactionTestCase):
+    # The commands query from their own threads, so the rows must be committed
+
+    def setUp(self):
+        FakeLLM.prompts = []
+        self.users = [User.objects.create_user(email=f'buyer{u}@example.com', password='pass') for u in range(5)]
+        category = Category.objects.create(name='Category', slug='category')
+        self.product = Product.objects.create(category=category, name='Product', price=Decimal('10.00'), quantity=100)
+        # The last user has no orders and gets no summary
+        for user in self.users[:4]:
+            orders = Order.objects.bulk_create([
+                Order(user=user, total_price=Decimal('10.00'), paid=True) for _ in range(3)
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=self.product, price=Decimal('10.00'), quantity=1) for order in orders
+            ])
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'summaries_checkpoint.json')
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('generate_initial_summaries', '--checkpoint', self.checkpoint, '--batch-size', '2', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def add_order(self, user):
+        # bulk_create, so the new order does not queue a summary update
+        order = Order.objects.bulk_create([Order(user=user, total_price=Decimal('10.00'), paid=True)])[0]
+        OrderItem.objects.create(order=order, product=self.product, price=Decimal('10.00'), quantity=1)
+        return order
+
+    def test_dry_run_writes_nothing(self):
+        output = self.run_command('--dry-run')
+        self.assertIn('4 would be generated', output)
+        self.assertEqual(FakeLLM.prompts, [])
+        self.assertFalse(OrderSummary.objects.exists())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_from_the_checkpoint(self):
+        self.run_command('--limit', '2')
+        self.assertEqual(set(OrderSummary.objects.values_list('user_id', flat=True)), {u.id for u in self.users[:2]})
+
+        self.run_command()
+        self.assertEqual(len(FakeLLM.prompts), 4)
+        summaries = OrderSummary.objects.in_bulk(field_name='user_id')
+        self.assertEqual(set(summaries), {u.id for u in self.users[:4]})
+        for user in self.users[:4]:
+            summary = summaries[user.id]
+            self.assertEqual(summary.last_order_id, user.orders.order_by(*NEWEST_ORDER_FIRST).first().id)
+            self.assertEqual(summary.regenerations, 1)
+            self.assertGreater(summary.prompt_tokens_total, 0)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_failed_users_are_retried_on_the_next_run(self):
+        failing = self.users[1]
+        order = self.add_order(failing)
+        broken = Product.objects.create(category=self.product.category, name='Fail', price=Decimal('1.00'), quantity=1)
+        order.items.update(product=broken)
+
+        output = self.run_command()
+        self.assertIn('1 failed', output)
+        self.assertIn('1 failed users will be retried on the next run', output)
+        self.assertFalse(OrderSummary.objects.filter(user=failing).exists())
+        self.assertEqual(OrderSummary.objects.count(), 3)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['failed_ids'], [failing.id])
+
+        # Only the failed user is summarized again, then the checkpoint is cleared
+        broken.name = 'Fixed'
+        broken.save()
+        FakeLLM.prompts = []
+        output = self.run_command()
+        self.assertIn('retrying 1 failed earlier', output)
+        self.assertEqual(len(FakeLLM.prompts), 1)
+        self.assertEqual(OrderSummary.objects.get(user=failing).last_order_id, order.id)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_summary_written_meanwhile_is_not_overwritten(self):
+        user = self.users[0]
+        orders = list(user.orders.order_by('id'))
+        OrderSummary.objects.create(user=user, summary='Old', last_order=orders[0], regenerations=1)
+        newer = self.add_order(user)
+        ainvoke = FakeLLM.ainvoke
+
+        async def write_concurrently(llm, prompt):
+            if f'Order #{newer.id} ' in prompt:
+                # The background job summarizes the same user while the command waits for the model
+                await sync_to_async(OrderSummary.objects.filter(user=user).update)(summary='Newer', last_order=newer)
+            return await ainvoke(llm, prompt)
+
+        with mock.patch.object(FakeLLM, 'ainvoke', write_concurrently):
+            output = self.run_command()
+        self.assertIn('3 generated, 0 failed, 1 kept a newer summary', output)
+        summary = OrderSummary.objects.get(user=user)
+        self.assertEqual((summary.summary, summary.last_order_id, summary.regenerations), ('Newer', newer.id, 1))
+
+    def test_existing_summaries_are_replaced_and_counted(self):
+        user = self.users[0]
+        OrderSummary.objects.create(user=user, summary='Old', regenerations=2, prompt_tokens_total=100)
+        self.run_command()
+        summary = OrderSummary.objects.get(user=user)
+        self.assertEqual(summary.last_order_id, user.orders.order_by(*NEWEST_ORDER_FIRST).first().id)
+        self.assertEqual(summary.regenerations, 3)
+        self.assertGreater(summary.prompt_tokens_total, 100)
+        self.assertIsNotNone(summary.rebuilt_at)
+
+    def test_health_counts_missing_and_stale_summaries_in_one_query(self):
+        self.run_command('--limit', '3')
+        newer = self.add_order(self.users[0])
+        OrderSummary.objects.filter(user=self.users[1]).update(last_order=None)
+        OrderSummary.objects.create(user=self.users[4], summary='No orders')
+
+        with self.assertNumQueries(1):
+            health = summary_health()
+        self.assertEqual(health['users'], 5)
+        self.assertEqual(health['users_with_orders'], 4)
+        self.assertEqual(health['summaries'], 4)
+        self.assertEqual(health['missing'], 1)
+        self.assertEqual(health['stale'], 2)
+        self.assertEqual(health['orphaned'], 1)
+
+        needing = {user.pk: user for user in users_needing_summary()}
+        self.assertEqual(set(needing), {u.id for u in self.users[:2]} | {self.users[3].id})
+        self.assertEqual(needing[self.users[0].id].latest_order_id, newer.id)
+
+    def test_refresh_regenerates_only_missing_and_stale_summaries(self):
+        self.run_command('--limit', '3')
+        newer = self.add_order(self.users[0])
+        FakeLLM.prompts = []
+
+        out = StringIO()
+        call_command('refresh_stale_summaries', stdout=out)
+        self.assertIn('1 missing and 1 stale', out.getvalue())
+        self.assertEqual(len(FakeLLM.prompts), 2)
+        self.assertEqual(OrderSummary.objects.get(user=self.users[0]).last_order_id, newer.id)
+        self.assertTrue(OrderSummary.objects.filter(user=self.users[3]).exists())
+        self.assertFalse(users_needing_summary().exists())
+
+        out = StringIO()
+        call_command('debug_order_summaries', stdout=out)
+        self.assertIn('up-to-date summaries', out.getvalue())
@@ -18,6 +18,7 @@ from pgvector.django import L2Distance
 # --- END OF CORRECTION ---
 
 from .models import ChatMessage
+from .order_lookup import answer_order_question
 from apps.ai_support.models import OrderSummary
 
 User = get_user_model()
@@ -74,13 +75,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
         try:
             await self.save_message(message_text, is_from_ai=False)
             session["history"].add_user_message(message_text)
-            intent = await self.get_question_intent(message_text)
-            logger.info(f"User question intent classified as: {intent}")
-            reply_text = ""
-            if intent == "DOCUMENTS":
-                reply_text = await self.get_rag_response(message_text, session["history"])
-            else:
-                reply_text = await self.get_order_history_response(session["history"])
+            # Order lookups are answered from the database, without a model call
+            reply_text = await self.get_order_lookup_response(message_text)
+            if reply_text is None:
+                intent = await self.get_question_intent(message_text)
+                logger.info(f"User question intent classified as: {intent}")
+                if intent == "DOCUMENTS":
+                    reply_text = await self.get_rag_response(message_text, session["history"])
+                else:
+                    reply_text = await self.get_order_history_response(session["history"])
             session["history"].add_ai_message(reply_text)
             new_ai_message_obj = await self.save_message(reply_text, is_from_ai=True)
             await self.send(text_data=json.dumps({
@@ -170,6 +173,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message': message, 'timestamp': timezone.now().isoformat()
         }))
 
+    @database_sync_to_async
+    def get_order_lookup_response(self, question: str):
+        reply_text = answer_order_question(self.user.id, question)
+        if reply_text is not None:
+            logger.info(f"Answered order lookup for {self.user.email} from the database.")
+        return reply_text
+
     @database_sync_to_async
     def get_user_context(self):
         user = User.objects.get(id=self.user.id)
@@ -0,0 +1,305 @@
+# apps/chat/order_lookup.py
+
+import calendar
+import re
+from datetime import date, datetime, time, timedelta
+from django.db.models import Subquery
+from django.utils import timezone
+from apps.orders.models import Order, OrderItem
+
+# Questions about one order number, the latest orders or a period are answered
+# straight from the database; anything else goes to the model.
+
+# Orders listed in one answer
+MAX_LISTED_ORDERS = 10
+
+NUMBERS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'twelve': 12,
+}
+ORDINALS = {
+    'second': 1, '2nd': 1, 'third': 2, '3rd': 2, 'fourth': 3, '4th': 3, 'fifth': 4, '5th': 4,
+}
+ORDINAL_NAMES = ['last', 'second last', 'third last', 'fourth last', 'fifth last', 'sixth last']
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+
+NUMBER = r'(\d+|' + '|'.join(NUMBERS) + r')'
+DATE = r'(\d{4}-\d{2}-\d{2})'
+
+# Questions about policies (returning, cancelling, ...) an order need the documents
+POLICY_PATTERN = re.compile(
+    r'\b(?:return|refund|exchange|cancel|policy|policies|warranty|guarantee)\w*', re.IGNORECASE
+)
+# A period only makes a question about the user's orders when it mentions orders or
+# purchases, or the user buying something; "the best product to buy this year" does not
+ORDER_NOUN_PATTERN = re.compile(r'\b(?:orders|purchases)\b', re.IGNORECASE)
+ORDER_VERB_PATTERN = re.compile(r'\b(?:order(?:ed)?|purchase[d]?|bought|buy|spent|spend)\b', re.IGNORECASE)
+FIRST_PERSON_PATTERN = re.compile(r"\b(?:i|i've|me|my|we|our)\b", re.IGNORECASE)
+
+# An order id needs an explicit marker ("order #12", "order number 12", "order id 12"),
+# or a bare "order 12" used as a noun at the end of a question ("where is order 12?");
+# "can I order 2 bags?" or "the #5 model" are not about an order
+ORDER_NUMBER_PATTERN = re.compile(
+    r'\border\s*(?:#|no\.?|number|num\.?|id)\s*#?\s*(\d+)\b'
+    r'(?!\s*(?:day|week|month|year|item|product)s?\b)',
+    re.IGNORECASE
+)
+ORDER_NUMBER_QUESTION_PATTERN = re.compile(
+    r'\b(?:is|of|my|about|for|to|on|with|track|tracking)\s+order\s+(\d+)\s*(?:[?.!]|$)', re.IGNORECASE
+)
+RECENT_COUNT_PATTERN = re.compile(
+    r'\b(?:last|latest|most\s+recent|recent)\s+' + NUMBER + r'\s+(?:order|purchase)s\b', re.IGNORECASE
+)
+RECENT_ORDER_PATTERN = re.compile(
+    r'\b(?:(' + '|'.join(ORDINALS) + r')[\s-]+(?:to[\s-]+)?)?'
+    r'(?:last|latest|most\s+recent|previous|recent)\s+(?:order|purchase)\b',
+    re.IGNORECASE
+)
+# "the order before my last order", "what did I buy previous to my second last purchase"
+BEFORE_RECENT_PATTERN = re.compile(
+    r'\b(?:before|previous\s+to|prior\s+to)\s+(?:my|the)\s+(?:(' + '|'.join(ORDINALS) + r')[\s-]+(?:to[\s-]+)?)?'
+    r'(?:last|latest|most\s+recent)\b(?!\s+(?:\d+\s+|few\s+)?(?:day|week|month|year)s?\b)',
+    re.IGNORECASE
+)
+LAST_BOUGHT_PATTERN = re.compile(
+    r'\bwhat\s+(?:did|have)\s+i\s+(?:buy|bought|order|ordered|purchase|purchased)\s+last\b'
+    r'|\bwhat\s+did\s+i\s+last\s+(?:buy|order|purchase)\b',
+    re.IGNORECASE
+)
+
+BETWEEN_PATTERN = re.compile(r'\b(?:between|from)\s+' + DATE + r'\s+(?:and|to|until)\s+' + DATE, re.IGNORECASE)
+SINCE_PATTERN = re.compile(r'\bsince\s+' + DATE, re.IGNORECASE)
+ON_DATE_PATTERN = re.compile(r'\bon\s+' + DATE, re.IGNORECASE)
+PERIOD_PATTERN = re.compile(
+    r'\b(?:(the)\s+)?(this|last|past)\s+(?:' + NUMBER + r'\s+)?(day|week|month|year)s?\b', re.IGNORECASE
+)
+DAY_PATTERN = re.compile(r'\b(today|yesterday)\b', re.IGNORECASE)
+MONTH_PATTERN = re.compile(
+    r'\b(?:in|during)\s+(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\b\.?(?:\s+(\d{4}))?', re.IGNORECASE
+)
+YEAR_PATTERN = re.compile(r'\b(?:in|during)\s+(\d{4})\b', re.IGNORECASE)
+
+
+def to_number(text: str) -> int:
+    return int(text) if text.isdigit() else NUMBERS[text.lower()]
+
+
+def months_before(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def has_order_context(text: str) -> bool:
+    if ORDER_NOUN_PATTERN.search(text):
+        return True
+    return bool(ORDER_VERB_PATTERN.search(text) and FIRST_PERSON_PATTERN.search(text))
+
+
+def parse_date(text: str):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def parse_date_range(text: str, today: date):
+    """
+    Returns (start, end, label) for the period the question is about, as
+    dates with `end` exclusive, or None if it names no period.
+    """
+    if match := BETWEEN_PATTERN.search(text):
+        start, end = parse_date(match.group(1)), parse_date(match.group(2))
+        if start and end and start <= end:
+            return start, end + timedelta(days=1), f"between {format_date(start)} and {format_date(end)}"
+    if match := SINCE_PATTERN.search(text):
+        if start := parse_date(match.group(1)):
+            return start, today + timedelta(days=1), f"since {format_date(start)}"
+    if match := ON_DATE_PATTERN.search(text):
+        if day := parse_date(match.group(1)):
+            return day, day + timedelta(days=1), f"on {format_date(day)}"
+    if match := DAY_PATTERN.search(text):
+        day = today if match.group(1).lower() == 'today' else today - timedelta(days=1)
+        return day, day + timedelta(days=1), match.group(1).lower()
+
+    if match := PERIOD_PATTERN.search(text):
+        the, which, count, unit = match.groups()
+        which, unit = which.lower(), unit.lower()
+        # "the last month", "the past 3 months" and the like are rolling windows
+        # ending today; a bare "last month" is the previous calendar month
+        if which != 'this' and (the or count or which == 'past' or unit == 'day'):
+            count = to_number(count) if count else 1
+            if unit == 'day':
+                start = today - timedelta(days=count - 1)
+            elif unit == 'week':
+                start = today - timedelta(weeks=count) + timedelta(days=1)
+            elif unit == 'month':
+                start = months_before(today, count) + timedelta(days=1)
+            else:
+                start = months_before(today, 12 * count) + timedelta(days=1)
+            label = f"in the last {count} {unit}s" if count > 1 else f"in the last {unit}"
+            return start, today + timedelta(days=1), label
+        if unit == 'week':
+            start = today - timedelta(days=today.weekday())
+            if which == 'last':
+                start -= timedelta(weeks=1)
+            end = start + timedelta(weeks=1)
+        elif unit == 'month':
+            start = today.replace(day=1)
+            if which == 'last':
+                start = months_before(start, 1)
+            end = months_before(start, -1)
+        else:
+            start = date(today.year - (which == 'last'), 1, 1)
+            end = date(start.year + 1, 1, 1)
+        return start, min(end, today + timedelta(days=1)), f"{which} {unit}"
+
+    if match := MONTH_PATTERN.search(text):
+        month = MONTHS[match.group(1).lower()]
+        if match.group(2):
+            year = int(match.group(2))
+        else:
+            # A month without a year is the most recent one
+            year = today.year if month <= today.month else today.year - 1
+        start = date(year, month, 1)
+        return start, months_before(start, -1), f"in {calendar.month_name[month]} {year}"
+    if match := YEAR_PATTERN.search(text):
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year + 1, 1, 1), f"in {year}"
+    return None
+
+
+def parse_order_question(text: str, today: date = None):
+    """
+    Recognizes questions that can be answered from the orders table.
+    Returns one of
+        {'kind': 'number', 'order_id': 123}
+        {'kind': 'recent', 'offset': 1, 'count': 1}
+        {'kind': 'range', 'start': date, 'end': date, 'label': 'in March 2026'}
+    or None when the question should go to the model. A 'recent' question
+    that names a period ("my last order in September") also has the
+    'start', 'end' and 'label' of that period.
+    """
+    if POLICY_PATTERN.search(text):
+        return None
+    today = today or timezone.localdate()
+
+    if match := ORDER_NUMBER_PATTERN.search(text) or ORDER_NUMBER_QUESTION_PATTERN.search(text):
+        return {'kind': 'number', 'order_id': int(match.group(1))}
+
+    period = parse_date_range(text, today) if has_order_context(text) else None
+    question = None
+    if match := BEFORE_RECENT_PATTERN.search(text):
+        offset = ORDINALS[match.group(1).lower()] if match.group(1) else 0
+        question = {'kind': 'recent', 'offset': offset + 1, 'count': 1}
+    elif match := RECENT_COUNT_PATTERN.search(text):
+        count = min(to_number(match.group(1)), MAX_LISTED_ORDERS)
+        question = {'kind': 'recent', 'offset': 0, 'count': max(count, 1)}
+    elif match := RECENT_ORDER_PATTERN.search(text):
+        offset = ORDINALS[match.group(1).lower()] if match.group(1) else 0
+        question = {'kind': 'recent', 'offset': offset, 'count': 1}
+    elif LAST_BOUGHT_PATTERN.search(text) and period is None:
+        # "what did I buy last week" is about a period, not the latest order
+        question = {'kind': 'recent', 'offset': 0, 'count': 1}
+
+    if period is None:
+        return question
+    start, end, label = period
+    return {'kind': 'range', **(question or {}), 'start': start, 'end': end, 'label': label}
+
+
+def lookup_orders(user_id: int, question: dict) -> list:
+    """
+    Loads the orders the question is about with their items, newest first,
+    in one query. The order ids come from a subquery on
+    order_user_created_idx. Returns [(order, [items])].
+    """
+    items = OrderItem.objects.filter(order__user_id=user_id)
+    if question['kind'] == 'number':
+        items = items.filter(order_id=question['order_id'])
+    else:
+        orders = Order.objects.filter(user_id=user_id).order_by('-created_at', '-id')
+        if 'start' in question:
+            tz = timezone.get_current_timezone()
+            orders = orders.filter(
+                created_at__gte=datetime.combine(question['start'], time.min, tz),
+                created_at__lt=datetime.combine(question['end'], time.min, tz),
+            )
+        if question['kind'] == 'recent':
+            orders = orders[question['offset']:question['offset'] + question['count']]
+        else:
+            orders = orders[:MAX_LISTED_ORDERS + 1]
+        items = items.filter(order_id__in=Subquery(orders.values('id')))
+
+    items = items.select_related('order', 'product').only(
+        'quantity', 'price', 'order__id', 'order__created_at', 'order__total_price', 'order__paid', 'product__name'
+    ).order_by('-order__created_at', '-order_id', 'id')
+
+    grouped = []
+    for item in items:
+        if not grouped or grouped[-1][0].id != item.order_id:
+            grouped.append((item.order, []))
+        grouped[-1][1].append(item)
+    return grouped
+
+
+def format_date(day) -> str:
+    return f"{day:%B} {day.day}, {day.year}"
+
+
+def format_order(order, items, title: str = None) -> str:
+    placed = timezone.localtime(order.created_at)
+    lines = [
+        f"{title or f'Order #{order.id}'} was placed on {format_date(placed)} "
+        f"for ${order.total_price} ({'paid' if order.paid else 'awaiting payment'}):"
+    ]
+    lines += [f"- {item.quantity}x {item.product.name} (${item.price} each)" for item in items]
+    return "\n".join(lines)
+
+
+def format_order_line(order, items) -> str:
+    placed = timezone.localtime(order.created_at)
+    products = ", ".join(f"{item.quantity}x {item.product.name}" for item in items)
+    return f"- Order #{order.id} on {format_date(placed)}: {products}. Total: ${order.total_price}"
+
+
+def render_answer(question: dict, orders: list) -> str:
+    if question['kind'] == 'number':
+        if not orders:
+            return f"I couldn't find order #{question['order_id']} on your account."
+        return format_order(*orders[0])
+
+    if question['kind'] == 'recent':
+        period = f" {question['label']}" if 'label' in question else ""
+        if not orders and (question['offset'] == 0 or question['count'] > 1):
+            return f"You didn't place any orders{period}." if period else "You haven't placed any orders yet."
+        if question['count'] == 1:
+            name = ORDINAL_NAMES[question['offset']]
+            if not orders:
+                return f"I couldn't find a {name} order{period} on your account."
+            order, items = orders[0]
+            return format_order(order, items, title=f"Your {name} order{period}, #{order.id},")
+        lines = [f"Your last {len(orders)} orders{period}:" if len(orders) > 1 else f"You have placed one order{period}:"]
+        return "\n".join(lines + [format_order_line(order, items) for order, items in orders])
+
+    if not orders:
+        return f"You didn't place any orders {question['label']}."
+    if len(orders) > MAX_LISTED_ORDERS:
+        lines = [f"You placed more than {MAX_LISTED_ORDERS} orders {question['label']}. The latest {MAX_LISTED_ORDERS}:"]
+        orders = orders[:MAX_LISTED_ORDERS]
+    else:
+        total = sum(order.total_price for order, _ in orders)
+        lines = [f"You placed {len(orders)} order{'s' if len(orders) > 1 else ''} {question['label']}, ${total} in total:"]
+    return "\n".join(lines + [format_order_line(order, items) for order, items in orders])
+
+
+def answer_order_question(user_id: int, text: str, today: date = None):
+    """
+    Answers an order lookup question from the database, or returns None if
+    the question is not one of the recognized kinds.
+    """
+    question = parse_order_question(text, today)
+    if question is None:
+        return None
+    return render_answer(question, lookup_orders(user_id, question))
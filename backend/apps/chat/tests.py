@@ -1,3 +1,147 @@
+# apps/chat/tests.py
+
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from apps.orders.models import Order, OrderItem
+from apps.products.models import Category, Product
+from .order_lookup import answer_order_question, parse_order_question
+
+User = get_user_model()
+
+TODAY = date(2026, 10, 19)
+
+
+class OrderQuestionParsingTests(TestCase):
+
+    def parse(self, text):
+        return parse_order_question(text, TODAY)
+
+    def test_order_numbers(self):
+        self.assertEqual(self.parse('Where is order #123?'), {'kind': 'number', 'order_id': 123})
+        self.assertEqual(self.parse('status of order number 45'), {'kind': 'number', 'order_id': 45})
+        self.assertEqual(self.parse('order id 7 please'), {'kind': 'number', 'order_id': 7})
+        self.assertEqual(self.parse("Where's my order 88?"), {'kind': 'number', 'order_id': 88})
+        self.assertIsNone(self.parse('my order 2 weeks ago'))
+
+    def test_quantities_and_model_numbers_are_not_order_numbers(self):
+        self.assertIsNone(self.parse('Can I order 2 bags?'))
+        self.assertIsNone(self.parse('Can I order 2?'))
+        self.assertIsNone(self.parse('Do you have the #5 model in stock?'))
+        self.assertIsNone(self.parse('I want to order 3 more of these'))
+        self.assertIsNone(self.parse('What if I order 2?'))
+
+    def test_recent_orders(self):
+        self.assertEqual(self.parse('What did I buy last?'), {'kind': 'recent', 'offset': 0, 'count': 1})
+        self.assertEqual(self.parse('what was my second last order'), {'kind': 'recent', 'offset': 1, 'count': 1})
+        self.assertEqual(self.parse('my third-to-last purchase'), {'kind': 'recent', 'offset': 2, 'count': 1})
+        self.assertEqual(self.parse('show my last 3 orders'), {'kind': 'recent', 'offset': 0, 'count': 3})
+
+    def test_orders_before_the_last_one(self):
+        self.assertEqual(self.parse('show me the order before my last order'), {'kind': 'recent', 'offset': 1, 'count': 1})
+        self.assertEqual(self.parse('what did I buy previous to my last purchase?'), {'kind': 'recent', 'offset': 1, 'count': 1})
+        self.assertEqual(self.parse('the order prior to my second last one'), {'kind': 'recent', 'offset': 2, 'count': 1})
+        # "before last week" is a period, not an order
+        self.assertNotEqual(self.parse('what did I buy before the last week')['kind'], 'recent')
+
+    def test_periods_after_last(self):
+        question = self.parse('What did I buy last week?')
+        self.assertEqual((question['kind'], question['start'], question['end']), ('range', date(2026, 10, 12), date(2026, 10, 19)))
+        question = self.parse('what did I buy last month')
+        self.assertEqual((question['kind'], question['start'], question['end']), ('range', date(2026, 9, 1), date(2026, 10, 1)))
+        self.assertEqual(self.parse('what did I buy last time?'), {'kind': 'recent', 'offset': 0, 'count': 1})
+        self.assertEqual(self.parse('what was my last order in september'), {
+            'kind': 'recent', 'offset': 0, 'count': 1,
+            'start': date(2026, 9, 1), 'end': date(2026, 10, 1), 'label': 'in September 2026',
+        })
+
+    def test_date_ranges(self):
+        question = self.parse('what did I order in the last 30 days')
+        self.assertEqual((question['start'], question['end']), (date(2026, 9, 20), date(2026, 10, 20)))
+        question = self.parse('orders last month')
+        self.assertEqual((question['start'], question['end']), (date(2026, 9, 1), date(2026, 10, 1)))
+        question = self.parse('what did I buy in november')
+        self.assertEqual((question['start'], question['end']), (date(2025, 11, 1), date(2025, 12, 1)))
+        question = self.parse('purchases between 2026-01-01 and 2026-01-31')
+        self.assertEqual((question['start'], question['end']), (date(2026, 1, 1), date(2026, 2, 1)))
+
+    def test_other_questions_go_to_the_model(self):
+        self.assertIsNone(self.parse('Can I return my last order?'))
+        self.assertIsNone(self.parse('What is your shipping policy?'))
+        self.assertIsNone(self.parse('Recommend me something for the last week of summer'))
+        self.assertIsNone(self.parse('hello'))
+        self.assertIsNone(self.parse('What is the best product to buy this year?'))
+
+
+class OrderLookupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='buyer@example.com', password='pass')
+        cls.other = User.objects.create_user(email='other@example.com', password='pass')
+        category = Category.objects.create(name='Bags', slug='bags')
+        cls.products = Product.objects.bulk_create([
+            Product(category=category, name=f'Bag {p}', price=Decimal('20.00'), quantity=10) for p in range(3)
+        ])
+        # bulk_create, so no summary updates are queued; one order per day up to TODAY
+        cls.orders = Order.objects.bulk_create([
+            Order(user=cls.user, total_price=Decimal('40.00'), paid=True) for _ in range(5)
+        ])
+        for days_ago, order in zip(range(4, -1, -1), cls.orders):
+            Order.objects.filter(pk=order.pk).update(
+                created_at=datetime(2026, 10, 19, 12, tzinfo=dt_timezone.utc) - timedelta(days=days_ago)
+            )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=cls.products[(o + i) % 3], price=Decimal('20.00'), quantity=1)
+            for o, order in enumerate(cls.orders)
+            for i in range(2)
+        ])
+        cls.foreign = Order.objects.bulk_create([Order(user=cls.other, total_price=Decimal('5.00'), paid=True)])[0]
+        OrderItem.objects.create(order=cls.foreign, product=cls.products[0], price=Decimal('5.00'), quantity=1)
+
+    def answer(self, text):
+        with self.assertNumQueries(1):
+            return answer_order_question(self.user.id, text, TODAY)
+
+    def test_order_number(self):
+        order = self.orders[2]
+        reply = self.answer(f'Where is order #{order.id}?')
+        self.assertTrue(reply.startswith(f'Order #{order.id} was placed on October 17, 2026 for $40.00 (paid)'))
+        self.assertIn('- 1x Bag 2 ($20.00 each)', reply)
+
+    def test_orders_of_other_users_are_not_found(self):
+        self.assertEqual(self.answer(f'order #{self.foreign.id}'), f"I couldn't find order #{self.foreign.id} on your account.")
+
+    def test_second_last_order(self):
+        reply = self.answer('What was my second last order?')
+        self.assertTrue(reply.startswith(f'Your second last order, #{self.orders[3].id}, was placed on October 18, 2026'))
+
+    def test_last_orders(self):
+        reply = self.answer('show my last 2 orders')
+        lines = reply.splitlines()
+        self.assertEqual(lines[0], 'Your last 2 orders:')
+        self.assertTrue(lines[1].startswith(f'- Order #{self.orders[4].id} on October 19, 2026'))
+        self.assertTrue(lines[2].startswith(f'- Order #{self.orders[3].id} on October 18, 2026'))
+
+    def test_last_order_in_a_period(self):
+        reply = self.answer('what was my last order in october')
+        self.assertTrue(reply.startswith(f'Your last order in October 2026, #{self.orders[4].id}, was placed on October 19, 2026'))
+        reply = self.answer('what was my second last order yesterday?')
+        self.assertEqual(reply, "I couldn't find a second last order yesterday on your account.")
+        self.assertEqual(self.answer('what was my last order in september'), "You didn't place any orders in September 2026.")
+
+    def test_order_before_the_last_one(self):
+        reply = self.answer('show me the order before my last order')
+        self.assertTrue(reply.startswith(f'Your second last order, #{self.orders[3].id}, was placed on October 18, 2026'))
+
+    def test_date_range(self):
+        reply = self.answer('What did I buy in the last 3 days?')
+        self.assertTrue(reply.startswith('You placed 3 orders in the last 3 days, $120.00 in total:'))
+        self.assertEqual(self.answer('orders in 2025'), "You didn't place any orders in 2025.")
+
+    def test_free_form_question_is_not_answered(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(answer_order_question(self.user.id, 'Which of my bags is best for travel?', TODAY))
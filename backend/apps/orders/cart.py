@@ -0,0 +1,73 @@
+# apps/orders/cart.py
+
+from decimal import Decimal
+
+from apps.products.models import Product
+
+
+class CartError(Exception):
+    """
+    A cart that cannot be paid for. `detail` is the response body.
+    """
+    def __init__(self, detail: dict):
+        super().__init__(detail.get('error'))
+        self.detail = detail
+
+
+def merge_cart_items(cart_items) -> dict:
+    """
+    Validates the raw cart lines and merges duplicates.
+    Returns {product_id: quantity} in the order the products first appear.
+    """
+    if not isinstance(cart_items, list):
+        raise CartError({'error': 'Cart items must be a list.'})
+
+    quantities = {}
+    for item in cart_items:
+        try:
+            product_id, quantity = int(item['id']), int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CartError({'error': 'Each cart item needs an integer id and quantity.'})
+        if quantity < 1:
+            raise CartError({'error': 'Quantities must be at least 1.', 'id': product_id})
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def price_cart(cart_items):
+    """
+    Prices a cart with one query for all of its products.
+    Returns (quantities, prices, total) where quantities is the merged
+    {product_id: quantity} and prices the {product_id: unit price}.
+    Raises CartError listing every unknown product or every line that is
+    short of stock, not just the first one.
+    """
+    quantities = merge_cart_items(cart_items)
+    if not quantities:
+        raise CartError({'error': 'Cart is empty'})
+
+    products = Product.objects.only('id', 'name', 'price', 'quantity').in_bulk(quantities.keys())
+
+    missing = [product_id for product_id in quantities if product_id not in products]
+    if missing:
+        raise CartError({'error': 'Invalid product in cart', 'invalid_ids': missing})
+
+    total = Decimal('0')
+    prices = {}
+    out_of_stock = []
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        if quantity > product.quantity:
+            out_of_stock.append({
+                'id': product_id,
+                'name': product.name,
+                'requested': quantity,
+                'available': product.quantity,
+            })
+        prices[product_id] = product.price
+        total += product.price * quantity
+
+    if out_of_stock:
+        names = ', '.join(line['name'] for line in out_of_stock)
+        raise CartError({'error': f'Not enough stock for {names}', 'out_of_stock': out_of_stock})
+    return quantities, prices, total
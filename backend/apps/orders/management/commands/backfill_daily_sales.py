@@ -0,0 +1,65 @@
+# apps/orders/management/commands/backfill_daily_sales.py
+
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from apps.orders.models import OrderItem, ProductDailySales
+from apps.products.cache import bump_version
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the ProductDailySales rollup and the lifetime units sold from the order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=str, default=None, help='Only rebuild days from this date (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows inserted per query.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+
+        start = time.perf_counter()
+        items = OrderItem.objects.all()
+        rollup = ProductDailySales.objects.all()
+        if since:
+            items = items.filter(order__created_at__date__gte=since)
+            rollup = rollup.filter(date__gte=since)
+
+        rows = items.annotate(day=TruncDate('order__created_at')).values('product_id', 'day').annotate(
+            units=Sum('quantity'),
+            revenue=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField())),
+        ).order_by()
+
+        with transaction.atomic():
+            deleted, _ = rollup.delete()
+            created = 0
+            batch = []
+            for row in rows.iterator(chunk_size=options['batch_size']):
+                batch.append(ProductDailySales(
+                    product_id=row['product_id'], date=row['day'],
+                    units_sold=row['units'], revenue=row['revenue'],
+                ))
+                if len(batch) >= options['batch_size']:
+                    created += len(ProductDailySales.objects.bulk_create(batch))
+                    batch = []
+            if batch:
+                created += len(ProductDailySales.objects.bulk_create(batch))
+
+            # The lifetime counters are rebuilt from the complete rollup
+            totals = ProductDailySales.objects.filter(product=OuterRef('pk')).order_by()\
+                .values('product').annotate(units=Sum('units_sold')).values('units')
+            Product.objects.update(units_sold=Coalesce(Subquery(totals), 0))
+            transaction.on_commit(lambda: bump_version('products'))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Replaced {deleted} rollup rows with {created} rows in {elapsed:.1f}s."
+        ))
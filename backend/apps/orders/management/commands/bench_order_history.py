@@ -0,0 +1,102 @@
+# apps/orders/management/commands/bench_order_history.py
+
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import generics, permissions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.orders.models import Order, OrderItem
+from apps.orders.serializers import OrderSerializer
+from apps.orders.views import OrderHistoryView
+from apps.products.models import Category, Product
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark data."""
+
+
+class LegacyOrderHistoryView(generics.ListAPIView):
+    """The previous history endpoint: full nested products, page-number pagination."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = OrderSerializer
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user).prefetch_related(
+            'items', 'items__product', 'items__product__category', 'items__product__rating'
+        )
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the order history endpoint (payload size, queries, time) for a user with many orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500, help='Orders for the benchmark user.')
+        parser.add_argument('--items', type=int, default=4, help='Items per order.')
+
+    def handle(self, *args, **options):
+        try:
+            # Seed the data inside a transaction that is always rolled back
+            with transaction.atomic():
+                user = self.seed(options['orders'], options['items'])
+                self.report('legacy (nested products, page numbers)', LegacyOrderHistoryView.as_view(), user)
+                self.report('compact (cursor)', OrderHistoryView.as_view(), user)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, order_count, items_per_order):
+        user = User.objects.create_user(email='bench-history@example.com', password='bench')
+        category = Category.objects.create(name='bench-category', slug='bench-category')
+        products = Product.objects.bulk_create([
+            Product(
+                category=category, name=f'bench-product-{i}', price=Decimal('19.99'), quantity=100,
+                description='A benchmark product. ' * 10, image=f'products/bench-{i}.jpg',
+                ai_meta_title='Benchmark meta title', ai_meta_description='Benchmark meta description. ' * 5,
+                ai_keywords='bench, product, keywords', ai_tags='bench, product, tags',
+            )
+            for i in range(50)
+        ])
+        # bulk_create sends no post_save, so no summary generation is triggered
+        orders = Order.objects.bulk_create([
+            Order(user=user, total_price=Decimal('79.96'), paid=True) for _ in range(order_count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[(o + i) % len(products)], price=Decimal('19.99'), quantity=1)
+            for o, order in enumerate(orders)
+            for i in range(items_per_order)
+        ], batch_size=1000)
+        return user
+
+    def report(self, label, view, user):
+        factory = APIRequestFactory()
+        url = '/api/orders/'
+        pages = total_bytes = total_queries = 0
+        first_page = None
+        start = time.perf_counter()
+        while url:
+            request = factory.get(url)
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request)
+                response.render()
+            pages += 1
+            total_bytes += len(response.content)
+            total_queries += len(queries)
+            if first_page is None:
+                first_page = (len(response.content), len(queries), len(response.data['results']))
+            url = response.data['next']
+        elapsed = time.perf_counter() - start
+
+        size, queries, orders = first_page
+        self.stdout.write(
+            f"{label}:\n"
+            f"  first page: {orders} orders, {size / 1024:.1f} KiB, {queries} queries\n"
+            f"  all {pages} pages: {total_bytes / 1024:.1f} KiB, {total_queries} queries, {elapsed * 1000:.0f} ms"
+        )
@@ -0,0 +1,81 @@
+# apps/orders/management/commands/bench_payment_intent.py
+
+import statistics
+import time
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.orders.views import CreatePaymentIntentView
+from apps.products.models import Category, Product
+
+User = get_user_model()
+
+CART_SIZES = (1, 10, 100)
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark data."""
+
+
+class FakePaymentIntent:
+    """Local stand-in for stripe.PaymentIntent, so no request leaves the machine."""
+    created = 0
+
+    def __init__(self, amount):
+        FakePaymentIntent.created += 1
+        self.amount = amount
+        self.id = f'pi_bench_{FakePaymentIntent.created}'
+        self.client_secret = f'{self.id}_secret'
+
+    @classmethod
+    def create(cls, amount, currency, metadata):
+        return cls(amount)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks CreatePaymentIntentView at 1, 10 and 100 cart lines against a local Stripe stand-in.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help='Requests per cart size.')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        factory = APIRequestFactory()
+        view = CreatePaymentIntentView.as_view()
+        try:
+            # Seed the data inside a transaction that is always rolled back
+            with transaction.atomic():
+                user, products = self.seed(max(CART_SIZES))
+                with mock.patch('stripe.PaymentIntent', FakePaymentIntent):
+                    for size in CART_SIZES:
+                        items = [{'id': product.id, 'quantity': 1} for product in products[:size]]
+                        timings = []
+                        for _ in range(repeat):
+                            request = factory.post('/api/orders/create-payment-intent/', {'items': items}, format='json')
+                            force_authenticate(request, user=user)
+                            with CaptureQueriesContext(connection) as queries:
+                                start = time.perf_counter()
+                                response = view(request)
+                                timings.append((time.perf_counter() - start) * 1000)
+                            assert response.status_code == 200, response.data
+                        p95 = statistics.quantiles(timings, n=20)[18] if len(timings) > 1 else timings[0]
+                        self.stdout.write(
+                            f"{size:>3} lines: p50 {statistics.median(timings):.2f} ms, "
+                            f"p95 {p95:.2f} ms, {len(queries)} queries"
+                        )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        user = User.objects.create_user(email='bench-buyer@example.com', password='bench')
+        category = Category.objects.create(name='bench-category', slug='bench-category')
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f'bench-product-{i}', price=Decimal('9.99'), quantity=100000)
+            for i in range(count)
+        ])
+        return user, products
@@ -0,0 +1,124 @@
+# apps/orders/management/commands/process_stripe_inbox.py
+
+import logging
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from apps.ai_support.summaries import flush_pending_summaries
+from apps.orders.models import StripeEventInbox
+from apps.orders.services import UnprocessableEvent, process_stripe_event
+
+logger = logging.getLogger(__name__)
+
+# Retries back off exponentially from BASE_BACKOFF_SECONDS up to MAX_BACKOFF_SECONDS
+BASE_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 10 * 60
+
+
+class Command(BaseCommand):
+    help = 'Processes queued Stripe webhook events in order, with retries and dead-lettering.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process every due event, then exit.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the inbox is empty.')
+        parser.add_argument('--max-attempts', type=int, default=8, help='Failed attempts before an event is dead-lettered.')
+        parser.add_argument('--metrics-interval', type=float, default=60.0, help='Seconds between metrics reports.')
+        parser.add_argument('--requeue-dead', action='store_true', help='Move dead-lettered events back to the queue and exit.')
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            requeued = StripeEventInbox.objects.filter(status=StripeEventInbox.Status.DEAD).update(
+                status=StripeEventInbox.Status.PENDING, attempts=0, next_attempt_at=timezone.now(),
+            )
+            self.stdout.write(self.style.SUCCESS(f"Requeued {requeued} dead-lettered events."))
+            return
+
+        self.max_attempts = options['max_attempts']
+        self.reset_metrics()
+        try:
+            while True:
+                outcome = self.process_next()
+                if outcome is None:
+                    if options['once']:
+                        break
+                    close_old_connections()
+                    time.sleep(options['poll_interval'])
+                if time.monotonic() - self.window_start >= options['metrics_interval']:
+                    self.report_metrics()
+        except KeyboardInterrupt:
+            pass
+        self.report_metrics()
+        # Paid orders queue their summary updates in this process; write them before it exits
+        if not flush_pending_summaries():
+            self.stderr.write("Some order summaries were not written; refresh_stale_summaries will catch up.")
+
+    def process_next(self):
+        """
+        Claims the oldest due event and processes it in one transaction.
+        skip_locked lets several workers run side by side, and a crash rolls
+        the event back to PENDING. Returns None when nothing is due.
+        """
+        with transaction.atomic():
+            event = StripeEventInbox.objects.select_for_update(skip_locked=True).filter(
+                status=StripeEventInbox.Status.PENDING, next_attempt_at__lte=timezone.now(),
+            ).order_by('next_attempt_at', 'received_at', 'id').first()
+            if event is None:
+                return None
+
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    process_stripe_event(event)
+            except UnprocessableEvent as e:
+                logger.error(f"Dead-lettering Stripe event {event.event_id}: {e}")
+                self.finish(event, StripeEventInbox.Status.DEAD, str(e))
+                return 'dead'
+            except Exception as e:
+                if event.attempts >= self.max_attempts:
+                    logger.error(f"Dead-lettering Stripe event {event.event_id} after {event.attempts} attempts: {e}")
+                    self.finish(event, StripeEventInbox.Status.DEAD, str(e))
+                    return 'dead'
+                delay = min(BASE_BACKOFF_SECONDS * 2 ** (event.attempts - 1), MAX_BACKOFF_SECONDS)
+                # Jitter keeps a batch of failed events from retrying in lockstep
+                event.next_attempt_at = timezone.now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+                event.last_error = str(e)
+                event.save(update_fields=['attempts', 'next_attempt_at', 'last_error'])
+                logger.warning(f"Stripe event {event.event_id} failed (attempt {event.attempts}), retrying in {delay}s: {e}")
+                self.metrics['retried'] += 1
+                return 'retried'
+
+            self.finish(event, StripeEventInbox.Status.DONE, '')
+            return 'done'
+
+    def finish(self, event, new_status, error):
+        now = timezone.now()
+        event.status = new_status
+        event.last_error = error
+        event.processed_at = now
+        event.save(update_fields=['status', 'attempts', 'last_error', 'processed_at'])
+        self.metrics['done' if new_status == StripeEventInbox.Status.DONE else 'dead'] += 1
+        # Lag: time from Stripe's delivery to the end of processing
+        self.lags.append((now - event.received_at).total_seconds())
+
+    def reset_metrics(self):
+        self.window_start = time.monotonic()
+        self.metrics = {'done': 0, 'retried': 0, 'dead': 0}
+        self.lags = []
+
+    def report_metrics(self):
+        elapsed = max(time.monotonic() - self.window_start, 1e-9)
+        backlog = StripeEventInbox.objects.filter(status=StripeEventInbox.Status.PENDING).count()
+        lags = sorted(self.lags)
+        lag = (
+            f"lag p50 {lags[len(lags) // 2]:.2f}s max {lags[-1]:.2f}s" if lags else "lag n/a"
+        )
+        message = (
+            f"Stripe inbox: {self.metrics['done']} done, {self.metrics['retried']} retried, "
+            f"{self.metrics['dead']} dead-lettered in {elapsed:.0f}s "
+            f"({self.metrics['done'] / elapsed:.1f} events/s), {lag}, backlog {backlog}"
+        )
+        self.stdout.write(message)
+        self.reset_metrics()
@@ -0,0 +1,57 @@
+# apps/orders/management/commands/release_expired_reservations.py
+
+import logging
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from apps.orders.models import StockReservation
+from apps.orders.reservations import return_stock
+from apps.products.cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Returns the stock of expired reservations and cancels their payment intents. Run it every minute.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Reservations released per transaction.')
+        parser.add_argument('--no-cancel', action='store_true', help="Don't cancel the expired payment intents on Stripe.")
+
+    def handle(self, *args, **options):
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        released = 0
+        while True:
+            with transaction.atomic():
+                # skip_locked: a reservation being confirmed by the webhook right now is left to it
+                batch = list(
+                    StockReservation.objects.select_for_update(skip_locked=True)
+                    .filter(status=StockReservation.Status.ACTIVE, expires_at__lte=timezone.now())
+                    .order_by('expires_at')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                for reservation in batch:
+                    return_stock(reservation.quantities)
+                    reservation.status = StockReservation.Status.RELEASED
+                StockReservation.objects.bulk_update(batch, ['status'])
+                # update() does not send post_save, so invalidate the cached catalog here
+                transaction.on_commit(lambda: bump_version('products'))
+            released += len(batch)
+
+            if not options['no_cancel']:
+                for reservation in batch:
+                    self.cancel_payment_intent(reservation)
+
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired reservations."))
+
+    def cancel_payment_intent(self, reservation):
+        # Best effort: if the buyer pays anyway, the webhook takes the stock again
+        if not reservation.payment_intent_id:
+            return
+        try:
+            stripe.PaymentIntent.cancel(reservation.payment_intent_id)
+        except stripe.error.StripeError as e:
+            logger.warning(f"Could not cancel payment intent {reservation.payment_intent_id}: {e}")
@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
@@ -11,6 +12,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            # Order history: one user's orders, newest first (cursor pagination)
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         return f'Order {self.id}'
@@ -23,4 +28,140 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
 
     def __str__(self):
-        return str(self.id)
\ No newline at end of file
+        return str(self.id)
+
+class StockReservation(models.Model):
+    """
+    Stock taken for a payment intent that has not been paid yet. The webhook
+    confirms it; if it expires first, `manage.py release_expired_reservations`
+    returns the stock.
+    """
+    class Status(models.TextChoices):
+        ACTIVE = 'ACTIVE', 'Active'
+        CONFIRMED = 'CONFIRMED', 'Confirmed'
+        RELEASED = 'RELEASED', 'Released'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='stock_reservations')
+    # [{'id': product_id, 'quantity': n, 'price': 'unit price at reservation'}]
+    items = models.JSONField()
+    payment_intent_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # The sweeper scans active reservations by expiry
+            models.Index(fields=['expires_at'], condition=models.Q(status='ACTIVE'), name='reservation_active_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f'Reservation {self.id} ({self.status})'
+
+    @property
+    def quantities(self) -> dict:
+        return {item['id']: item['quantity'] for item in self.items}
+
+class ProcessedStripeEvent(models.Model):
+    """
+    One row per Stripe payment that created an order. The unique keys on the
+    event id and the PaymentIntent id make a retried or duplicated
+    'payment_intent.succeeded' delivery a no-op.
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    payment_intent_id = models.CharField(max_length=255, unique=True)
+    order = models.OneToOneField(Order, related_name='stripe_event', null=True, blank=True, on_delete=models.SET_NULL)
+    processed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.event_id
+
+class StripeEventInbox(models.Model):
+    """
+    Verified Stripe events waiting to be processed. The webhook only stores
+    the event and acknowledges it; `manage.py process_stripe_inbox` does the
+    work, retrying failures with backoff and dead-lettering the rest.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        DONE = 'DONE', 'Done'
+        DEAD = 'DEAD', 'Dead'
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls pending events that are due, oldest first
+            models.Index(
+                fields=['next_attempt_at', 'received_at', 'id'],
+                condition=models.Q(status='PENDING'),
+                name='stripe_inbox_pending_idx',
+            ),
+        ]
+        verbose_name_plural = "Stripe event inbox"
+
+    def __str__(self):
+        return f'{self.event_type} {self.event_id} ({self.status})'
+
+class ProductDailySalesManager(models.Manager):
+    def record_items(self, day, items):
+        """
+        Adds the quantities and revenue of the given order items to the
+        rollup rows for `day`. The caller must hold row locks on the items'
+        products (as the Stripe webhook does), so two orders can never
+        create the same (product, date) row concurrently.
+        """
+        totals = {}
+        for item in items:
+            units, revenue = totals.get(item.product_id, (0, 0))
+            totals[item.product_id] = (units + item.quantity, revenue + item.price * item.quantity)
+        if not totals:
+            return
+
+        existing = {
+            row.product_id: row
+            for row in self.select_for_update().filter(date=day, product_id__in=totals.keys())
+        }
+        new_rows = []
+        for product_id, (units, revenue) in totals.items():
+            row = existing.get(product_id)
+            if row:
+                row.units_sold += units
+                row.revenue += revenue
+            else:
+                new_rows.append(self.model(product_id=product_id, date=day, units_sold=units, revenue=revenue))
+
+        if existing:
+            self.bulk_update(existing.values(), ['units_sold', 'revenue'])
+        if new_rows:
+            self.bulk_create(new_rows)
+
+
+class ProductDailySales(models.Model):
+    """
+    Units sold and revenue per product per day, maintained when orders are
+    created so sales reports never have to scan the order items.
+    Run `manage.py backfill_daily_sales` to rebuild it from the order history.
+    """
+    product = models.ForeignKey('products.Product', related_name='daily_sales', on_delete=models.CASCADE)
+    date = models.DateField()
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = ProductDailySalesManager()
+
+    class Meta:
+        unique_together = ('product', 'date')
+        indexes = [models.Index(fields=['date'])]
+        verbose_name_plural = "Product daily sales"
+
+    def __str__(self):
+        return f'{self.units_sold} units of product {self.product_id} on {self.date}'
@@ -0,0 +1,120 @@
+# apps/orders/reservations.py
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.products.cache import bump_version
+from apps.products.models import Product
+from .cart import CartError
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+# How long a payment intent holds its stock before the sweeper
+# (manage.py release_expired_reservations) puts it back
+RESERVATION_TTL = timedelta(minutes=15)
+
+
+def take_stock(quantities: dict) -> list:
+    """
+    Decrements the stock of every product with one conditional UPDATE each
+    (quantity = quantity - n WHERE quantity >= n), in primary-key order so
+    concurrent callers never deadlock. Returns the ids of the products that
+    were short; the caller must roll back its transaction if any are.
+    """
+    short = []
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        taken = Product.objects.filter(pk=product_id, quantity__gte=quantity)\
+            .update(quantity=F('quantity') - quantity)
+        if not taken:
+            short.append(product_id)
+    return short
+
+
+def return_stock(quantities: dict):
+    for product_id in sorted(quantities):
+        Product.objects.filter(pk=product_id).update(quantity=F('quantity') + quantities[product_id])
+
+
+def reserve_stock(user, quantities: dict, prices: dict) -> StockReservation:
+    """
+    Takes the cart's stock and records it as a reservation that expires
+    after RESERVATION_TTL. Raises CartError listing every product that is
+    short of stock, in which case nothing is taken.
+    """
+    with transaction.atomic():
+        short = take_stock(quantities)
+        if short:
+            transaction.set_rollback(True)
+        else:
+            reservation = StockReservation.objects.create(
+                user=user,
+                items=[
+                    {'id': product_id, 'quantity': quantity, 'price': str(prices[product_id])}
+                    for product_id, quantity in quantities.items()
+                ],
+                expires_at=timezone.now() + RESERVATION_TTL,
+            )
+            # update() does not send post_save, so invalidate the cached catalog here
+            transaction.on_commit(lambda: bump_version('products'))
+
+    if short:
+        products = Product.objects.only('id', 'name', 'quantity').in_bulk(short)
+        out_of_stock = [
+            {
+                'id': product_id,
+                'name': products[product_id].name,
+                'requested': quantities[product_id],
+                'available': products[product_id].quantity,
+            }
+            for product_id in short if product_id in products
+        ]
+        names = ', '.join(line['name'] for line in out_of_stock)
+        raise CartError({'error': f'Not enough stock for {names}', 'out_of_stock': out_of_stock})
+    return reservation
+
+
+def release_reservation(reservation: StockReservation) -> bool:
+    """
+    Returns the stock of an active reservation. The row is locked and
+    re-checked, so a reservation confirmed by the webhook meanwhile is left
+    alone. Returns whether the reservation was released.
+    """
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().get(pk=reservation.pk)
+        if reservation.status != StockReservation.Status.ACTIVE:
+            return False
+        return_stock(reservation.quantities)
+        reservation.status = StockReservation.Status.RELEASED
+        reservation.save(update_fields=['status'])
+        transaction.on_commit(lambda: bump_version('products'))
+    return True
+
+
+def reservation_prices(reservation: StockReservation) -> dict:
+    return {item['id']: Decimal(item['price']) for item in reservation.items}
+
+
+def confirm_reservation(reservation_id) -> StockReservation:
+    """
+    Locks and confirms a reservation for a paid order. A reservation that
+    expired and was already released takes its stock again; raises CartError
+    if that stock is gone. Returns None for an unknown reservation.
+    Must run inside the order's transaction.
+    """
+    reservation = StockReservation.objects.select_for_update().filter(pk=reservation_id).first()
+    if reservation is None or reservation.status == StockReservation.Status.CONFIRMED:
+        return None
+    if reservation.status == StockReservation.Status.RELEASED:
+        short = take_stock(reservation.quantities)
+        if short:
+            raise CartError({'error': 'Reserved stock was released and is gone', 'out_of_stock': short})
+        transaction.on_commit(lambda: bump_version('products'))
+    reservation.status = StockReservation.Status.CONFIRMED
+    reservation.save(update_fields=['status'])
+    return reservation
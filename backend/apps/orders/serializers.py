@@ -2,10 +2,11 @@
 
 from rest_framework import serializers
 from .models import Order, OrderItem
-from apps.products.serializers import ProductSerializer
+from apps.products.serializers import ProductReadSerializer, image_file_url
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    # Needs the product, its category and rating preloaded (see OrderDetailView)
+    product = ProductReadSerializer(read_only=True)
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'price', 'quantity']
@@ -14,4 +15,29 @@ class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     class Meta:
         model = Order
-        fields = ['id', 'created_at', 'total_price', 'paid', 'items']
\ No newline at end of file
+        fields = ['id', 'created_at', 'total_price', 'paid', 'items']
+
+class OrderHistoryItemSerializer(serializers.ModelSerializer):
+    """
+    Compact order line for the history list: no nested product, just what
+    the list shows. Needs the product's name and image fields preloaded.
+    """
+    product_id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source='product.name', read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product_id', 'name', 'thumbnail', 'price', 'quantity']
+
+    def get_thumbnail(self, item):
+        product = item.product
+        # The smallest variant when it has been generated, else the original image
+        name = (product.image_variants or {}).get('w160') or product.image.name
+        return image_file_url(name, self.context.get('request'))
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    items = OrderHistoryItemSerializer(many=True, read_only=True)
+    class Meta:
+        model = Order
+        fields = ['id', 'created_at', 'total_price', 'paid', 'items']
@@ -0,0 +1,165 @@
+# apps/orders/services.py
+
+import json
+import logging
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.products.cache import bump_version
+from apps.products.models import Product
+from apps.products.popularity import sale_weight
+from .cart import CartError, merge_cart_items
+from .models import Order, OrderItem, ProcessedStripeEvent, ProductDailySales, StripeEventInbox
+from .reservations import confirm_reservation, reservation_prices
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Stripe event types the inbox accepts; everything else is acknowledged and dropped
+HANDLED_EVENT_TYPES = ('payment_intent.succeeded',)
+
+
+class UnprocessableEvent(Exception):
+    """
+    A valid Stripe event that cannot create an order (missing metadata,
+    unknown user or product). Retrying it will not help.
+    """
+
+
+class InsufficientStock(Exception):
+    """
+    The stock of a paid-for product ran out before the order was created.
+    """
+
+
+def create_order_from_payment_intent(event_id: str, payment_intent: dict):
+    """
+    Creates the order for a succeeded PaymentIntent, at most once per event
+    and per PaymentIntent. Returns the new order, or None when the payment
+    was already processed.
+
+    The processed-event row is inserted first, so a duplicate delivery fails
+    on its unique keys straight away (or waits for a concurrent delivery to
+    commit and then fails) without touching the products.
+
+    Payment intents carry the id of the stock reservation made when they
+    were created; the order then only confirms it, using the reserved
+    quantities and prices. Payment intents without one take the stock here.
+    """
+    metadata = payment_intent.get('metadata', {})
+    cart_data_str = metadata.get('cart')
+    user_id = metadata.get('user_id')
+    if not cart_data_str or not user_id:
+        raise UnprocessableEvent('payment_intent.succeeded with missing metadata')
+
+    try:
+        quantities = merge_cart_items(json.loads(cart_data_str).get('items', []))
+    except (ValueError, AttributeError, CartError) as e:
+        raise UnprocessableEvent(f'invalid cart metadata: {e}')
+    if not quantities:
+        raise UnprocessableEvent('empty cart in metadata')
+
+    try:
+        user = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        raise UnprocessableEvent(f'user {user_id} not found')
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                processed = ProcessedStripeEvent.objects.create(
+                    event_id=event_id, payment_intent_id=payment_intent['id']
+                )
+        except IntegrityError:
+            logger.info(f"Stripe event {event_id} / {payment_intent['id']} was already processed.")
+            return None
+
+        reservation = None
+        if metadata.get('reservation_id'):
+            try:
+                reservation = confirm_reservation(metadata['reservation_id'])
+            except CartError:
+                # Paid, but the expired reservation's stock was sold meanwhile: needs a refund
+                raise UnprocessableEvent(f"reservation {metadata['reservation_id']} expired and its stock is gone")
+            if reservation is None:
+                raise UnprocessableEvent(f"reservation {metadata['reservation_id']} not found or already confirmed")
+            quantities = reservation.quantities
+            prices = reservation_prices(reservation)
+
+        # Lock every cart product in one query. Taking the locks in
+        # primary-key order means two concurrent webhooks never deadlock.
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=quantities.keys())
+            .only('id', 'price', 'quantity', 'popularity_score', 'units_sold')
+            .order_by('pk')
+        }
+        missing = quantities.keys() - products.keys()
+        if missing:
+            raise UnprocessableEvent(f'products not found: {sorted(missing)}')
+
+        order = Order.objects.create(
+            user=user,
+            total_price=payment_intent['amount'] / 100.0,
+            paid=True
+        )
+
+        order_items = []
+        weight = sale_weight(order.created_at)
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            if reservation is None:
+                if product.quantity < quantity:
+                    logger.error(f"Race condition: Not enough stock for Product ID {product.id} during webhook processing.")
+                    # Rolls back the whole transaction, including the processed-event row
+                    raise InsufficientStock(f'not enough stock for product {product.id}')
+                product.quantity -= quantity
+                price = product.price
+            else:
+                # The stock was taken by the reservation
+                price = prices[product_id]
+
+            order_items.append(OrderItem(order=order, product=product, price=price, quantity=quantity))
+            product.popularity_score += quantity * weight
+            product.units_sold += quantity
+
+        OrderItem.objects.bulk_create(order_items)
+        update_fields = ['popularity_score', 'units_sold'] if reservation else ['quantity', 'popularity_score', 'units_sold']
+        Product.objects.bulk_update(products.values(), update_fields)
+        # bulk_update does not send post_save, so invalidate the cached catalog here
+        transaction.on_commit(lambda: bump_version('products'))
+
+        # Keep the daily sales rollup in step with the new order
+        ProductDailySales.objects.record_items(timezone.localdate(order.created_at), order_items)
+
+        processed.order = order
+        processed.save(update_fields=['order'])
+
+    return order
+
+
+def store_stripe_event(event) -> bool:
+    """
+    Saves a verified Stripe event to the inbox with a single insert.
+    Returns False for event types we don't handle; a redelivered event id
+    is ignored by the unique key.
+    """
+    if event['type'] not in HANDLED_EVENT_TYPES:
+        return False
+    StripeEventInbox.objects.bulk_create(
+        [StripeEventInbox(event_id=event['id'], event_type=event['type'], payload=event['data']['object'])],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def process_stripe_event(inbox_event: StripeEventInbox):
+    """
+    Applies one inbox event. Raises UnprocessableEvent for events that can
+    never succeed; any other exception is worth a retry.
+    """
+    if inbox_event.event_type == 'payment_intent.succeeded':
+        return create_order_from_payment_intent(inbox_event.event_id, inbox_event.payload)
+    raise UnprocessableEvent(f'unhandled event type {inbox_event.event_type}')
@@ -1,3 +1,378 @@
-from django.test import TestCase
+# apps/orders/tests.py
 
-# Create your tests here.
+import json
+import statistics
+import sys
+import threading
+import time
+import unittest
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.products.models import Category, Product
+from .cart import CartError
+from .models import Order, OrderItem, ProcessedStripeEvent, ProductDailySales, StockReservation, StripeEventInbox
+from .reservations import reserve_stock
+from .services import create_order_from_payment_intent
+
+User = get_user_model()
+
+LATENCY_SAMPLES = 30
+ORDER_HISTORY_P95_BUDGET_MS = 250
+# One order, whatever the number of cart lines
+QUERIES_PER_ORDER = 13
+
+
+def seed_orders(user, orders=30, items_per_order=4):
+    """
+    Orders for one user, each with several items across categories. Rows are
+    bulk-created so no post_save handlers (e.g. summary generation) run.
+    """
+    categories = Category.objects.bulk_create(
+        [Category(name=f'Category {c}', slug=f'category-{c}') for c in range(3)]
+    )
+    products = Product.objects.bulk_create([
+        Product(category=categories[p % 3], name=f'Product {p}', price=Decimal(10 + p), quantity=100)
+        for p in range(12)
+    ])
+    created = Order.objects.bulk_create([
+        Order(user=user, total_price=Decimal('100.00'), paid=True) for _ in range(orders)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[(o + i) % len(products)], price=Decimal('25.00'), quantity=1)
+        for o, order in enumerate(created)
+        for i in range(items_per_order)
+    ])
+    return created
+
+
+class OrderHistoryQueryBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='buyer@example.com', password='pass')
+        seed_orders(cls.user)
+
+    def test_order_history(self):
+        self.client.force_authenticate(self.user)
+        # one page of orders, then their items with the products joined
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        item = response.data['results'][0]['items'][0]
+        self.assertEqual(set(item), {'id', 'product_id', 'name', 'thumbnail', 'price', 'quantity'})
+
+        # the next page costs the same, whatever its position
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_order_detail(self):
+        self.client.force_authenticate(self.user)
+        order = Order.objects.filter(user=self.user).first()
+        # order, then one prefetch each for items, products, categories and ratings
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/orders/{order.id}/')
+        self.assertTrue(response.data['items'][0]['product']['category'].startswith('Category '))
+
+    def test_order_detail_of_another_user(self):
+        other = User.objects.create_user(email='other@example.com', password='pass')
+        self.client.force_authenticate(other)
+        order = Order.objects.filter(user=self.user).first()
+        self.assertEqual(self.client.get(f'/api/orders/{order.id}/').status_code, 404)
+
+
+class PaymentIntentTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='buyer@example.com', password='pass')
+        category = Category.objects.create(name='Category', slug='category')
+        cls.products = Product.objects.bulk_create([
+            Product(category=category, name=f'Product {p}', price=Decimal('2.50'), quantity=5) for p in range(40)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        intent_ids = (f'pi_{n}' for n in range(1000))
+        patcher = mock.patch(
+            'stripe.PaymentIntent.create',
+            side_effect=lambda **kwargs: mock.Mock(id=next(intent_ids), client_secret='secret'),
+        )
+        self.create_intent = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cart_is_priced_with_one_query(self):
+        items = [{'id': product.id, 'quantity': 1} for product in self.products]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/create-payment-intent/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.create_intent.call_args.kwargs['amount'], 10000)
+        product_reads = [q for q in queries if q['sql'].startswith('SELECT') and 'products_product' in q['sql']]
+        self.assertEqual(len(product_reads), 1)
+
+    def test_payment_intent_reserves_stock(self):
+        product = self.products[0]
+        response = self.client.post(
+            '/api/orders/create-payment-intent/', {'items': [{'id': product.id, 'quantity': 2}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 3)
+        reservation = StockReservation.objects.get()
+        self.assertEqual(reservation.quantities, {product.id: 2})
+        self.assertEqual(self.create_intent.call_args.kwargs['metadata']['reservation_id'], reservation.id)
+
+    def test_expired_reservations_are_released(self):
+        product = self.products[0]
+        reservation = reserve_stock(self.user, {product.id: 4}, {product.id: product.price})
+        with self.assertRaises(CartError):
+            reserve_stock(self.user, {product.id: 2}, {product.id: product.price})
+
+        StockReservation.objects.filter(pk=reservation.pk).update(expires_at=timezone.now())
+        call_command('release_expired_reservations', no_cancel=True, stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 5)
+        self.assertEqual(StockReservation.objects.get().status, StockReservation.Status.RELEASED)
+
+    def test_duplicate_lines_are_merged(self):
+        product = self.products[0]
+        items = [{'id': product.id, 'quantity': 2}, {'id': product.id, 'quantity': 3}]
+        response = self.client.post('/api/orders/create-payment-intent/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.create_intent.call_args.kwargs['amount'], 1250)
+
+    def test_every_out_of_stock_line_is_reported(self):
+        items = [
+            {'id': self.products[0].id, 'quantity': 6},
+            {'id': self.products[1].id, 'quantity': 1},
+            {'id': self.products[2].id, 'quantity': 3},
+            {'id': self.products[2].id, 'quantity': 3},
+        ]
+        response = self.client.post('/api/orders/create-payment-intent/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(line['id'], line['requested']) for line in response.data['out_of_stock']],
+            [(self.products[0].id, 6), (self.products[2].id, 6)],
+        )
+        self.create_intent.assert_not_called()
+
+    def test_body_must_be_an_object(self):
+        for body in ([{'id': self.products[0].id, 'quantity': 1}], 'items', 3):
+            response = self.client.post('/api/orders/create-payment-intent/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.create_intent.assert_not_called()
+
+
+@mock.patch('apps.ai_support.signals.request_summary')
+class StripeWebhookTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='buyer@example.com', password='pass')
+        category = Category.objects.create(name='Category', slug='category')
+        cls.products = Product.objects.bulk_create([
+            Product(category=category, name=f'Product {p}', price=Decimal('4.00'), quantity=10) for p in range(3)
+        ])
+
+    def send(self, event_id, payment_intent_id, items, **extra_metadata):
+        metadata = {'user_id': str(self.user.id), 'cart': json.dumps({'items': items}), **extra_metadata}
+        event = {
+            'id': event_id,
+            'type': 'payment_intent.succeeded',
+            'data': {'object': {
+                'id': payment_intent_id,
+                'amount': 1200,
+                'metadata': metadata,
+            }},
+        }
+        with mock.patch('stripe.Webhook.construct_event', return_value=event):
+            return self.client.post('/api/orders/webhook/', {}, format='json', HTTP_STRIPE_SIGNATURE='sig')
+
+    def process_inbox(self):
+        call_command('process_stripe_inbox', once=True, stdout=StringIO())
+
+    def test_webhook_only_queues_the_event(self, summary):
+        items = [{'id': self.products[0].id, 'quantity': 1}]
+        # signature check is mocked; one insert into the inbox
+        with self.assertNumQueries(1):
+            response = self.send('evt_1', 'pi_1', items)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(StripeEventInbox.objects.get().status, StripeEventInbox.Status.PENDING)
+
+        self.process_inbox()
+        self.assertEqual(StripeEventInbox.objects.get().status, StripeEventInbox.Status.DONE)
+        self.assertTrue(Order.objects.exists())
+
+    def test_duplicate_deliveries_create_one_order(self, summary):
+        items = [{'id': self.products[1].id, 'quantity': 2}, {'id': self.products[0].id, 'quantity': 1}]
+        for event_id in ('evt_1', 'evt_1', 'evt_2'):
+            self.assertEqual(self.send(event_id, 'pi_1', items).status_code, 200)
+        self.assertEqual(StripeEventInbox.objects.count(), 2)
+        self.process_inbox()
+
+        order = Order.objects.get()
+        self.assertEqual(ProcessedStripeEvent.objects.get().order, order)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by('pk').values_list('quantity', flat=True)),
+            [9, 8, 10],
+        )
+        # The lifetime counters move with the daily rollup
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by('pk').values_list('units_sold', flat=True)),
+            [1, 2, 0],
+        )
+        self.assertEqual(ProductDailySales.objects.get(product=self.products[1]).units_sold, 2)
+
+    def test_order_queries_do_not_grow_with_the_cart(self, summary):
+        category = self.products[0].category
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f'Extra {p}', price=Decimal('1.00'), quantity=10) for p in range(5)
+        ])
+        for event_id, cart in (('evt_1', products[:1]), ('evt_2', products[1:])):
+            payment_intent = {
+                'id': f'pi_{event_id}',
+                'amount': 500,
+                'metadata': {
+                    'user_id': str(self.user.id),
+                    'cart': json.dumps({'items': [{'id': product.id, 'quantity': 1} for product in cart]}),
+                },
+            }
+            # No deferred field is loaded per line while the row locks are held
+            with self.assertNumQueries(QUERIES_PER_ORDER):
+                create_order_from_payment_intent(event_id, payment_intent)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in products]).values_list('units_sold', flat=True)),
+            [1, 1, 1, 1, 1],
+        )
+
+    def test_reserved_order_is_confirmed_without_taking_stock_again(self, summary):
+        product = self.products[0]
+        reservation = reserve_stock(self.user, {product.id: 3}, {product.id: Decimal('3.00')})
+        self.send('evt_1', 'pi_1', [{'id': product.id, 'quantity': 3}], reservation_id=reservation.id)
+        self.process_inbox()
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, StockReservation.Status.CONFIRMED)
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 7)
+        # Items are billed at the reserved price
+        self.assertEqual(OrderItem.objects.get().price, Decimal('3.00'))
+
+    def test_insufficient_stock_rolls_back_and_retries(self, summary):
+        self.send('evt_1', 'pi_1', [{'id': self.products[0].id, 'quantity': 11}])
+        self.process_inbox()
+        self.assertFalse(Order.objects.exists())
+        # The event was not marked as processed, so the retry is handled again
+        self.assertFalse(ProcessedStripeEvent.objects.exists())
+        event = StripeEventInbox.objects.get()
+        self.assertEqual((event.status, event.attempts), (StripeEventInbox.Status.PENDING, 1))
+        self.assertGreater(event.next_attempt_at, event.received_at)
+
+    def test_unprocessable_event_is_dead_lettered(self, summary):
+        self.send('evt_1', 'pi_1', [{'id': 0, 'quantity': 1}])
+        self.process_inbox()
+        event = StripeEventInbox.objects.get()
+        self.assertEqual((event.status, event.attempts), (StripeEventInbox.Status.DEAD, 1))
+        self.assertIn('not found', event.last_error)
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', 'SQLite serializes writers; the stress test needs row-level locking.')
+class ReservationStressTests(TransactionTestCase):
+    """
+    Many threads reserve the same SKU at once. The conditional decrement
+    must hand out exactly the available stock: no overselling, no negative
+    quantity and no lost updates.
+    """
+    THREADS = 16
+    ATTEMPTS_PER_THREAD = 25
+    STOCK = 100
+
+    def test_concurrent_reservations_never_oversell(self):
+        user = User.objects.create_user(email='buyer@example.com', password='pass')
+        category = Category.objects.create(name='Category', slug='category')
+        product = Product.objects.create(category=category, name='Hot item', price=Decimal('1.00'), quantity=self.STOCK)
+
+        successes = []
+        failures = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def hammer():
+            try:
+                barrier.wait()
+                for _ in range(self.ATTEMPTS_PER_THREAD):
+                    try:
+                        reserve_stock(user, {product.id: 1}, {product.id: product.price})
+                        successes.append(1)
+                    except CartError:
+                        failures.append(1)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=hammer) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(len(successes), self.STOCK)
+        self.assertEqual(len(failures), self.THREADS * self.ATTEMPTS_PER_THREAD - self.STOCK)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(StockReservation.objects.count(), self.STOCK)
+
+
+class OrderHistoryLatencyTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='buyer@example.com', password='pass')
+        seed_orders(cls.user, orders=200)
+
+    def test_order_history(self):
+        self.client.force_authenticate(self.user)
+        # The first request pays one-off costs (imports, URL resolver, query compilation)
+        self.client.get('/api/orders/')
+        samples = []
+        for _ in range(LATENCY_SAMPLES):
+            start = time.perf_counter()
+            response = self.client.get('/api/orders/')
+            samples.append((time.perf_counter() - start) * 1000)
+            self.assertEqual(response.status_code, 200)
+        p50, p95 = statistics.median(samples), statistics.quantiles(samples, n=20)[18]
+        sys.stderr.write(f"\norder-history: p50={p50:.1f}ms p95={p95:.1f}ms\n")
+        self.assertLess(p95, ORDER_HISTORY_P95_BUDGET_MS, f"order-history p95 {p95:.1f}ms is over budget")
+
+
+class OrderExportStreamingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password='pass', is_staff=True)
+        seed_orders(cls.admin, orders=3, items_per_order=2)
+
+    @mock.patch('apps.products.exports.DEFAULT_CHUNK_SIZE', 4)
+    async def test_export_is_streamed_under_asgi(self):
+        response = await self.async_client.get(
+            reverse('order-export') + '?output=csv',
+            headers={'authorization': f'Bearer {AccessToken.for_user(self.admin)}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # The header and six item rows, four lines per chunk
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [4, 3])
+        self.assertTrue(chunks[0].startswith(b'order_id,created_at,user_email'))
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import CreatePaymentIntentView, StripeWebhookView, OrderHistoryView
+from .views import CreatePaymentIntentView, StripeWebhookView, OrderHistoryView, OrderDetailView, OrderExportView
 
 urlpatterns = [
     path('create-payment-intent/', CreatePaymentIntentView.as_view(), name='create-payment-intent'),
      path('webhook/', StripeWebhookView.as_view(), name='stripe-webhook'),
+    path('admin/export/', OrderExportView.as_view(), name='order-export'),
+    path('<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
     path('', OrderHistoryView.as_view(), name='order-history'),
 ]
\ No newline at end of file
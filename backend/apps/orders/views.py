@@ -4,15 +4,20 @@ import stripe
 import json
 import logging # Import the logging library
 from django.conf import settings
-from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch
+from django.utils.dateparse import parse_date
 from django.contrib.auth import get_user_model
 from rest_framework import status, permissions, generics
+from rest_framework.pagination import CursorPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from apps.products.models import Product
+from apps.products.exports import EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, export_response
+from .cart import CartError, price_cart
 from .models import Order, OrderItem
-from .serializers import OrderSerializer
+from .reservations import release_reservation, reserve_stock
+from .services import store_stripe_event
+from .serializers import OrderSerializer, OrderHistorySerializer
 
 # Get the User model and set up a logger
 User = get_user_model()
@@ -22,33 +27,31 @@ logger = logging.getLogger(__name__)
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 # --- PAYMENT INTENT VIEW ---
-# This view is already in good shape. No changes needed.
 class CreatePaymentIntentView(APIView):
+    """
+    Prices the cart (one query for all products, duplicate lines merged),
+    reserves its stock for RESERVATION_TTL and creates the Stripe
+    PaymentIntent. Stock problems are reported for every affected line
+    under 'out_of_stock'.
+    """
     permission_classes = [permissions.IsAuthenticated]
-    # ... (rest of the view is correct)
-    def post(self, request, *args, **kwargs):
-        cart_items = request.data.get('items', [])
-        
-        if not cart_items:
-            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
 
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected a JSON object with an items list.'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            total_amount = 0
-            product_updates = []
-            for item in cart_items:
-                product = Product.objects.get(id=item['id'])
-                if item['quantity'] > product.quantity:
-                    return Response(
-                        {'error': f'Not enough stock for {product.name}'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                total_amount += product.price * item['quantity']
-                product_updates.append({'product': product, 'quantity': item['quantity']})
+            quantities, prices, total_amount = price_cart(request.data.get('items', []))
+            # The in-memory check above fails fast; the reservation is the
+            # authoritative, race-free stock check
+            reservation = reserve_stock(request.user, quantities, prices)
+        except CartError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
             total_amount_in_cents = int(total_amount * 100)
             
             cart_for_metadata = {
-                'items': [{'id': item['id'], 'quantity': item['quantity']} for item in cart_items]
+                'items': [{'id': product_id, 'quantity': quantity} for product_id, quantity in quantities.items()]
             }
 
             payment_intent = stripe.PaymentIntent.create(
@@ -56,21 +59,31 @@ class CreatePaymentIntentView(APIView):
                 currency='usd',
                 metadata={
                     'user_id': request.user.id,
-                    'cart': json.dumps(cart_for_metadata)
+                    'cart': json.dumps(cart_for_metadata),
+                    'reservation_id': reservation.id,
                 }
             )
+            reservation.payment_intent_id = payment_intent.id
+            reservation.save(update_fields=['payment_intent_id'])
             
-            return Response({'clientSecret': payment_intent.client_secret}, status=status.HTTP_200_OK)
+            return Response(
+                {'clientSecret': payment_intent.client_secret, 'reservationExpiresAt': reservation.expires_at},
+                status=status.HTTP_200_OK
+            )
 
-        except Product.DoesNotExist:
-            return Response({'error': 'Invalid product in cart'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error creating payment intent: {e}")
+            # Don't hold stock for a payment that can never happen
+            release_reservation(reservation)
             return Response({'error': 'An internal error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-
 # --- STRIPE WEBHOOK VIEW (Revised) ---
 class StripeWebhookView(APIView):
+    """
+    Verifies the Stripe signature, stores the event in the inbox and
+    acknowledges it straight away. Orders are created by the
+    `process_stripe_inbox` worker, so bursts never hold up Stripe.
+    """
     permission_classes = [permissions.AllowAny]
 
     def post(self, request, *args, **kwargs):
@@ -98,72 +111,91 @@ class StripeWebhookView(APIView):
             logger.warning("Invalid webhook signature.")
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        # Handle only the specific event we care about
-        if event['type'] == 'payment_intent.succeeded':
-            payment_intent = event['data']['object']
-            
-            # Improvement 2: More robust metadata extraction
-            metadata = payment_intent.get('metadata', {})
-            cart_data_str = metadata.get('cart')
-            user_id = metadata.get('user_id')
-
-            if not cart_data_str or not user_id:
-                logger.error("Webhook received for payment_intent.succeeded with missing metadata.")
-                # Return 200 OK because the event is valid, but we can't process it.
-                # This prevents Stripe from resending it.
-                return Response(status=status.HTTP_200_OK)
-            
-            cart_data = json.loads(cart_data_str)
-            
-            try:
-                user = User.objects.get(id=user_id)
-                
-                # Improvement 3: Use a single atomic transaction for all database operations
-                with transaction.atomic():
-                    order = Order.objects.create(
-                        user=user,
-                        total_price=payment_intent['amount'] / 100.0,
-                        paid=True
-                    )
-                    
-                    products_to_update = []
-                    for item_data in cart_data['items']:
-                        product = Product.objects.select_for_update().get(id=item_data['id'])
-                        
-                        if product.quantity < item_data['quantity']:
-                             # This case is rare but handles race conditions
-                             logger.error(f"Race condition: Not enough stock for Product ID {product.id} during webhook processing.")
-                             # The transaction will be rolled back automatically on error.
-                             raise Exception("Insufficient stock detected during order creation.")
-
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            price=product.price,
-                            quantity=item_data['quantity']
-                        )
-                        product.quantity -= item_data['quantity']
-                        products_to_update.append(product)
-                    
-                    # Update all products in a single bulk query if possible (more efficient)
-                    Product.objects.bulk_update(products_to_update, ['quantity'])
-
-            except (User.DoesNotExist, Product.DoesNotExist) as e:
-                logger.error(f"User or Product not found during webhook processing: {e}")
-                return Response(status=status.HTTP_200_OK) # Still return 200
-            except Exception as e:
-                logger.error(f"Error processing webhook: {e}")
-                return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Acknowledge other event types from Stripe without erroring
+        # Queue the event for the inbox worker; the unique event id makes
+        # Stripe's redeliveries a no-op
+        try:
+            store_stripe_event(event)
+        except Exception as e:
+            logger.error(f"Error storing Stripe event {event.get('id')}: {e}")
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # Acknowledge the event, including types we do not handle
         return Response(status=status.HTTP_200_OK)
 
 
-# --- ORDER HISTORY VIEW ---
-# This view is already in good shape. No changes needed.
+# --- ORDER HISTORY VIEWS ---
+class OrderHistoryPagination(CursorPagination):
+    # Keyset pagination on the (user, -created_at, -id) index: every page is
+    # one index range scan, with no COUNT(*) and no OFFSET
+    ordering = ('-created_at', '-id')
+    page_size = 10
+
 class OrderHistoryView(generics.ListAPIView):
+    """
+    The user's orders, newest first, with compact items (product id, name,
+    thumbnail, price and quantity). Use OrderDetailView for full item data.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = OrderHistorySerializer
+    pagination_class = OrderHistoryPagination
+
+    def get_queryset(self):
+        items = OrderItem.objects.select_related('product').only(
+            'id', 'order_id', 'price', 'quantity',
+            'product__id', 'product__name', 'product__image', 'product__image_variants',
+        )
+        return Order.objects.filter(user=self.request.user).prefetch_related(Prefetch('items', queryset=items))
+
+class OrderDetailView(generics.RetrieveAPIView):
+    """
+    One of the user's orders with the full product data of every item.
+    """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('items', 'items__product')
\ No newline at end of file
+        return Order.objects.filter(user=self.request.user).prefetch_related('items', 'items__product', 'items__product__category', 'items__product__rating')
+
+
+# --- ORDER EXPORT VIEW ---
+class OrderExportView(APIView):
+    """
+    An admin-only view that streams one row per order item as CSV or NDJSON
+    (?output=csv|ndjson), optionally limited with ?since= and ?until=
+    (YYYY-MM-DD, inclusive). Rows are read through a server-side cursor.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    COLUMNS = [
+        'order_id', 'created_at', 'user_email', 'paid', 'order_total',
+        'product_id', 'product_name', 'price', 'quantity', 'line_total',
+    ]
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported output format. Use one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        items = OrderItem.objects.all()
+        for param, lookup in (('since', 'order__created_at__date__gte'), ('until', 'order__created_at__date__lte')):
+            value = request.query_params.get(param)
+            if value:
+                day = parse_date(value)
+                if day is None:
+                    return Response({'error': f'{param} must be a date in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
+                items = items.filter(**{lookup: day})
+
+        rows = items.order_by('order_id', 'id').values(
+            'order_id', 'price', 'quantity', 'product_id',
+            created_at=F('order__created_at'),
+            user_email=F('order__user__email'),
+            paid=F('order__paid'),
+            order_total=F('order__total_price'),
+            product_name=F('product__name'),
+            line_total=ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ).iterator(chunk_size=DEFAULT_CHUNK_SIZE)
+
+        return export_response(rows, self.COLUMNS, export_format, 'orders')
@@ -0,0 +1,77 @@
+# apps/products/ai_jobs.py
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .ai_utils import ContentMismatchError, generate_product_content
+from .models import ContentJob
+
+logger = logging.getLogger(__name__)
+
+# Generation calls are slow and I/O bound, a small pool keeps them off the request workers
+MAX_WORKERS = 4
+# Jobs are reported as expired (and deleted) after this long
+JOB_TIMEOUT = 60 * 60
+
+JobStatus = ContentJob.Status
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='ai-content')
+
+
+def submit_content_job(product_name: str, category_name: str, image_bytes: bytes) -> str:
+    """
+    Queues a content generation and returns its job id.
+    Poll get_job() for the result, from any worker process.
+    """
+    ContentJob.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=JOB_TIMEOUT)).delete()
+    job = ContentJob.objects.create()
+    # The job row must be visible to the worker thread before it starts
+    transaction.on_commit(lambda: _executor.submit(_run_in_thread, job.id, product_name, category_name, image_bytes))
+    return job.id.hex
+
+
+def get_job(job_id: str) -> dict | None:
+    try:
+        job = ContentJob.objects.filter(
+            created_at__gte=timezone.now() - timedelta(seconds=JOB_TIMEOUT)
+        ).get(pk=job_id)
+    except (ContentJob.DoesNotExist, ValidationError):
+        return None
+
+    data = {'id': job.id.hex, 'status': job.status}
+    if job.status == JobStatus.SUCCESS:
+        data['result'] = job.result
+    elif job.status == JobStatus.FAILED:
+        data.update(error=job.error, status_code=job.status_code)
+    return data
+
+
+def _save_job(job_id, status, **fields):
+    ContentJob.objects.filter(pk=job_id).update(status=status, updated_at=timezone.now(), **fields)
+
+
+def _run_in_thread(*args):
+    # The executor thread keeps its own connection; close it when it is no longer usable
+    try:
+        _run_job(*args)
+    finally:
+        close_old_connections()
+
+
+def _run_job(job_id, product_name, category_name, image_bytes):
+    _save_job(job_id, JobStatus.RUNNING)
+    try:
+        content = generate_product_content(product_name, category_name, image_bytes)
+        _save_job(job_id, JobStatus.SUCCESS, result=content)
+    except ContentMismatchError as e:
+        _save_job(job_id, JobStatus.FAILED, error=str(e), status_code=400)
+    except Exception as e:
+        logger.error(f"AI content job {job_id} failed: {e}", exc_info=True)
+        _save_job(
+            job_id, JobStatus.FAILED,
+            error=f'An error occurred while generating AI content: {str(e)}', status_code=500,
+        )
@@ -1,7 +1,18 @@
 # apps/products/ai_utils.py
 
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import re
+import time
 import google.generativeai as genai
 from django.conf import settings
+from django.core.cache import cache
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
 
 # Configure the library with your API key
 genai.configure(api_key=settings.GEMINI_API_KEY)
@@ -49,5 +60,243 @@ def moderate_review_text(text: str) -> str:
 
     except Exception as e:
         # If the API call fails for any reason, default to pending
-        print(f"Error during AI moderation: {e}")
-        return 'PENDING'
\ No newline at end of file
+        logger.error(f"Error during AI moderation: {e}", exc_info=True)
+        return 'PENDING'
+
+# --- Local prefilter ---
+# Catches the obvious violations without an LLM round trip.
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+# Only number shapes that are clearly phone numbers: an international prefix,
+# a bracketed area code, 3-3-4 digits with the same dash or dot separator,
+# or digits right after a word like "call". Plain digit groups such as
+# "100 200 3000" are left to the model.
+PHONE_PATTERN = re.compile(
+    r'\+\d{1,3}[\s.-]?\(?\d{2,4}\)?[\s.-]?\d{3,4}[\s.-]?\d{3,4}\b'
+    r'|\(\d{3}\)\s?\d{3}[\s.-]?\d{4}\b'
+    r'|\b\d{3}([.-])\d{3}\1\d{4}\b'
+    r'|\b(?:call|phone|text|whatsapp|tel)\b\D{0,15}\d[\d\s.-]{5,}\d',
+    re.IGNORECASE
+)
+URL_PATTERN = re.compile(r'https?://|\bwww\.|\b[\w-]+\.(?:com|net|org|io|co|ru|xyz|info|biz|shop|link)\b', re.IGNORECASE)
+# Every form is listed explicitly: a prefix match would also reject innocent
+# words that merely start with one of them ("retardant", "shitake", ...)
+PROFANITY_WORDS = [
+    'fuck', 'fucks', 'fucked', 'fucker', 'fuckers', 'fucking', 'fuckin',
+    'shit', 'shits', 'shitty', 'shitted', 'shitting',
+    'bitch', 'bitches', 'bitchy', 'asshole', 'assholes', 'bastard', 'bastards',
+    'cunt', 'cunts', 'dickhead', 'dickheads', 'motherfucker', 'motherfuckers', 'motherfucking',
+    'bullshit', 'slut', 'sluts', 'slutty', 'whore', 'whores', 'wanker', 'wankers',
+    'retard', 'retards', 'retarded',
+]
+PROFANITY_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(PROFANITY_WORDS) + r')\b', re.IGNORECASE
+)
+PREFILTER_PATTERNS = [EMAIL_PATTERN, PHONE_PATTERN, URL_PATTERN, PROFANITY_PATTERN]
+
+def prefilter_review_text(text: str) -> str | None:
+
+    # Checks review text against the local rules.
+
+    # Returns 'REJECTED' on an obvious violation, or None if the model has to decide.
+
+    for pattern in PREFILTER_PATTERNS:
+        if pattern.search(text):
+            return 'REJECTED'
+    return None
+
+def moderate_reviews_batch(reviews: dict) -> dict:
+
+    # Classifies many reviews with a single Gemini call.
+
+    # Takes {review_id: text} and returns {review_id: 'APPROVED' | 'REJECTED' | 'PENDING'}.
+    # Reviews the model does not answer for clearly stay 'PENDING'.
+
+    if not reviews:
+        return {}
+
+    results = {review_id: 'PENDING' for review_id in reviews}
+    try:
+        model = genai.GenerativeModel('gemini-2.5-flash')
+
+        reviews_json = json.dumps([
+            {'id': str(review_id), 'text': text} for review_id, text in reviews.items()
+        ], indent=2)
+
+        prompt = f"""
+        You are a content moderation AI for an e-commerce platform. Your task is to classify user-submitted reviews.
+        The reviews are given as a JSON array of objects with an "id" and a "text".
+
+        Reviews:
+        {reviews_json}
+
+        Analyze each text for any of the following violations:
+        - Profanity or hate speech
+        - Spam or advertising
+        - Personal contact information (emails, phone numbers)
+        - Off-topic or irrelevant content
+        - Threats or harassment
+
+        Respond with ONLY a single JSON object mapping every review id to its classification:
+        - "APPROVED" if the text is safe and relevant.
+        - "REJECTED" if the text violates any of the rules.
+        Example: {{"12": "APPROVED", "13": "REJECTED"}}
+        """
+
+        response = model.generate_content(prompt)
+        response_text = response.text.strip().replace('```json', '').replace('```', '')
+        classifications = json.loads(response_text)
+
+        for review_id in reviews:
+            classification = str(classifications.get(str(review_id), '')).strip().upper()
+            if classification in ['APPROVED', 'REJECTED']:
+                results[review_id] = classification
+        return results
+
+    except Exception as e:
+        # If the API call or parsing fails, everything stays pending
+        logger.error(f"Error during batch AI moderation: {e}", exc_info=True)
+        return results
+
+# --- Product content generation ---
+
+# Images are downscaled to fit in this box before being sent to the model,
+# which is plenty for recognizing a product and far cheaper to upload
+MAX_IMAGE_DIMENSION = 1024
+IMAGE_JPEG_QUALITY = 85
+
+CONTENT_CACHE_KEY = 'ai:content:{}'
+CONTENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# A mismatch verdict may be a model mistake, so it is only kept long enough to absorb resubmits
+MISMATCH_CACHE_TIMEOUT = 60 * 10
+REQUIRED_CONTENT_KEYS = ['description', 'meta_title', 'meta_description', 'keywords', 'tags']
+
+class ContentMismatchError(Exception):
+    """Raised when the model decides the image does not match the product name."""
+
+def prepare_image(image_bytes: bytes) -> dict:
+
+    # Downscales and re-encodes an uploaded image as a JPEG blob for Gemini.
+
+    image = Image.open(io.BytesIO(image_bytes))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+    return {'mime_type': 'image/jpeg', 'data': buffer.getvalue()}
+
+def content_cache_key(product_name: str, category_name: str, image_bytes: bytes = None) -> str:
+    digest = hashlib.sha256()
+    digest.update(image_bytes or b'')
+    digest.update(b'\0' + product_name.encode() + b'\0' + category_name.encode())
+    return CONTENT_CACHE_KEY.format(digest.hexdigest())
+
+def generate_product_content(product_name: str, category_name: str, image_bytes: bytes = None) -> dict:
+
+    # Uses the Gemini API to validate the image against the name and generate product content.
+
+    # Returns a dict with the REQUIRED_CONTENT_KEYS. Raises ContentMismatchError if the
+    # image and name do not match, and ValueError if the model's answer is incomplete.
+    # Results are cached by image bytes, name and category; mismatches only briefly.
+
+    key = content_cache_key(product_name, category_name, image_bytes)
+    cached = cache.get(key)
+    if cached is None:
+        cached = _generate_product_content(product_name, category_name, image_bytes)
+        cache.set(key, cached, CONTENT_CACHE_TIMEOUT if cached['match'] else MISMATCH_CACHE_TIMEOUT)
+
+    if not cached['match']:
+        raise ContentMismatchError(cached['reason'])
+    return cached['content']
+
+def _generate_product_content(product_name: str, category_name: str, image_bytes: bytes = None) -> dict:
+    model = genai.GenerativeModel('gemini-2.5-flash')
+
+    if image_bytes:
+        validation_task = """
+    1.  **Validation**: Analyze the user-provided image and the product name to determine if they are a plausible match for the same product listing.
+    2.  **Content Generation**: If they match, generate marketing content."""
+    else:
+        validation_task = """
+    1.  **Validation**: No image is provided, so set "match" to true and "reason" to 'OK'.
+    2.  **Content Generation**: Generate marketing content from the product name and category."""
+
+    # Craft a detailed prompt for the AI
+    prompt = f"""
+    You are an e-commerce product analyst. Your task is to perform two steps:{validation_task}
+
+    **Product Details:**
+    - Product Name: "{product_name}"
+    - Category: "{category_name}"
+
+    **Validation Rules:**
+    - Your primary goal is to check if the CORE OBJECT in the image matches the CORE OBJECT in the product name.
+    - Be flexible with subjective terms. For example, if the name is "Classic Bag" and the image is a "Stylish Handbag", this IS a match because the core object is a bag.
+    - Similarly, "Leather Ankle Boots" and an image of brown boots IS a match.
+    - A mismatch should only be for clear, undeniable errors. For example, a product named "Laptop" with an image of a shoe IS NOT a match.
+    - The goal is to prevent major category errors, not to police minor stylistic variations.
+
+    **Required Output Format:**
+    Your final output must be a single, clean JSON object. Do not include any text or formatting outside of this JSON object.
+
+    **JSON Structure:**
+    {{
+      "validation": {{
+        "match": boolean,
+        "reason": "In case of mismatch just say "The uploaded image does not appear to match the product name. Please ensure the correct image is uploaded for the name provided. Suggested name - (suggest a name from your thinking)", or 'OK' if they match."
+      }},
+      "content": {{
+        "description": "A compelling, user-friendly product description (around 50-70 words).",
+        "meta_title": "A concise and SEO-friendly meta title (around 50-60 characters).",
+        "meta_description": "An engaging SEO meta description (around 150-160 characters).",
+        "keywords": "A comma-separated list of 5-7 relevant SEO keywords.",
+        "tags": "A comma-separated list of 5-7 relevant tags for product recommendations."
+      }} | null
+    }}
+    """
+
+    # Make the API call to Gemini with the downscaled image
+    parts = [prompt, prepare_image(image_bytes)] if image_bytes else [prompt]
+    response = model.generate_content(parts)
+
+    # The response text should be a JSON string. We need to clean and parse it.
+    response_text = response.text.strip().replace('```json', '').replace('```', '')
+    ai_data = json.loads(response_text)
+
+    # Validates if the Image and Product name matches
+    validation_result = ai_data.get('validation', {})
+    if not validation_result.get('match'):
+        return {'match': False, 'reason': validation_result.get('reason', 'Image and product name do not match.')}
+
+    content = ai_data.get('content')
+
+    # Validate that the response contains the keys we expect
+    if not content:
+        raise ValueError("AI validation passed, but the 'content' block is missing or null.")
+
+    missing_keys = [key for key in REQUIRED_CONTENT_KEYS if key not in content]
+    if missing_keys:
+        raise ValueError(f"AI response is missing required content fields: {', '.join(missing_keys)}")
+
+    return {'match': True, 'content': content}
+
+class AsyncRateLimiter:
+    """
+    Spaces out calls so that at most `per_minute` start every minute.
+    Await wait() before each API call.
+    """
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,125 @@
+# apps/products/cache.py
+
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+# Cache keys for the per-resource version counters and the cached bodies
+VERSION_KEY = 'catalog:version:{}'
+BODY_KEY = 'catalog:body:{}'
+
+# Cached bodies never need to expire on their own: a version bump makes the
+# old key unreachable, and the cache backend evicts it eventually.
+BODY_TIMEOUT = 60 * 60 * 24
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def get_versions(*namespaces) -> dict:
+    """
+    Returns the current version counter for every namespace.
+    A missing counter (first use or evicted) is seeded from the clock, so a
+    counter that restarts can never collide with a version used before.
+    """
+    keys = {VERSION_KEY.format(ns): ns for ns in namespaces}
+    found = cache.get_many(keys.keys())
+    for key, ns in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return {ns: found[key] for key, ns in keys.items()}
+
+
+def bump_version(*namespaces):
+    """
+    Invalidates every cached response that depends on the given namespaces.
+    """
+    for ns in namespaces:
+        key = VERSION_KEY.format(ns)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The counter is missing, start a new one from the clock
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def record(scope: str, outcome: str):
+    with _stats_lock:
+        counters = _stats.setdefault(scope, {'hits': 0, 'misses': 0, 'not_modified': 0})
+        counters[outcome] += 1
+
+
+def get_cache_stats() -> dict:
+    """
+    Returns the hit/miss counters of this process for every cache scope.
+    """
+    with _stats_lock:
+        stats = {}
+        for scope, counters in _stats.items():
+            served = counters['hits'] + counters['not_modified']
+            total = served + counters['misses']
+            stats[scope] = {
+                **counters,
+                'hit_rate': round(served / total, 4) if total else None,
+            }
+        return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class CachedResponseMixin:
+    """
+    Serves GET list/retrieve responses from the cache.
+
+    The cache key is built from the request URL and the version counters of
+    every namespace in `cache_dependencies`. Signals bump those counters on
+    writes, so a cached body is valid for as long as its key is reachable.
+    The same key doubles as a strong ETag, which lets `If-None-Match`
+    requests be answered with 304 before the ORM is touched.
+    """
+    cache_scope = None
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request) -> str:
+        versions = get_versions(*self.cache_dependencies)
+        raw = '|'.join([
+            self.cache_scope,
+            request.build_absolute_uri(),
+            *(f'{ns}={versions[ns]}' for ns in sorted(versions)),
+        ])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        etag = f'"{key}"'
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            record(self.cache_scope, 'not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = cache.get(BODY_KEY.format(key))
+        if data is not None:
+            record(self.cache_scope, 'hits')
+            return Response(data, headers={'ETag': etag})
+
+        record(self.cache_scope, 'misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(BODY_KEY.format(key), response.data, BODY_TIMEOUT)
+            response['ETag'] = etag
+        return response
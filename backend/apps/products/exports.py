@@ -0,0 +1,57 @@
+# apps/products/exports.py
+
+import csv
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# Supported ?output= values and their content types
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class Echo:
+    """A file-like object whose write() returns the value instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row.get(column) for column in columns])
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps({column: row.get(column) for column in columns}, cls=DjangoJSONEncoder) + '\n'
+
+
+async def stream_chunks(lines):
+    """
+    Produces `lines` a chunk at a time in the sync thread (where the
+    server-side cursor lives) and yields each chunk as one string.
+    """
+    next_chunk = sync_to_async(lambda: ''.join(islice(lines, DEFAULT_CHUNK_SIZE)))
+    while chunk := await next_chunk():
+        yield chunk
+
+
+def export_response(rows, columns, export_format: str, filename: str) -> StreamingHttpResponse:
+    """
+    Streams `rows` (an iterable of dicts, ideally backed by a server-side
+    cursor) as CSV or NDJSON. Under ASGI a sync iterator would be read in
+    full before the first byte is sent, so the content is an async iterator
+    and memory stays flat however many rows there are.
+    """
+    lines = csv_lines(columns, rows) if export_format == 'csv' else ndjson_lines(columns, rows)
+    response = StreamingHttpResponse(stream_chunks(lines), content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
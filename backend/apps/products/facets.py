@@ -0,0 +1,161 @@
+# apps/products/facets.py
+
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Case, Count, Q, Value, When, CharField, BooleanField
+from rest_framework.exceptions import ValidationError
+
+from .cache import get_versions
+from .models import Category, Product
+
+# (key, lower bound inclusive, upper bound exclusive); None means unbounded
+PRICE_BANDS = (
+    ('under-25', None, Decimal('25')),
+    ('25-50', Decimal('25'), Decimal('50')),
+    ('50-100', Decimal('50'), Decimal('100')),
+    ('100-250', Decimal('100'), Decimal('250')),
+    ('250-plus', Decimal('250'), None),
+)
+PRICE_BAND_KEYS = [key for key, _, _ in PRICE_BANDS]
+
+FACETS_KEY = 'catalog:facets:{}'
+FACETS_TIMEOUT = 60 * 60 * 24
+
+
+def price_band_q(key) -> Q:
+    for band, low, high in PRICE_BANDS:
+        if band == key:
+            q = Q()
+            if low is not None:
+                q &= Q(price__gte=low)
+            if high is not None:
+                q &= Q(price__lt=high)
+            return q
+    raise ValidationError({'price_band': f"Unknown price band. Use one of: {', '.join(PRICE_BAND_KEYS)}."})
+
+
+def _parse_price(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'Must be a number.'})
+
+
+def _parse_bool(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    value = value.lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ValidationError({name: 'Must be true or false.'})
+
+
+def parse_product_filters(params) -> dict:
+    """
+    Reads ?category=<slug>, ?price_band=<key>, ?min_price=, ?max_price= and
+    ?in_stock=true|false. The category slug is resolved to its id up front so
+    the product query can use the (category, ...) indexes without a join;
+    an unknown slug resolves to category_id=None and matches nothing.
+    """
+    filters = {}
+    slug = params.get('category')
+    if slug:
+        filters['category_id'] = Category.objects.filter(slug=slug).values_list('id', flat=True).first()
+    band = params.get('price_band')
+    if band:
+        price_band_q(band)
+        filters['price_band'] = band
+    for name in ('min_price', 'max_price'):
+        price = _parse_price(params, name)
+        if price is not None:
+            filters[name] = price
+    in_stock = _parse_bool(params, 'in_stock')
+    if in_stock is not None:
+        filters['in_stock'] = in_stock
+    return filters
+
+
+def filter_products(queryset, filters: dict):
+    if 'category_id' in filters:
+        if filters['category_id'] is None:
+            return queryset.none()
+        queryset = queryset.filter(category_id=filters['category_id'])
+    if 'price_band' in filters:
+        queryset = queryset.filter(price_band_q(filters['price_band']))
+    if 'min_price' in filters:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if 'max_price' in filters:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if 'in_stock' in filters:
+        queryset = queryset.filter(quantity__gt=0) if filters['in_stock'] else queryset.filter(quantity=0)
+    return queryset
+
+
+def get_facet_cells() -> list:
+    """
+    Product counts per (category, price band, stock status), computed with
+    one GROUP BY and cached until the 'products' version changes. Every facet
+    count for any combination of the category, band and stock filters is a
+    sum over these cells, so browsing never runs an aggregate per request.
+    """
+    key = FACETS_KEY.format(get_versions('products')['products'])
+    cells = cache.get(key)
+    if cells is None:
+        band = Case(
+            *(When(price_band_q(band_key), then=Value(band_key)) for band_key in PRICE_BAND_KEYS),
+            output_field=CharField(),
+        )
+        in_stock = Case(When(quantity__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField())
+        cells = list(
+            Product.objects.order_by()
+            .annotate(band=band, in_stock=in_stock)
+            .values('category_id', 'category__slug', 'category__name', 'band', 'in_stock')
+            .annotate(count=Count('id'))
+        )
+        cache.set(key, cells, FACETS_TIMEOUT)
+    return cells
+
+
+def facet_counts(filters: dict) -> dict:
+    """
+    Facet counts for the current filters. Each facet is counted with the
+    other facets' filters applied but not its own, so the alternatives of a
+    selected facet stay visible. min_price/max_price are free-form and are
+    not reflected in the counts.
+    """
+    def matches(cell, skip):
+        if skip != 'category' and 'category_id' in filters and cell['category_id'] != filters['category_id']:
+            return False
+        if skip != 'price_band' and 'price_band' in filters and cell['band'] != filters['price_band']:
+            return False
+        if skip != 'in_stock' and 'in_stock' in filters and cell['in_stock'] != filters['in_stock']:
+            return False
+        return True
+
+    cells = get_facet_cells()
+    categories = {}
+    bands = dict.fromkeys(PRICE_BAND_KEYS, 0)
+    stock = {'in_stock': 0, 'out_of_stock': 0}
+    for cell in cells:
+        if matches(cell, 'category'):
+            entry = categories.setdefault(cell['category__slug'], {
+                'slug': cell['category__slug'], 'name': cell['category__name'], 'count': 0,
+            })
+            entry['count'] += cell['count']
+        if matches(cell, 'price_band') and cell['band']:
+            bands[cell['band']] += cell['count']
+        if matches(cell, 'in_stock'):
+            stock['in_stock' if cell['in_stock'] else 'out_of_stock'] += cell['count']
+
+    return {
+        'category': sorted(categories.values(), key=lambda entry: entry['name']),
+        'price_band': [{'key': key, 'count': count} for key, count in bands.items()],
+        'stock': stock,
+    }
@@ -0,0 +1,180 @@
+# apps/products/forecasting.py
+
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+# Days of sales history the forecast is built from
+HISTORY_DAYS = 90
+# The velocity is an EWMA of daily sales with this half-life (in days)
+VELOCITY_HALF_LIFE = 7.0
+# The trend is the slope of daily sales over this many recent days
+TREND_WINDOW = 28
+# Stock-outs further away than this are reported as "not projected"
+FORECAST_HORIZON_DAYS = 3650
+
+CACHE_KEY = 'inventory:forecast:{}'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def ewma_velocity(sales: np.ndarray, half_life: float = VELOCITY_HALF_LIFE) -> np.ndarray:
+    """
+    Exponentially weighted average of daily sales for every row of a
+    (products x days) matrix, with the most recent day in the last column.
+    """
+    days = sales.shape[1]
+    decay = 0.5 ** (1.0 / half_life)
+    weights = decay ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    return sales @ (weights / weights.sum())
+
+
+def sales_trend(sales: np.ndarray, window: int = TREND_WINDOW) -> np.ndarray:
+    """
+    Least-squares slope of daily sales (units/day per day) over the last
+    `window` days, for every row at once.
+    """
+    recent = sales[:, -window:]
+    t = np.arange(recent.shape[1], dtype=np.float64)
+    t -= t.mean()
+    denominator = (t * t).sum()
+    if denominator == 0:
+        return np.zeros(recent.shape[0])
+    return recent @ t / denominator
+
+
+def days_until_stockout(stock: np.ndarray, velocity: np.ndarray, trend: np.ndarray) -> np.ndarray:
+    """
+    Days until the cumulative projected sales reach the current stock, where
+    the daily rate starts at `velocity` and changes by `trend` every day:
+    stock = velocity * t + trend * t^2 / 2.
+    Returns NaN where the product is not projected to sell out within the
+    forecast horizon.
+    """
+    stock = stock.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Constant rate
+        linear = np.where(velocity > 0, stock / velocity, np.nan)
+        # Accelerating or slowing rate: positive root of the quadratic
+        discriminant = velocity * velocity + 2.0 * trend * stock
+        quadratic = (-velocity + np.sqrt(discriminant)) / trend
+        quadratic = np.where((discriminant >= 0) & (quadratic >= 0), quadratic, np.nan)
+    days = np.where(np.abs(trend) < 1e-9, linear, quadratic)
+    return np.where(days <= FORECAST_HORIZON_DAYS, days, np.nan)
+
+
+class CatalogForecast:
+    """
+    Sales velocity and trend for every product with sales in the history
+    window, computed in one vectorized pass over the daily sales rollup.
+    """
+
+    def __init__(self, product_ids: np.ndarray, velocity: np.ndarray, trend: np.ndarray, as_of):
+        self.product_ids = product_ids
+        self.velocity = velocity
+        self.trend = trend
+        self.as_of = as_of
+
+    @classmethod
+    def from_sales_matrix(cls, product_ids, sales, as_of):
+        return cls(np.asarray(product_ids), ewma_velocity(sales), sales_trend(sales), as_of)
+
+    def for_products(self, product_ids, quantities) -> dict:
+        """
+        Projects the stock-out of the given products from their current
+        stock. Returns {product_id: {velocity, trend, days_until_stockout,
+        stockout_date}}; products without sales history are left out.
+        """
+        if len(self.product_ids) == 0:
+            return {}
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.float64)
+
+        # Align the requested products with the forecast rows
+        order = np.argsort(self.product_ids)
+        sorted_ids = self.product_ids[order]
+        positions = np.clip(np.searchsorted(sorted_ids, product_ids), 0, len(sorted_ids) - 1)
+        found = sorted_ids[positions] == product_ids
+        rows = order[positions]
+
+        velocity = np.where(found, self.velocity[rows], 0.0)
+        trend = np.where(found, self.trend[rows], 0.0)
+        days = days_until_stockout(quantities, velocity, trend)
+
+        # Convert whole columns at once; NaN days become None
+        indexes = np.flatnonzero(found)
+        days = days[indexes]
+        sells_out = ~np.isnan(days)
+        whole_days = np.where(sells_out, days, 0).astype(np.int64)
+        dates = (np.datetime64(self.as_of, 'D') + whole_days.astype('timedelta64[D]')).tolist()
+
+        results = {}
+        for product_id, v, t, d, date, known in zip(
+            product_ids[indexes].tolist(),
+            np.round(velocity[indexes], 3).tolist(),
+            np.round(trend[indexes], 4).tolist(),
+            whole_days.tolist(),
+            dates,
+            sells_out.tolist(),
+        ):
+            results[product_id] = {
+                'velocity': v,
+                'trend': t,
+                'days_until_stockout': d if known else None,
+                'stockout_date': date if known else None,
+            }
+        return results
+
+
+def load_sales_matrix(start, end):
+    """
+    Loads the daily sales rollup for [start, end) into a dense
+    (products x days) matrix. Returns (product_ids, matrix).
+    """
+    from apps.orders.models import ProductDailySales
+
+    rows = ProductDailySales.objects.filter(date__gte=start, date__lt=end, units_sold__gt=0)\
+        .values_list('product_id', 'date', 'units_sold')
+    product_ids, dates, units = [], [], []
+    for product_id, day, units_sold in rows.iterator(chunk_size=5000):
+        product_ids.append(product_id)
+        dates.append((day - start).days)
+        units.append(units_sold)
+
+    days = (end - start).days
+    unique_ids, row_index = np.unique(np.asarray(product_ids, dtype=np.int64), return_inverse=True)
+    matrix = np.zeros((len(unique_ids), days), dtype=np.float64)
+    np.add.at(matrix, (row_index, np.asarray(dates, dtype=np.int64)), np.asarray(units, dtype=np.float64))
+    return unique_ids, matrix
+
+
+def get_catalog_forecast() -> CatalogForecast:
+    """
+    Returns today's forecast, computed from complete days only (up to
+    yesterday) and cached until the day changes.
+    """
+    today = timezone.localdate()
+    key = CACHE_KEY.format(today.isoformat())
+    forecast = cache.get(key)
+    if forecast is None:
+        product_ids, sales = load_sales_matrix(today - timedelta(days=HISTORY_DAYS), today)
+        forecast = CatalogForecast.from_sales_matrix(product_ids, sales, today)
+        cache.set(key, forecast, CACHE_TIMEOUT)
+    return forecast
+
+
+def attach_forecast(products, forecast: CatalogForecast = None):
+    """
+    Sets sales_velocity, sales_trend, predicted_days_until_stockout and
+    predicted_stockout_date on every product (None without sales history).
+    """
+    forecast = forecast or get_catalog_forecast()
+    results = forecast.for_products([p.id for p in products], [p.quantity for p in products])
+    for product in products:
+        result = results.get(product.id, {})
+        product.sales_velocity = result.get('velocity')
+        product.sales_trend = result.get('trend')
+        product.predicted_days_until_stockout = result.get('days_until_stockout')
+        product.predicted_stockout_date = result.get('stockout_date')
+    return products
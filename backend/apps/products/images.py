@@ -0,0 +1,92 @@
+# apps/products/images.py
+
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Fixed-width JPEG thumbnails for catalog cards and recommendation tiles
+THUMBNAIL_WIDTHS = (160, 320, 640)
+THUMBNAIL_QUALITY = 82
+# A WebP rendition for full product views, capped at this width
+WEBP_MAX_WIDTH = 1280
+WEBP_QUALITY = 80
+VARIANTS_DIR = 'products/variants'
+
+# Variants generated after an upload are rendered off the request path
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-variants')
+
+
+def _resized(image, width):
+    if image.width <= width:
+        return image.copy()
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _save(storage, name, image, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, **params)
+    # Replace any variant left by a previous image with the same name
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_variants(image_name: str, storage=None) -> dict:
+    """
+    Renders the thumbnails and the WebP rendition of a stored product image.
+    Returns {'w160': path, 'w320': path, 'w640': path, 'webp': path}.
+    Pure CPU/file work with no database access, so it can run in a process pool.
+    """
+    storage = storage or default_storage
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+
+    with storage.open(image_name, 'rb') as image_file:
+        image = Image.open(image_file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    rgb = image.convert('RGB') if image.mode != 'RGB' else image
+    variants = {}
+    for width in THUMBNAIL_WIDTHS:
+        variants[f'w{width}'] = _save(
+            storage, f'{VARIANTS_DIR}/{stem}_w{width}.jpg', _resized(rgb, width),
+            format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True,
+        )
+    webp_source = image if image.mode in ('RGB', 'RGBA') else rgb
+    variants['webp'] = _save(
+        storage, f'{VARIANTS_DIR}/{stem}.webp', _resized(webp_source, WEBP_MAX_WIDTH),
+        format='WEBP', quality=WEBP_QUALITY, method=4,
+    )
+    return variants
+
+
+def schedule_variants(product_id: int, image_name: str):
+    """
+    Generates the variants of a product's image in the background and stores
+    their paths on the product. Call it through transaction.on_commit.
+    """
+    _executor.submit(_generate_and_store, product_id, image_name)
+
+
+def _generate_and_store(product_id, image_name):
+    from .cache import bump_version
+    from .models import Product
+
+    try:
+        variants = generate_variants(image_name)
+        # Skip the write if the image was replaced while the variants were rendered
+        if Product.objects.filter(pk=product_id, image=image_name).update(image_variants=variants):
+            bump_version('products')
+        logger.info(f"Generated image variants for product {product_id}")
+    except Exception as e:
+        logger.error(f"Failed to generate image variants for product {product_id}: {e}", exc_info=True)
+    finally:
+        close_old_connections()
@@ -0,0 +1,164 @@
+# apps/products/importers.py
+
+import csv
+import io
+import json
+import time
+from django.db import transaction, DatabaseError
+from django.db.models import Q
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_version
+from .models import Category, Product
+from .serializers import ProductImportSerializer
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 500
+# Only the first errors are reported back, the count is always exact
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(filename: str, requested: str = None) -> str:
+    if requested:
+        return requested.lower()
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def iter_rows(stream, import_format: str):
+    """
+    Yields (row_number, row) pairs from a binary or text stream without
+    reading it all into memory. A JSONL line that cannot be parsed is
+    yielded as an exception so the importer can report it.
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if import_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), start=1):
+            # Empty CSV cells mean "not set", not an empty string
+            yield row_number, {key: value for key, value in row.items() if key and value not in ('', None)}
+    else:
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, ValueError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(row, dict):
+                yield row_number, ValueError('Each line must be a JSON object.')
+                continue
+            yield row_number, row
+
+
+class ProductImporter:
+    """
+    Imports products in batches with bulk_create. Categories are resolved
+    through an in-memory slug -> id map, and the categories a batch adds are
+    created with a single bulk insert. Invalid rows are collected as errors
+    and skipped; they never abort the import.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        # One serializer validates every row, its fields are only built once
+        self.row_serializer = ProductImportSerializer()
+        self.category_ids = {}
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def run(self, rows) -> dict:
+        start = time.perf_counter()
+        batch = []
+        for row_number, row in rows:
+            self.rows += 1
+            if isinstance(row, Exception):
+                self.add_error(row_number, {'non_field_errors': [str(row)]})
+                continue
+
+            try:
+                validated_data = self.row_serializer.run_validation(row)
+            except ValidationError as e:
+                self.add_error(row_number, e.detail)
+                continue
+
+            batch.append((row_number, validated_data))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+        if self.created:
+            # bulk_create does not send post_save, so invalidate the cached catalog here
+            bump_version('products', 'categories')
+        self.elapsed = time.perf_counter() - start
+        return self.summary()
+
+    def flush(self, batch):
+        self.resolve_categories({row['category'] for _, row in batch})
+
+        products, row_numbers = [], []
+        for row_number, row in batch:
+            data = dict(row)
+            category_id = self.category_ids.get(slugify(data.pop('category')))
+            if category_id is None:
+                self.add_error(row_number, {'category': ['Could not resolve this category.']})
+                continue
+            products.append(Product(category_id=category_id, **data))
+            row_numbers.append(row_number)
+
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+            self.created += len(products)
+        except DatabaseError as e:
+            for row_number in row_numbers:
+                self.add_error(row_number, {'non_field_errors': [f'Database error: {e}']})
+
+    def resolve_categories(self, names):
+        missing = {}
+        for name in sorted(names):
+            slug = slugify(name)
+            # A name without any slug characters cannot be resolved and is reported by flush()
+            if slug and slug not in self.category_ids:
+                missing.setdefault(slug, name)
+        if not missing:
+            return
+
+        # A category may already exist under another spelling of the name, or with another slug
+        self.load_categories(missing)
+        new = [Category(name=name, slug=slug) for slug, name in missing.items() if slug not in self.category_ids]
+        if new:
+            Category.objects.bulk_create(new, ignore_conflicts=True)
+            self.load_categories({category.slug: category.name for category in new})
+
+    def load_categories(self, missing):
+        names = Q()
+        for name in missing.values():
+            names |= Q(name__iexact=name)
+        for category_id, slug, name in Category.objects.filter(
+            names | Q(slug__in=missing.keys())
+        ).values_list('id', 'slug', 'name'):
+            self.category_ids[slug] = category_id
+            self.category_ids.setdefault(slugify(name), category_id)
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def summary(self) -> dict:
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.failed,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows / self.elapsed, 1) if self.elapsed else None,
+            'errors': self.errors,
+        }
@@ -0,0 +1,75 @@
+# apps/products/management/commands/bench_product_serialization.py
+
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from apps.products.models import Category, Product
+from apps.products.serializers import ProductSerializer, ProductReadSerializer, product_values
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark data."""
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks product serialization: ProductSerializer vs. the .values() fast path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Number of products to serialize.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path; the best run is reported.')
+
+    def handle(self, *args, **options):
+        count, repeat = options['count'], options['repeat']
+        try:
+            # Seed the products inside a transaction that is always rolled back
+            with transaction.atomic():
+                self.seed(count)
+                queryset = Product.objects.filter(name__startswith='bench-').order_by('-created_at')
+                paths = {
+                    'ProductSerializer (current)': lambda: ProductSerializer(queryset.all(), many=True).data,
+                    'ProductReadSerializer (.values())': lambda: ProductReadSerializer(product_values(queryset.all()), many=True).data,
+                    'ProductReadSerializer (?fields=id,name,price)': lambda: ProductReadSerializer(
+                        product_values(queryset.all(), 'id,name,price'), many=True, fields='id,name,price'
+                    ).data,
+                }
+                for label, run in paths.items():
+                    self.report(label, run, count, repeat)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        categories = [
+            Category.objects.create(name=f'bench-category-{i}', slug=f'bench-category-{i}')
+            for i in range(10)
+        ]
+        Product.objects.bulk_create([
+            Product(
+                category=categories[i % len(categories)],
+                name=f'bench-product-{i}',
+                description='A benchmark product. ' * 10,
+                price=Decimal('19.99'),
+                quantity=i % 50,
+                image=f'products/bench-{i}.jpg',
+                ai_meta_title='Benchmark meta title',
+                ai_meta_description='Benchmark meta description. ' * 5,
+                ai_keywords='bench, product, keywords',
+                ai_tags='bench, product, tags',
+            )
+            for i in range(count)
+        ], batch_size=500)
+
+    def report(self, label, run, count, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                data = run()
+                timings.append(time.perf_counter() - start)
+        assert len(data) == count
+        best = min(timings)
+        self.stdout.write(
+            f"{label}: {best * 1000:.1f} ms, {count / best:,.0f} products/sec, {len(queries)} queries"
+        )
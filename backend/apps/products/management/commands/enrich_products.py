@@ -0,0 +1,154 @@
+# apps/products/management/commands/enrich_products.py
+
+import asyncio
+import json
+import os
+import time
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from apps.products.ai_utils import AsyncRateLimiter, ContentMismatchError, generate_product_content
+from apps.products.cache import bump_version
+from apps.products.models import Product
+
+AI_FIELDS = ['ai_meta_title', 'ai_meta_description', 'ai_keywords', 'ai_tags']
+
+
+class Command(BaseCommand):
+    help = 'Generates the AI SEO fields and tags for products that are missing them or have stale ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-days', type=int, default=None,
+                            help='Also refresh products whose AI fields were generated more than N days ago.')
+        parser.add_argument('--concurrency', type=int, default=5, help='Maximum simultaneous model calls.')
+        parser.add_argument('--rate-limit', type=float, default=60, help='Maximum model calls per minute.')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Products written (and checkpointed) together.')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many products.')
+        parser.add_argument('--checkpoint', type=str, default='enrich_products_checkpoint.json',
+                            help='File recording progress, so an interrupted run resumes where it stopped.')
+        parser.add_argument('--reset', action='store_true', help='Ignore the checkpoint and start from the beginning.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.checkpoint = self.load_checkpoint()
+        self.started = time.perf_counter()
+        self.processed = self.updated = 0
+        self.failures = []
+        self.completed = False
+
+        self.stdout.write(
+            f"Enriching products after ID {self.checkpoint['last_id']} "
+            f"(retrying {len(self.checkpoint['failed_ids'])} failed earlier)..."
+        )
+        asyncio.run(self.run())
+        if self.completed:
+            # The next run starts over, which picks up this run's failures again
+            self.clear_checkpoint()
+
+        elapsed = time.perf_counter() - self.started
+        for product_id, reason in self.failures[:20]:
+            self.stderr.write(f"Product {product_id}: {reason}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Finished. {self.updated} updated, {len(self.failures)} failed, {self.processed} processed "
+            f"in {elapsed:.1f}s ({self.processed / elapsed if elapsed else 0:.2f} products/sec)."
+        ))
+
+    def selection(self):
+        missing = Q()
+        for field in AI_FIELDS:
+            missing |= Q(**{f'{field}__isnull': True}) | Q(**{field: ''})
+        if self.options['stale_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=self.options['stale_days'])
+            missing |= Q(ai_content_generated_at__isnull=True) | Q(ai_content_generated_at__lt=cutoff)
+        return Product.objects.filter(missing).select_related('category').order_by('pk')
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        limiter = AsyncRateLimiter(self.options['rate_limit'])
+        limit = self.options['limit']
+        # Products that failed before the last interruption are retried first;
+        # the ones failing in this run are only recorded for the next one
+        retry_ids = self.checkpoint['failed_ids']
+        failed_ids = []
+
+        while limit is None or self.processed < limit:
+            size = self.options['chunk_size'] if limit is None else min(self.options['chunk_size'], limit - self.processed)
+            if retry_ids:
+                ids, retry_ids = retry_ids[:size], retry_ids[size:]
+                chunk = await sync_to_async(list)(self.selection().filter(pk__in=ids))
+            else:
+                # Keyset pagination on the primary key, resuming from the checkpoint
+                chunk = await sync_to_async(list)(self.selection().filter(pk__gt=self.checkpoint['last_id'])[:size])
+                if not chunk:
+                    self.completed = True
+                    break
+                self.checkpoint['last_id'] = chunk[-1].pk
+
+            results = await asyncio.gather(*(self.enrich(product, semaphore, limiter) for product in chunk))
+            enriched = [product for product in results if product is not None]
+            if enriched:
+                await sync_to_async(Product.objects.bulk_update)(enriched, AI_FIELDS + ['ai_content_generated_at'])
+                await sync_to_async(bump_version)('products')
+
+            self.processed += len(chunk)
+            self.updated += len(enriched)
+            failed_ids += [product.pk for product, result in zip(chunk, results) if result is None]
+            self.checkpoint['failed_ids'] = retry_ids + failed_ids
+            self.save_checkpoint()
+
+            elapsed = time.perf_counter() - self.started
+            self.stdout.write(
+                f"{self.processed} processed, {self.updated} updated, {len(self.failures)} failed "
+                f"({self.processed / elapsed:.2f} products/sec)"
+            )
+
+    async def enrich(self, product, semaphore, limiter):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                image_bytes = await asyncio.to_thread(self.read_image, product)
+                content = await asyncio.to_thread(
+                    generate_product_content, product.name, product.category.name, image_bytes
+                )
+            except ContentMismatchError as e:
+                self.failures.append((product.pk, f"Image mismatch: {e}"))
+                return None
+            except Exception as e:
+                self.failures.append((product.pk, str(e)))
+                return None
+
+        product.ai_meta_title = content['meta_title']
+        product.ai_meta_description = content['meta_description']
+        product.ai_keywords = content['keywords']
+        product.ai_tags = content['tags']
+        product.ai_content_generated_at = timezone.now()
+        return product
+
+    def read_image(self, product):
+        if not product.image:
+            return None
+        with product.image.open('rb') as image_file:
+            return image_file.read()
+
+    def load_checkpoint(self) -> dict:
+        path = self.options['checkpoint']
+        if self.options['reset'] or not os.path.exists(path):
+            return {'last_id': 0, 'failed_ids': []}
+        try:
+            with open(path) as f:
+                return {'failed_ids': [], **json.load(f)}
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read checkpoint {path}: {e}. Use --reset to start over.")
+
+    def save_checkpoint(self):
+        path = self.options['checkpoint']
+        # Write then rename, so a crash never leaves a half-written checkpoint
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(f'{path}.tmp', path)
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.options['checkpoint']):
+            os.remove(self.options['checkpoint'])
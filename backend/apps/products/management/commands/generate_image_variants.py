@@ -0,0 +1,68 @@
+# apps/products/management/commands/generate_image_variants.py
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+from apps.products.cache import bump_version
+from apps.products.images import generate_variants
+from apps.products.models import Product
+
+
+def _render(job):
+    product_id, image_name = job
+    try:
+        return product_id, image_name, generate_variants(image_name), None
+    except Exception as e:
+        return product_id, image_name, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Generates the resized thumbnails and WebP rendition for product images, using a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes.')
+        parser.add_argument('--batch-size', type=int, default=200, help='Products rendered and saved per batch.')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants for products that already have them.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            products = products.filter(image_variants={})
+        total = products.count()
+        self.stdout.write(f"Generating image variants for {total} products with {options['workers']} workers...")
+
+        done = failed = 0
+        last_id = 0
+        start = time.monotonic()
+        # Children must not inherit the parent's open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                # Keyset pagination, so rows updated by a batch never shift the next one
+                jobs = list(
+                    products.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'image')[:batch_size]
+                )
+                if not jobs:
+                    break
+                last_id = jobs[-1][0]
+
+                updated = []
+                for product_id, image_name, variants, error in pool.map(_render, jobs, chunksize=8):
+                    if error:
+                        failed += 1
+                        self.stderr.write(f"Product {product_id} ({image_name}): {error}")
+                        continue
+                    updated.append(Product(pk=product_id, image_variants=variants))
+                Product.objects.bulk_update(updated, ['image_variants'])
+                done += len(updated)
+
+                elapsed = time.monotonic() - start
+                self.stdout.write(f"  {done + failed}/{total} processed ({done / elapsed:.1f} images/s)")
+
+        # bulk_update does not send post_save, so invalidate the cached payloads here
+        if done:
+            bump_version('products')
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {done} products, {failed} failed."))
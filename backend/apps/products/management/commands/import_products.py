@@ -0,0 +1,29 @@
+# apps/products/management/commands/import_products.py
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.products.importers import IMPORT_FORMATS, DEFAULT_BATCH_SIZE, ProductImporter, detect_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports products from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path to the CSV or JSONL file.')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Products inserted per query.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = detect_format(path, options['format'])
+        try:
+            with open(path, 'r', encoding='utf-8-sig', newline='') as stream:
+                summary = ProductImporter(batch_size=options['batch_size']).run(iter_rows(stream, import_format))
+        except OSError as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+        for error in summary['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} of {summary['rows']} rows ({summary['failed']} failed) "
+            f"in {summary['elapsed_seconds']}s, {summary['rows_per_second']} rows/sec."
+        ))
@@ -0,0 +1,42 @@
+# apps/products/management/commands/moderate_pending_reviews.py
+
+from django.core.management.base import BaseCommand
+from apps.products.models import Review
+from apps.products.moderation import moderate_reviews, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Moderates the backlog of PENDING reviews in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Reviews sent to the model per prompt.')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many reviews.')
+
+    def handle(self, *args, **options):
+        batch_size, limit = options['batch_size'], options['limit']
+        last_id = 0
+        processed = 0
+        totals = {}
+
+        self.stdout.write("Moderating pending reviews...")
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            # Keyset pagination: reviews left PENDING by the model are not picked up again
+            review_ids = list(
+                Review.objects.filter(status=Review.Status.PENDING, pk__gt=last_id)
+                .order_by('pk').values_list('pk', flat=True)[:size]
+            )
+            if not review_ids:
+                break
+
+            for new_status, count in moderate_reviews(review_ids).items():
+                totals[new_status] = totals.get(new_status, 0) + count
+            processed += len(review_ids)
+            last_id = review_ids[-1]
+            self.stdout.write(f"Processed {processed} reviews: {totals}")
+
+        still_pending = processed - sum(totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Finished. {totals.get('APPROVED', 0)} approved, {totals.get('REJECTED', 0)} rejected, "
+            f"{still_pending} left pending."
+        ))
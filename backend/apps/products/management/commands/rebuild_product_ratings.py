@@ -0,0 +1,57 @@
+# apps/products/management/commands/rebuild_product_ratings.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from apps.products.cache import bump_version
+from apps.products.models import ProductRating, Review
+
+AGGREGATE_FIELDS = ['rating_sum', 'rating_count', 'average_rating', 'count_1', 'count_2', 'count_3', 'count_4', 'count_5']
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product rating aggregates from the approved reviews and reports any drift.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Lock the aggregates so incremental updates wait for the rebuild
+            existing = {rating.product_id: rating for rating in ProductRating.objects.select_for_update()}
+
+            rows = Review.objects.filter(status=Review.Status.APPROVED).values('product_id').annotate(
+                rating_sum=Sum('rating'),
+                rating_count=Count('id'),
+                **{f'count_{stars}': Count('id', filter=Q(rating=stars)) for stars in range(1, 6)},
+            )
+
+            rebuilt = {}
+            for row in rows:
+                product_id = row.pop('product_id')
+                row['average_rating'] = row['rating_sum'] / row['rating_count']
+                rebuilt[product_id] = ProductRating(product_id=product_id, **row)
+
+            # Products whose approved reviews are all gone go back to zero
+            for product_id in existing.keys() - rebuilt.keys():
+                rebuilt[product_id] = ProductRating(product_id=product_id, average_rating=None)
+
+            drifted = [
+                product_id for product_id, rating in rebuilt.items()
+                if product_id not in existing or any(
+                    getattr(existing[product_id], field) != getattr(rating, field)
+                    for field in AGGREGATE_FIELDS
+                )
+            ]
+
+            ProductRating.objects.bulk_create(
+                rebuilt.values(),
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=AGGREGATE_FIELDS,
+            )
+            transaction.on_commit(lambda: bump_version('products'))
+
+        self.stdout.write(f"Rebuilt rating aggregates for {len(rebuilt)} products.")
+        if drifted:
+            self.stdout.write(self.style.WARNING(f"Corrected drift for {len(drifted)} products: {drifted[:20]}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
@@ -0,0 +1,48 @@
+# apps/products/management/commands/refresh_popularity_scores.py
+
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from apps.orders.models import ProductDailySales
+from apps.products.cache import bump_version
+from apps.products.models import Product
+from apps.products.popularity import HALF_LIFE_DAYS, day_weight
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every product popularity score from the daily sales rollup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=HALF_LIFE_DAYS * 52,
+            help='Days of sales history to include (older sales weigh almost nothing).'
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.localdate() - timedelta(days=options['days'])
+
+        with transaction.atomic():
+            # Lock the products first: orders placed during the refresh wait,
+            # and add their sales on top of the recomputed scores afterwards
+            products = list(Product.objects.select_for_update().order_by('pk').only('id', 'popularity_score'))
+
+            scores = {}
+            rows = ProductDailySales.objects.filter(date__gte=since, units_sold__gt=0)\
+                .values_list('product_id', 'date', 'units_sold')
+            for product_id, day, units_sold in rows.iterator(chunk_size=5000):
+                scores[product_id] = scores.get(product_id, 0.0) + units_sold * day_weight(day)
+
+            changed = []
+            for product in products:
+                score = scores.get(product.id, 0.0)
+                if product.popularity_score != score:
+                    product.popularity_score = score
+                    changed.append(product)
+            Product.objects.bulk_update(changed, ['popularity_score'], batch_size=1000)
+            # bulk_update does not send post_save, so invalidate the cached catalog here
+            transaction.on_commit(lambda: bump_version('products'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed popularity scores: {len(scores)} products with sales, {len(changed)} updated."
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:37
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRating',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating', serialize=False, to='products.product')),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('average_rating', models.FloatField(blank=True, null=True)),
+                ('count_1', models.IntegerField(default=0, help_text='Number of 1-star reviews.')),
+                ('count_2', models.IntegerField(default=0, help_text='Number of 2-star reviews.')),
+                ('count_3', models.IntegerField(default=0, help_text='Number of 3-star reviews.')),
+                ('count_4', models.IntegerField(default=0, help_text='Number of 4-star reviews.')),
+                ('count_5', models.IntegerField(default=0, help_text='Number of 5-star reviews.')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_productrating_alter_review_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ai_content_generated_at',
+            field=models.DateTimeField(blank=True, help_text='When the AI fields were last generated in bulk.', null=True),
+        ),
+    ]
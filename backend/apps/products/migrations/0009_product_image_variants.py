@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_ai_content_generated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Paths of the resized thumbnails and WebP rendition of the image.'),
+        ),
+    ]
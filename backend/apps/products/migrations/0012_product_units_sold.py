@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:31
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_units_sold(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductDailySales = apps.get_model('orders', 'ProductDailySales')
+    totals = ProductDailySales.objects.filter(product=models.OuterRef('pk')).order_by()\
+        .values('product').annotate(units=models.Sum('units_sold')).values('units')
+    Product.objects.update(units_sold=Coalesce(models.Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_filter_indexes'),
+        ('orders', '0002_productdailysales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='units_sold',
+            field=models.PositiveIntegerField(default=0, help_text='Lifetime units sold, kept in step with the daily sales rollup.'),
+        ),
+        migrations.RunPython(backfill_units_sold, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 # apps/products/models.py
 
-from django.db import models
+import uuid
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, NullIf
 from django.conf import settings
+from django.core.validators import MinValueValidator, MaxValueValidator
 
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -20,20 +24,47 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=0, help_text="The available stock quantity.")
     image = models.ImageField(upload_to='products/', null=True, blank=True, help_text="Product image file.")
+    image_variants = models.JSONField(default=dict, blank=True, help_text="Paths of the resized thumbnails and WebP rendition of the image.")
     
     ai_meta_title = models.CharField(max_length=255, blank=True, null=True, help_text="AI-generated SEO meta title.")
     ai_meta_description = models.TextField(blank=True, null=True, help_text="AI-generated SEO meta description.")
     ai_keywords = models.TextField(blank=True, null=True, help_text="AI-generated SEO keywords, comma-separated.")
     ai_tags = models.TextField(blank=True, null=True, help_text="AI-generated tags for recommendations, comma-separated.")
+    ai_content_generated_at = models.DateTimeField(blank=True, null=True, help_text="When the AI fields were last generated in bulk.")
+    popularity_score = models.FloatField(default=0, help_text="Time-decayed units sold, scaled from popularity.SCORE_EPOCH.")
+    units_sold = models.PositiveIntegerField(default=0, help_text="Lifetime units sold, kept in step with the daily sales rollup.")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at'] # Default ordering for products
+        indexes = [
+            # Trending lists read these as plain index scans
+            models.Index(fields=['-popularity_score'], name='product_popularity_idx'),
+            models.Index(fields=['category', '-popularity_score'], name='product_cat_popularity_idx'),
+            # Catalog filters: by category in listing order, by price range
+            # (alone or within a category), and in-stock products only
+            models.Index(fields=['category', '-created_at'], name='product_cat_created_idx'),
+            models.Index(fields=['category', 'price'], name='product_cat_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(
+                fields=['category', '-created_at'], condition=models.Q(quantity__gt=0),
+                name='product_instock_cat_idx',
+            ),
+            models.Index(fields=['-created_at'], condition=models.Q(quantity__gt=0), name='product_instock_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored image so a save can tell whether it was replaced
+        if 'image' not in instance.get_deferred_fields():
+            instance._loaded_image = instance.image.name or ''
+        return instance
     
 class Review(models.Model):
     # Define the choices for the review status
@@ -44,7 +75,7 @@ class Review(models.Model):
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reviews')
-    rating = models.PositiveIntegerField() # e.g., 1 to 5
+    rating = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)]) # 1 to 5
     text = models.TextField()
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -55,4 +86,114 @@ class Review(models.Model):
         unique_together = ('product', 'user')
 
     def __str__(self):
-        return f'Review by {self.user.email} for {self.product.name}'
\ No newline at end of file
+        return f'Review by {self.user.email} for {self.product.name}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this review contributed to the product rating when it was loaded
+        instance._approved_rating = instance.approved_rating() if instance._rating_loaded() else None
+        return instance
+
+    def _rating_loaded(self) -> bool:
+        deferred = self.get_deferred_fields()
+        return 'status' not in deferred and 'rating' not in deferred
+
+    def approved_rating(self):
+        return self.rating if self.status == self.Status.APPROVED else None
+
+    def save(self, *args, **kwargs):
+        # The rating aggregates are updated in the same transaction as the review
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            previous = getattr(self, '_approved_rating', None)
+            current = self.approved_rating()
+            if previous != current:
+                ProductRating.objects.apply_change(self.product_id, removed=previous, added=current)
+            self._approved_rating = current
+
+
+class ProductRatingManager(models.Manager):
+    def apply_change(self, product_id, removed=None, added=None):
+        """
+        Moves one review's rating out of and/or into the aggregates of a product.
+        Must run inside the transaction that changes the review.
+        """
+        changes = {}
+        for rating, delta in ((removed, -1), (added, 1)):
+            if rating is None:
+                continue
+            changes['rating_sum'] = changes.get('rating_sum', 0) + delta * rating
+            changes['rating_count'] = changes.get('rating_count', 0) + delta
+            if 1 <= rating <= 5:
+                changes[f'count_{rating}'] = changes.get(f'count_{rating}', 0) + delta
+        changes = {field: delta for field, delta in changes.items() if delta}
+        if not changes:
+            return
+
+        updates = {field: F(field) + delta for field, delta in changes.items()}
+        # The average is computed from the new sum and count in the same statement
+        updates['average_rating'] = (
+            Cast(F('rating_sum') + changes.get('rating_sum', 0), FloatField())
+            / NullIf(F('rating_count') + changes.get('rating_count', 0), 0)
+        )
+
+        if not self.filter(product_id=product_id).update(**updates) and added is not None:
+            try:
+                with transaction.atomic():
+                    self.create(product_id=product_id, **changes, average_rating=added)
+            except IntegrityError:
+                # Another transaction created the row first
+                self.filter(product_id=product_id).update(**updates)
+
+        # update() does not send post_save, so invalidate the cached product payloads here
+        from .cache import bump_version
+        transaction.on_commit(lambda: bump_version('products'))
+
+
+class ProductRating(models.Model):
+    """
+    Aggregates of a product's APPROVED reviews, maintained incrementally
+    whenever a review moves into or out of APPROVED.
+    Run `manage.py rebuild_product_ratings` to correct any drift.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    average_rating = models.FloatField(null=True, blank=True)
+    count_1 = models.IntegerField(default=0, help_text="Number of 1-star reviews.")
+    count_2 = models.IntegerField(default=0, help_text="Number of 2-star reviews.")
+    count_3 = models.IntegerField(default=0, help_text="Number of 3-star reviews.")
+    count_4 = models.IntegerField(default=0, help_text="Number of 4-star reviews.")
+    count_5 = models.IntegerField(default=0, help_text="Number of 5-star reviews.")
+
+    objects = ProductRatingManager()
+
+    def __str__(self):
+        return f'Rating of {self.product_id}: {self.average_rating} ({self.rating_count})'
+
+    @property
+    def histogram(self) -> dict:
+        return {str(stars): getattr(self, f'count_{stars}') for stars in range(1, 6)}
+
+class ContentJob(models.Model):
+    """
+    An asynchronous AI content generation, stored in the database so any
+    worker process can report its status when the client polls for it.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        SUCCESS = 'SUCCESS', 'Success'
+        FAILED = 'FAILED', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Content job {self.id}: {self.status}'
@@ -0,0 +1,110 @@
+# apps/products/moderation.py
+
+import logging
+import queue
+import threading
+import time
+from django.db import close_old_connections, transaction
+
+from .ai_utils import prefilter_review_text, moderate_reviews_batch
+from .cache import bump_version
+from .models import Review, ProductRating
+
+logger = logging.getLogger(__name__)
+
+# A batch is sent once it is full or once the oldest review waited this long
+BATCH_SIZE = 20
+BATCH_WAIT_SECONDS = 2.0
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue_review(review_id: int):
+    """
+    Queues a PENDING review for moderation by the background worker.
+    Call it through transaction.on_commit so the worker sees the saved row.
+    """
+    _ensure_worker()
+    _queue.put(review_id)
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name='review-moderation', daemon=True)
+            _worker.start()
+
+
+def _worker_loop():
+    while True:
+        review_ids = [_queue.get()]
+        deadline = time.monotonic() + BATCH_WAIT_SECONDS
+        while len(review_ids) < BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                review_ids.append(_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        try:
+            moderate_reviews(review_ids)
+        except Exception as e:
+            logger.error(f"Error moderating reviews {review_ids}: {e}", exc_info=True)
+        finally:
+            close_old_connections()
+
+
+def moderate_reviews(review_ids) -> dict:
+    """
+    Moderates the given reviews that are still PENDING.
+    The local prefilter decides the obvious cases; the rest go to the model
+    in a single batched prompt. Returns the number of reviews per new status.
+    """
+    reviews = list(
+        Review.objects.filter(pk__in=review_ids, status=Review.Status.PENDING)
+        .only('id', 'product_id', 'rating', 'text', 'status')
+    )
+
+    decisions = {}
+    undecided = {}
+    for review in reviews:
+        classification = prefilter_review_text(review.text)
+        if classification:
+            decisions[review.id] = classification
+        else:
+            undecided[review.id] = review.text
+    decisions.update(moderate_reviews_batch(undecided))
+
+    return apply_review_statuses(reviews, decisions)
+
+
+def apply_review_statuses(reviews, decisions: dict) -> dict:
+    """
+    Writes the moderation decisions. A review is only updated if it is still
+    PENDING with the text that was moderated, so an edit made while the model
+    was answering is never overwritten with a stale decision.
+    """
+    counts = {}
+    with transaction.atomic():
+        for review in reviews:
+            new_status = decisions.get(review.id, Review.Status.PENDING)
+            if new_status == Review.Status.PENDING:
+                continue
+            updated = Review.objects.filter(
+                pk=review.pk, status=Review.Status.PENDING, text=review.text
+            ).update(status=new_status)
+            if updated:
+                counts[new_status] = counts.get(new_status, 0) + 1
+                if new_status == Review.Status.APPROVED:
+                    ProductRating.objects.apply_change(review.product_id, added=review.rating)
+
+    if counts:
+        # update() does not send post_save, so invalidate the cached reviews here
+        bump_version('reviews')
+    logger.info(f"Moderated {len(reviews)} reviews: {counts}")
+    return counts
@@ -0,0 +1,46 @@
+# apps/products/popularity.py
+
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.utils import timezone
+
+# A sale loses half of its weight in the popularity score every HALF_LIFE_DAYS.
+#
+# Instead of decaying every stored score as time passes, a sale made at time t
+# adds quantity * 2^((t - SCORE_EPOCH) / half-life). Newer sales weigh more,
+# and since every score is scaled by the same factor the ranking is exactly
+# the ranking of the decayed scores, so nothing has to be rewritten over time.
+# Float scores stay finite for roughly 1000 half-lives (~19 years) past the
+# epoch; the epoch can be moved forward by running refresh_popularity_scores
+# after changing it.
+HALF_LIFE_DAYS = 7
+SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+_HALF_LIFE_SECONDS = HALF_LIFE_DAYS * 24 * 60 * 60
+
+# Default and maximum number of products returned by the trending list
+TRENDING_LIMIT = 20
+TRENDING_MAX_LIMIT = 100
+
+
+def sale_weight(moment=None) -> float:
+    """
+    The weight of one unit sold at `moment` (default: now).
+    """
+    moment = moment or timezone.now()
+    return 2.0 ** ((moment - SCORE_EPOCH).total_seconds() / _HALF_LIFE_SECONDS)
+
+
+def day_weight(day) -> float:
+    """
+    The weight of one unit sold on `day`, taken at midday so a daily rollup
+    matches the per-order weights on average.
+    """
+    return sale_weight(timezone.make_aware(datetime.combine(day, time(12))))
+
+
+def current_score(score: float, moment=None) -> float:
+    """
+    Converts a stored score to decayed units as of `moment` (default: now).
+    """
+    return score / sale_weight(moment)
@@ -3,7 +3,7 @@ from rest_framework import serializers
 from django.utils.text import slugify
 from django.utils import timezone
 from datetime import timedelta
-from .models import Category, Product, Review
+from .models import Category, Product, Review, ProductRating
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -33,6 +33,10 @@ class CategoryNameField(serializers.RelatedField):
 class ProductSerializer(serializers.ModelSerializer):
     # This custom field now handles all logic for both reading and writing
     category = CategoryNameField(queryset=Category.objects.all())
+    # Read from the ProductRating aggregates, load them with select_related('rating')
+    average_rating = serializers.SerializerMethodField()
+    review_count = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -44,27 +48,190 @@ class ProductSerializer(serializers.ModelSerializer):
             'price', 
             'quantity',
             'image',
+            'image_variants',
             'ai_meta_title',
             'ai_meta_description',
             'ai_keywords',
             'ai_tags',
+            'average_rating',
+            'review_count',
+            'updated_at',
         ]
+        # Sent back with bulk updates for optimistic concurrency checks
+        read_only_fields = ['updated_at']
+
+    def get_average_rating(self, obj) -> float | None:
+        return rating_average(get_product_rating(obj, 'average_rating'))
+
+    def get_review_count(self, obj) -> int:
+        return get_product_rating(obj, 'rating_count') or 0
+
+    def get_image_variants(self, obj) -> dict:
+        return image_variant_urls(obj.image_variants, self.context.get('request'))
+
+def get_product_rating(product, field):
+    try:
+        return getattr(product.rating, field)
+    except ProductRating.DoesNotExist:
+        return None
+
+def image_file_url(name, request=None):
+    # Mirrors serializers.ImageField: absolute URL when a request is available
+    if not name:
+        return None
+    url = Product._meta.get_field('image').storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+def image_variant_urls(variants, request=None) -> dict:
+    return {variant: image_file_url(name, request) for variant, name in (variants or {}).items()}
+
+def rating_average(value) -> float | None:
+    return round(value, 2) if value is not None else None
+
+class ProductReadSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer with the same output as ProductSerializer, built for
+    list pages and nested order items.
+    It accepts `.values()` rows from `product_values()` (no model instances are
+    built) or Product instances loaded with select_related('category', 'rating').
+    Pass `fields` to only render a subset of the fields (sparse fieldsets).
+    """
+    # Maps each output field to the column it is read from in a `.values()` row
+    FIELD_SOURCES = {
+        'id': 'id',
+        'category': 'category__name',
+        'name': 'name',
+        'description': 'description',
+        'price': 'price',
+        'quantity': 'quantity',
+        'image': 'image',
+        'image_variants': 'image_variants',
+        'ai_meta_title': 'ai_meta_title',
+        'ai_meta_description': 'ai_meta_description',
+        'ai_keywords': 'ai_keywords',
+        'ai_tags': 'ai_tags',
+        'average_rating': 'rating__average_rating',
+        'review_count': 'rating__rating_count',
+        'updated_at': 'updated_at',
+    }
+    price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+    updated_at_field = serializers.DateTimeField()
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selected_fields = parse_product_fields(fields)
+
+    def to_representation(self, product):
+        if isinstance(product, dict):
+            data = {field: product[self.FIELD_SOURCES[field]] for field in self.selected_fields}
+        else:
+            data = {field: self.instance_value(product, field) for field in self.selected_fields}
+
+        if 'price' in data:
+            data['price'] = self.price_field.to_representation(data['price'])
+        if 'updated_at' in data:
+            data['updated_at'] = self.updated_at_field.to_representation(data['updated_at'])
+        if 'image' in data:
+            data['image'] = image_file_url(getattr(data['image'], 'name', data['image']), self.context.get('request'))
+        if 'image_variants' in data:
+            data['image_variants'] = image_variant_urls(data['image_variants'], self.context.get('request'))
+        if 'average_rating' in data:
+            data['average_rating'] = rating_average(data['average_rating'])
+        if 'review_count' in data:
+            data['review_count'] = data['review_count'] or 0
+        return data
+
+    def instance_value(self, product, field):
+        if field == 'category':
+            return product.category.name
+        if field in ('average_rating', 'review_count'):
+            return get_product_rating(product, self.FIELD_SOURCES[field].split('__')[1])
+        return getattr(product, field)
+
+def parse_product_fields(fields) -> list:
+    """
+    Turns a `?fields=` value (comma-separated string or list) into the list of
+    product fields to render. Unknown names are ignored; nothing valid means
+    every field.
+    """
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    selected = [f.strip() for f in fields or [] if f.strip() in ProductReadSerializer.FIELD_SOURCES]
+    return selected or list(ProductReadSerializer.FIELD_SOURCES)
+
+def product_values(queryset, fields=None):
+    """
+    Returns the queryset as `.values()` rows holding only the columns needed
+    to render `fields` with ProductReadSerializer. The category name is
+    fetched through a join instead of one query per product.
+    """
+    sources = ProductReadSerializer.FIELD_SOURCES
+    return queryset.values(*(sources[field] for field in parse_product_fields(fields)))
         
+class ProductImportSerializer(serializers.ModelSerializer):
+    """
+    Validates one row of a bulk catalog import. The category stays a plain
+    name here; the importer resolves it through its own cached map instead
+    of a get_or_create per row.
+    """
+    category = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+
+    class Meta:
+        model = Product
+        fields = [
+            'category',
+            'name',
+            'description',
+            'price',
+            'quantity',
+            'ai_meta_title',
+            'ai_meta_description',
+            'ai_keywords',
+            'ai_tags',
+        ]
+
+class ProductBulkPatchSerializer(serializers.Serializer):
+    """
+    Validates one entry of a bulk price/stock update. When 'updated_at' is
+    given, the patch is only applied if the product was not modified since.
+    """
+    id = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    updated_at = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if 'price' not in attrs and 'quantity' not in attrs:
+            raise serializers.ValidationError("Provide a price and/or a quantity.")
+        return attrs
+
 #  Add a simple serializer for displaying the user in a review
 class ReviewUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'email', 'first_name']
 
+class ProductRatingSerializer(serializers.ModelSerializer):
+    average_rating = serializers.SerializerMethodField()
+    histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = ProductRating
+        fields = ['product', 'average_rating', 'rating_count', 'rating_sum', 'histogram']
+
+    def get_average_rating(self, obj) -> float | None:
+        return rating_average(obj.average_rating)
+
 #  Add the main ReviewSerializer
 class ReviewSerializer(serializers.ModelSerializer):
     user = ReviewUserSerializer(read_only=True)
 
     class Meta:
         model = Review
-        fields = ['id', 'user', 'rating', 'text', 'created_at']
-        # The user is set automatically from the request, so it's read-only
-        read_only_fields = ['id', 'user', 'created_at']
+        fields = ['id', 'user', 'rating', 'text', 'status', 'created_at']
+        # The user is set automatically from the request and the status by moderation, so they're read-only
+        read_only_fields = ['id', 'user', 'status', 'created_at']
 
 class ProductInventoryInsightSerializer(serializers.ModelSerializer):
     """
@@ -75,10 +242,15 @@ class ProductInventoryInsightSerializer(serializers.ModelSerializer):
     total_units_sold = serializers.IntegerField(read_only=True)
     sales_last_30_days = serializers.IntegerField(read_only=True)
 
-    # These fields are calculated here in the serializer
+    # These fields are precomputed for the whole catalog by forecasting.attach_forecast()
+    sales_velocity = serializers.FloatField(read_only=True, allow_null=True)
+    sales_trend = serializers.FloatField(read_only=True, allow_null=True)
+    predicted_days_until_stockout = serializers.IntegerField(read_only=True, allow_null=True)
+    predicted_stockout_date = serializers.DateField(read_only=True, allow_null=True)
+
+    # These fields are calculated here in the serializer, once per product
     status = serializers.SerializerMethodField()
     insight = serializers.SerializerMethodField()
-    predicted_days_until_stockout = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -88,28 +260,23 @@ class ProductInventoryInsightSerializer(serializers.ModelSerializer):
             'quantity', # Current stock
             'total_units_sold',
             'sales_last_30_days',
+            'sales_velocity',
+            'sales_trend',
             'status',
             'insight',
             'predicted_days_until_stockout',
+            'predicted_stockout_date',
         ]
 
-    def get_predicted_days_until_stockout(self, obj) -> int | None:
-        """
-        Predicts how many days are left until the product runs out of stock.
-        """
-        sales_in_period = obj.sales_last_30_days
-        if sales_in_period is None or sales_in_period <= 0:
-            return None # Cannot predict if there are no recent sales
-
-        # Calculate daily sales velocity
-        sales_velocity = sales_in_period / 30.0
-        if sales_velocity == 0:
-            return None
-
-        days_left = obj.quantity / sales_velocity
-        return int(days_left)
+    def to_representation(self, obj):
+        # The status is needed by both 'status' and 'insight', compute it only once
+        obj.inventory_status = self.compute_status(obj)
+        return super().to_representation(obj)
 
     def get_status(self, obj) -> str:
+        return obj.inventory_status
+
+    def compute_status(self, obj) -> str:
         """
         Applies business logic to determine the inventory status of a product.
         """
@@ -141,8 +308,8 @@ class ProductInventoryInsightSerializer(serializers.ModelSerializer):
         """
         Generates a human-readable insight based on the product's status.
         """
-        status = self.get_status(obj)
-        days_left = self.get_predicted_days_until_stockout(obj)
+        status = obj.inventory_status
+        days_left = obj.predicted_days_until_stockout
 
         if status == "CRITICAL":
             insight = f"High demand, critically low stock. "
@@ -0,0 +1,62 @@
+# apps/products/signals.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .images import schedule_variants
+from .models import Category, Product, Review, ProductRating
+
+
+@receiver([post_save, post_delete], sender=Product)
+def on_product_change(sender, instance, **kwargs):
+    bump_version('products')
+
+
+@receiver(post_save, sender=Product)
+def on_product_image_change(sender, instance, created, **kwargs):
+    # Deferred image fields (e.g. partial loads) are left alone
+    if not created and not hasattr(instance, '_loaded_image'):
+        return
+    image_name = instance.image.name or ''
+    if image_name == getattr(instance, '_loaded_image', ''):
+        return
+    instance._loaded_image = image_name
+
+    if image_name:
+        transaction.on_commit(lambda: schedule_variants(instance.pk, image_name))
+    elif instance.image_variants:
+        # The image was removed, drop the variants that belonged to it
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+
+
+@receiver([post_save, post_delete], sender=Category)
+def on_category_change(sender, instance, **kwargs):
+    # Product payloads include the category name, so they are invalidated too
+    bump_version('categories', 'products')
+
+
+@receiver([post_save, post_delete], sender=Review)
+def on_review_change(sender, instance, **kwargs):
+    bump_version('reviews')
+
+
+# User fields rendered with every review (ReviewUserSerializer)
+REVIEW_AUTHOR_FIELDS = {'email', 'first_name'}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def on_review_author_change(sender, instance, created, update_fields=None, **kwargs):
+    # Saves that only touch other fields (e.g. last_login on every login) are ignored
+    if created or (update_fields is not None and not REVIEW_AUTHOR_FIELDS & set(update_fields)):
+        return
+    bump_version('reviews')
+
+
+@receiver(post_delete, sender=Review)
+def on_review_delete(sender, instance, **kwargs):
+    # Runs inside the delete transaction, also for reviews removed by a cascade
+    if instance.status == Review.Status.APPROVED:
+        ProductRating.objects.apply_change(instance.product_id, removed=instance.rating)
@@ -1,3 +1,1064 @@
-from django.test import TestCase
+# apps/products/tests.py
 
-# Create your tests here.
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import ai_jobs, images
+from .ai_utils import (
+    CONTENT_CACHE_TIMEOUT, MISMATCH_CACHE_TIMEOUT, ContentMismatchError, generate_product_content, prefilter_review_text,
+)
+from .importers import ProductImporter, iter_rows
+from .facets import PRICE_BAND_KEYS, facet_counts, filter_products
+from .forecasting import (
+    FORECAST_HORIZON_DAYS, CatalogForecast, days_until_stockout, ewma_velocity, sales_trend,
+)
+from .models import Category, ContentJob, Product, ProductRating, Review
+from .popularity import HALF_LIFE_DAYS, current_score, sale_weight
+from .serializers import ProductReadSerializer, product_values
+
+User = get_user_model()
+
+# Latency samples per endpoint, and the p95 budget (ms) each must stay under.
+# Budgets are generous on purpose: they catch a change that makes an endpoint
+# an order of magnitude slower, not noise between machines.
+LATENCY_SAMPLES = 30
+LATENCY_BUDGETS_MS = {
+    'product-list': 250,
+    'product-reviews': 250,
+    'product-recommendations': 250,
+    'inventory-insights': 1000,
+}
+
+
+def seed_catalog(categories=4, products_per_category=15, reviews=12):
+    """
+    A small but realistic catalog: several categories, products with tags,
+    stock and prices across the price bands, and approved reviews by
+    different users on the first product.
+    """
+    created = []
+    for c in range(categories):
+        category = Category.objects.create(name=f'Category {c}', slug=f'category-{c}')
+        for p in range(products_per_category):
+            created.append(Product(
+                category=category,
+                name=f'Product {c}-{p}',
+                price=Decimal(5 + p * 20),
+                quantity=p % 5 * 10,
+                ai_tags='modern, ceramic' if p % 2 else 'rustic, wood',
+            ))
+    products = Product.objects.bulk_create(created)
+
+    reviewed = products[0]
+    for r in range(reviews):
+        user = User.objects.create_user(email=f'reviewer{r}@example.com', password='pass')
+        Review.objects.create(
+            product=reviewed, user=user, rating=r % 5 + 1,
+            text='Solid product, would buy again.', status=Review.Status.APPROVED,
+        )
+    admin = User.objects.create_user(email='admin@example.com', password='pass', is_staff=True)
+    return products, admin
+
+
+class EndpointQueryBudgetTests(APITestCase):
+    """
+    Every endpoint must run a fixed number of queries regardless of how many
+    products, reviews or tags it renders. A failing count usually means a
+    new lazy relation in a serializer (an N+1).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products, cls.admin = seed_catalog()
+        cls.product = cls.products[0]
+
+    def setUp(self):
+        # Measure the uncached path; the cached path is tested separately
+        cache.clear()
+
+    def test_product_list(self):
+        # category lookup for the filter, count, page, facet cells
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/products/?category=category-1&in_stock=true')
+        self.assertEqual(response.status_code, 200)
+        # the facet cells stay cached until a product changes
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/?page=2')
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_product_list_cached(self):
+        self.client.get('/api/products/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_the_etag(self):
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+        self.product.name = 'Renamed product'
+        self.product.save()
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(f'/api/products/{self.product.id}/').data['name'], 'Renamed product')
+
+    def test_review_author_change_invalidates_reviews(self):
+        url = f'/api/products/{self.product.id}/reviews/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        author = User.objects.get(pk=response.data['results'][0]['user']['id'])
+
+        # A login only touches last_login and keeps the cached list
+        author.last_login = author.date_joined
+        author.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        author.first_name = 'Renamed'
+        author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['user']['first_name'], 'Renamed')
+
+    def test_product_detail(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_trending(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/trending/?category=category-0')
+        self.assertEqual(response.status_code, 200)
+
+    def test_categories(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/categories/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_reviews(self):
+        # count, page with the authors joined
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/products/{self.product.id}/reviews/')
+        self.assertEqual(response.data['count'], 12)
+
+    def test_review_create(self):
+        user = User.objects.create_user(email='writer@example.com', password='pass')
+        self.client.force_authenticate(user)
+        # product lookup, then the review and its rating delta in one transaction
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                f'/api/products/{self.products[1].id}/reviews/',
+                {'rating': 4, 'text': 'Arrived quickly and looks great.'},
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_recommendations(self):
+        # current product, tag matches
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/products/{self.products[1].id}/recommendations/')
+        self.assertEqual(len(response.data), 4)
+
+    def test_recommendations_fallback(self):
+        Product.objects.filter(pk=self.products[1].pk).update(ai_tags='one-of-a-kind')
+        # current product, tag matches, category fallback
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/products/{self.products[1].id}/recommendations/')
+        self.assertEqual(len(response.data), 4)
+
+    def test_rating_stats(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/products/{self.product.id}/rating-stats/')
+        self.assertEqual(response.data['rating_count'], 12)
+
+    def test_inventory_insights(self):
+        self.client.force_authenticate(self.admin)
+        # products with their sales annotations, daily sales for the forecast
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/admin/inventory-insights/')
+        self.assertEqual(len(response.data), len(self.products))
+
+    def test_inventory_sales_figures(self):
+        from apps.orders.models import ProductDailySales
+        today = timezone.localdate()
+        product = self.products[3]
+        ProductDailySales.objects.bulk_create([
+            ProductDailySales(product=product, date=today - timedelta(days=days_ago), units_sold=units, revenue=0)
+            for days_ago, units in ((0, 1), (29, 2), (30, 4), (400, 8))
+        ])
+        Product.objects.filter(pk=product.pk).update(units_sold=15)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/products/admin/inventory-insights/')
+        row = next(row for row in response.data if row['id'] == product.id)
+        # Day 30 is outside the 30-day window that ends today
+        self.assertEqual((row['total_units_sold'], row['sales_last_30_days']), (15, 3))
+
+    def test_admin_product_list(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/admin/manage/')
+        self.assertEqual(response.status_code, 200)
+
+
+class EndpointLatencyTests(APITestCase):
+    """
+    Records p50/p95 latency of the hot endpoints on the uncached path and
+    fails when the p95 exceeds its budget.
+    """
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products, cls.admin = seed_catalog(categories=8, products_per_category=50, reviews=30)
+
+    @classmethod
+    def tearDownClass(cls):
+        for name, (p50, p95) in sorted(cls.results.items()):
+            sys.stderr.write(f"\n{name}: p50={p50:.1f}ms p95={p95:.1f}ms")
+        sys.stderr.write('\n')
+        super().tearDownClass()
+
+    def measure(self, name, url):
+        # The first request pays one-off costs (imports, URL resolver, query compilation)
+        self.client.get(url)
+        samples = []
+        for _ in range(LATENCY_SAMPLES):
+            cache.clear()
+            start = time.perf_counter()
+            response = self.client.get(url)
+            samples.append((time.perf_counter() - start) * 1000)
+            self.assertEqual(response.status_code, 200)
+        cuts = statistics.quantiles(samples, n=20)
+        p50, p95 = statistics.median(samples), cuts[18]
+        self.results[name] = (p50, p95)
+        self.assertLess(p95, LATENCY_BUDGETS_MS[name], f"{name} p95 {p95:.1f}ms is over budget")
+
+    def test_product_list(self):
+        self.measure('product-list', '/api/products/?in_stock=true')
+
+    def test_reviews(self):
+        self.measure('product-reviews', f'/api/products/{self.products[0].id}/reviews/')
+
+    def test_recommendations(self):
+        self.measure('product-recommendations', f'/api/products/{self.products[1].id}/recommendations/')
+
+    def test_inventory_insights(self):
+        self.client.force_authenticate(self.admin)
+        self.measure('inventory-insights', '/api/products/admin/inventory-insights/')
+
+
+class ReviewPrefilterTests(SimpleTestCase):
+
+    def test_obvious_violations_are_rejected(self):
+        for text in [
+            'Email me at seller@example.com for a discount',
+            'Call me on +1 415 555 0132',
+            'Ring (415) 555-0132 for wholesale prices',
+            'Cheaper at 415-555-0132',
+            'Text 4155550132 for a deal',
+            'Buy it cheaper at www.example.shop',
+            'This is a fucking scam',
+            'Total BULLSHIT product',
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(prefilter_review_text(text), 'REJECTED')
+
+    def test_innocent_reviews_go_to_the_model(self):
+        for text in [
+            'The flame retardant coating works well',
+            'Great for cooking shiitake mushrooms',
+            'Scunthorpe delivery was quick',
+            'Dimensions are 100 200 3000 mm as listed',
+            'Bought 3 in 2024, still going after 1,500 washes',
+            'I would call it a 10 out of 10',
+        ]:
+            with self.subTest(text=text):
+                self.assertIsNone(prefilter_review_text(text))
+
+
+class ProductRatingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Lamps', slug='lamps')
+        cls.product = Product.objects.create(category=category, name='Lamp', price=Decimal('20.00'), quantity=5)
+        cls.users = [User.objects.create_user(email=f'rater{u}@example.com', password='pass') for u in range(4)]
+
+    def review(self, user, rating, status=Review.Status.APPROVED):
+        return Review.objects.create(product=self.product, user=user, rating=rating, text='Nice lamp.', status=status)
+
+    def rating(self):
+        return ProductRating.objects.filter(product=self.product).first()
+
+    def assertRating(self, count, total, histogram):
+        rating = self.rating()
+        self.assertEqual((rating.rating_count, rating.rating_sum), (count, total))
+        self.assertEqual(rating.histogram, {str(stars): histogram.get(stars, 0) for stars in range(1, 6)})
+        if count:
+            self.assertAlmostEqual(rating.average_rating, total / count)
+        else:
+            self.assertIsNone(rating.average_rating)
+
+    def test_approved_reviews_are_counted(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 2)
+        self.assertRating(2, 7, {5: 1, 2: 1})
+
+    def test_pending_reviews_are_not_counted_until_approved(self):
+        review = self.review(self.users[0], 4, status=Review.Status.PENDING)
+        self.assertIsNone(self.rating())
+
+        review.status = Review.Status.APPROVED
+        review.save()
+        self.assertRating(1, 4, {4: 1})
+
+    def test_rating_change_moves_the_review_between_buckets(self):
+        review = self.review(self.users[0], 4)
+        self.review(self.users[1], 4)
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 1
+        review.save()
+        self.assertRating(2, 5, {4: 1, 1: 1})
+
+        # Saving without a change leaves the aggregates alone
+        review.save()
+        self.assertRating(2, 5, {4: 1, 1: 1})
+
+    def test_rejecting_and_deleting_remove_the_review(self):
+        rejected = self.review(self.users[0], 5)
+        deleted = self.review(self.users[1], 3)
+        self.review(self.users[2], 2)
+
+        rejected.status = Review.Status.REJECTED
+        rejected.save()
+        self.assertRating(2, 5, {3: 1, 2: 1})
+
+        Review.objects.get(pk=deleted.pk).delete()
+        self.assertRating(1, 2, {2: 1})
+
+        # Deleting a review that was not approved changes nothing
+        Review.objects.get(pk=rejected.pk).delete()
+        self.assertRating(1, 2, {2: 1})
+
+    def test_rebuild_matches_the_incremental_values(self):
+        self.review(self.users[0], 5)
+        changed = self.review(self.users[1], 3)
+        self.review(self.users[2], 1, status=Review.Status.PENDING)
+        self.review(self.users[3], 4).delete()
+        changed.rating = 2
+        changed.save()
+        incremental = self.rating()
+
+        out = StringIO()
+        call_command('rebuild_product_ratings', stdout=out)
+        self.assertIn('No drift found', out.getvalue())
+        rebuilt = self.rating()
+        for field in ['rating_sum', 'rating_count', 'average_rating', 'count_2', 'count_5']:
+            self.assertEqual(getattr(rebuilt, field), getattr(incremental, field))
+
+        # Drift is reported and corrected
+        ProductRating.objects.filter(product=self.product).update(rating_count=9, count_1=3)
+        out = StringIO()
+        call_command('rebuild_product_ratings', stdout=out)
+        self.assertIn('Corrected drift for 1 products', out.getvalue())
+        self.assertRating(2, 7, {5: 1, 2: 1})
+
+
+class ForecastTests(SimpleTestCase):
+
+    def test_velocity_and_trend_of_known_series(self):
+        sales = np.array([
+            [3.0] * 90,                 # steady
+            np.arange(90, dtype=float),  # one more unit every day
+            [0.0] * 90,                 # never sold in the window
+        ])
+        velocity = ewma_velocity(sales)
+        trend = sales_trend(sales)
+        self.assertAlmostEqual(velocity[0], 3.0)
+        self.assertAlmostEqual(trend[0], 0.0)
+        self.assertAlmostEqual(trend[1], 1.0)
+        # Recent days weigh more, so a rising series is above its mean
+        self.assertGreater(velocity[1], sales[1].mean())
+        self.assertEqual((velocity[2], trend[2]), (0.0, 0.0))
+
+    def test_short_history(self):
+        sales = np.array([[2.0, 4.0, 6.0]])
+        self.assertAlmostEqual(sales_trend(sales)[0], 2.0)
+        self.assertEqual(sales_trend(np.array([[5.0]]))[0], 0.0)
+        self.assertGreater(ewma_velocity(sales)[0], 4.0)
+
+    def test_days_until_stockout(self):
+        days = days_until_stockout(
+            np.array([10, 0, 10, 4, 10, 10, 10 ** 9]),
+            np.array([2.0, 2.0, 0.0, 1.0, 1.0, 0.0, 1.0]),
+            np.array([0.0, 0.0, 0.0, 2.0, -1.0, -0.5, 0.0]),
+        )
+        self.assertAlmostEqual(days[0], 5.0)                    # constant rate
+        self.assertEqual(days[1], 0.0)                           # already out of stock
+        self.assertTrue(np.isnan(days[2]))                       # no sales
+        self.assertAlmostEqual(days[3], (-1 + np.sqrt(17)) / 2)  # accelerating: t + t^2 = 4
+        self.assertTrue(np.isnan(days[4]))                       # sales stop before the stock runs out
+        self.assertTrue(np.isnan(days[5]))                       # falling to zero from zero
+        self.assertTrue(np.isnan(days[6]))                       # beyond FORECAST_HORIZON_DAYS
+        self.assertGreater(10 ** 9, FORECAST_HORIZON_DAYS)
+
+    def test_for_products(self):
+        as_of = date(2026, 10, 19)
+        forecast = CatalogForecast(np.array([30, 10]), np.array([1.0, 2.0]), np.array([0.0, 0.0]), as_of)
+        results = forecast.for_products([10, 20, 30], [8, 5, 0])
+
+        # Products without sales history are left out
+        self.assertEqual(set(results), {10, 30})
+        self.assertEqual(results[10]['days_until_stockout'], 4)
+        self.assertEqual(results[10]['stockout_date'], date(2026, 10, 23))
+        self.assertEqual(results[10]['velocity'], 2.0)
+        self.assertEqual(results[30]['days_until_stockout'], 0)
+        self.assertEqual(results[30]['stockout_date'], as_of)
+
+        empty = CatalogForecast(np.array([], dtype=np.int64), np.array([]), np.array([]), as_of)
+        self.assertEqual(empty.for_products([10], [5]), {})
+
+    def test_for_products_without_sales(self):
+        forecast = CatalogForecast(np.array([10]), np.array([0.0]), np.array([0.0]), date(2026, 10, 19))
+        self.assertEqual(forecast.for_products([10], [5])[10], {
+            'velocity': 0.0, 'trend': 0.0, 'days_until_stockout': None, 'stockout_date': None,
+        })
+
+
+class ExportStreamingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password='pass', is_staff=True)
+        category = Category.objects.create(name='Lamps', slug='lamps')
+        Product.objects.bulk_create([
+            Product(category=category, name=f'Lamp {p}', price=Decimal('10.00'), quantity=5) for p in range(5)
+        ])
+
+    @mock.patch('apps.products.exports.DEFAULT_CHUNK_SIZE', 2)
+    async def test_inventory_export_is_streamed_under_asgi(self):
+        response = await self.async_client.get(
+            reverse('inventory-insights-export') + '?output=ndjson',
+            headers={'authorization': f'Bearer {AccessToken.for_user(self.admin)}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        # An async iterator is sent a chunk at a time instead of being read in full first
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+
+
+class ProductImportTests(APITestCase):
+
+    def run_import(self, content, import_format='csv', batch_size=2):
+        return ProductImporter(batch_size=batch_size).run(iter_rows(BytesIO(content.encode()), import_format))
+
+    def test_invalid_rows_are_reported_and_the_rest_imported(self):
+        summary = self.run_import(
+            'name,category,price,quantity\n'
+            'Lamp,Lighting,10.00,5\n'
+            ',Lighting,10.00,5\n'
+            'Chair,Furniture,-1,5\n'
+            'Table,Furniture,99.00,many\n'
+            'Shelf,Furniture,49.00,\n'
+        )
+        self.assertEqual((summary['rows'], summary['created'], summary['failed']), (5, 2, 3))
+        self.assertEqual([error['row'] for error in summary['errors']], [2, 3, 4])
+        self.assertIn('name', summary['errors'][0]['errors'])
+        self.assertIn('price', summary['errors'][1]['errors'])
+        self.assertIn('quantity', summary['errors'][2]['errors'])
+        # Empty cells fall back to the model defaults
+        self.assertEqual(set(Product.objects.values_list('name', flat=True)), {'Lamp', 'Shelf'})
+
+    def test_invalid_jsonl_lines(self):
+        summary = self.run_import(
+            '{"name": "Lamp", "category": "Lighting", "price": "10.00"}\n'
+            '\n'
+            '{"name": "Broken"\n'
+            '["not", "an", "object"]\n',
+            import_format='jsonl',
+        )
+        self.assertEqual((summary['rows'], summary['created'], summary['failed']), (3, 1, 2))
+        self.assertEqual([error['row'] for error in summary['errors']], [3, 4])
+        self.assertIn('Invalid JSON', summary['errors'][0]['errors']['non_field_errors'][0])
+
+    def test_categories_are_created_once_and_matched_by_name(self):
+        decor = Category.objects.create(name='Home Decor', slug='decor')
+        summary = self.run_import(
+            'name,category,price\n'
+            'Vase,Home Decor,10.00\n'
+            'Rug,home decor,20.00\n'
+            'Desk,Office,30.00\n'
+            'Pen,office,1.00\n'
+            'Lamp,Office ,5.00\n'
+            'Mystery,!!!,5.00\n'
+        )
+        self.assertEqual((summary['created'], summary['failed']), (5, 1))
+        self.assertEqual(summary['errors'][0], {'row': 6, 'errors': {'category': ['Could not resolve this category.']}})
+        self.assertEqual(Category.objects.count(), 2)
+        office = Category.objects.get(slug='office')
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'category_id')),
+            {'Vase': decor.id, 'Rug': decor.id, 'Desk': office.id, 'Pen': office.id, 'Lamp': office.id},
+        )
+
+    def test_import_view(self):
+        admin = User.objects.create_user(email='importer@example.com', password='pass', is_staff=True)
+        self.client.force_authenticate(admin)
+        upload = SimpleUploadedFile('products.jsonl', b'{"name": "Lamp", "category": "Lighting", "price": "10.00"}\n')
+
+        response = self.client.post(reverse('product-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 0))
+
+        response = self.client.post(reverse('product-import'), {'file': upload, 'format': 'xml'}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,category,price\nLamp,Lighting,10.00\nChair,Furniture,-1\n')
+        self.addCleanup(os.remove, f.name)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_products', f.name, '--batch-size', '1', stdout=out, stderr=err)
+        self.assertIn('Imported 1 of 2 rows (1 failed)', out.getvalue())
+        self.assertIn('Row 2:', err.getvalue())
+        self.assertTrue(Product.objects.filter(name='Lamp', category__slug='lighting').exists())
+
+        with self.assertRaises(CommandError):
+            call_command('import_products', f.name + '.missing', stdout=StringIO())
+
+
+class BulkPatchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='manager@example.com', password='pass', is_staff=True)
+        category = Category.objects.create(name='Desks', slug='desks')
+        cls.products = Product.objects.bulk_create([
+            Product(category=category, name=f'Desk {p}', price=Decimal('100.00'), quantity=10) for p in range(3)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def patch(self, payload):
+        return self.client.post(reverse('product-admin-bulk-patch'), payload, format='json')
+
+    def test_valid_patches_are_applied_and_the_rest_reported(self):
+        first, second, third = self.products
+        response = self.patch([
+            {'id': first.id, 'price': '80.00'},
+            {'id': second.id, 'quantity': -1},
+            {'id': third.id},
+            {'id': 999999, 'quantity': 1},
+            'not a patch',
+            {'id': third.id, 'quantity': 0},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counts'], {'updated': 2, 'invalid': 3, 'not_found': 1})
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['updated', 'invalid', 'invalid', 'not_found', 'invalid', 'updated'])
+        self.assertIn('quantity', results[1]['errors'])
+        self.assertIn('non_field_errors', results[2]['errors'])
+        self.assertIsNone(results[4]['id'])
+
+        # The invalid entries do not roll back the valid ones
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'quantity')), {first.id: 10, second.id: 10, third.id: 0}
+        )
+        self.assertEqual(Product.objects.get(pk=first.pk).price, Decimal('80.00'))
+
+    def test_stale_patches_are_conflicts(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        response = self.patch([{'id': product.id, 'quantity': 3, 'updated_at': product.updated_at.isoformat()}])
+        self.assertEqual(response.data['counts'], {'updated': 1})
+
+        # The same timestamp is now out of date
+        response = self.patch([{'id': product.id, 'quantity': 4, 'updated_at': product.updated_at.isoformat()}])
+        self.assertEqual(response.data['counts'], {'conflict': 1})
+        self.assertEqual(Product.objects.get(pk=product.pk).quantity, 3)
+
+    def test_database_error_rolls_back_every_patch(self):
+        with mock.patch.object(Product.objects, 'bulk_update', side_effect=DatabaseError('deadlock')):
+            with self.assertRaises(DatabaseError):
+                self.patch([{'id': product.id, 'quantity': 0} for product in self.products])
+        self.assertFalse(Product.objects.filter(quantity=0).exists())
+
+    def test_request_must_be_a_non_empty_list(self):
+        for payload in ([], {'id': self.products[0].id, 'quantity': 1}):
+            response = self.patch(payload)
+            self.assertEqual(response.status_code, 400)
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+# The job runs on the test thread, whose connection must not be closed
+@mock.patch('apps.products.ai_jobs._executor', InlineExecutor())
+@mock.patch('apps.products.ai_jobs._run_in_thread', ai_jobs._run_job)
+class ContentJobTests(TestCase):
+
+    def submit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ai_jobs.submit_content_job('Lamp', 'Lighting', b'image')
+
+    def test_job_result_is_shared_through_the_database(self):
+        content = {'description': 'A lamp'}
+        with mock.patch('apps.products.ai_jobs.generate_product_content', return_value=content):
+            job_id = self.submit()
+        # Another worker process has its own cache, but reads the same row
+        cache.clear()
+        self.assertEqual(ai_jobs.get_job(job_id), {'id': job_id, 'status': 'SUCCESS', 'result': content})
+
+    def test_failed_jobs(self):
+        with mock.patch('apps.products.ai_jobs.generate_product_content', side_effect=ContentMismatchError('Not a lamp')):
+            job = ai_jobs.get_job(self.submit())
+        self.assertEqual((job['status'], job['error'], job['status_code']), ('FAILED', 'Not a lamp', 400))
+
+        with mock.patch('apps.products.ai_jobs.generate_product_content', side_effect=RuntimeError('quota')), \
+                self.assertLogs('apps.products.ai_jobs', 'ERROR'):
+            job = ai_jobs.get_job(self.submit())
+        self.assertEqual(job['status_code'], 500)
+
+    def test_unknown_and_expired_jobs(self):
+        self.assertIsNone(ai_jobs.get_job('not-a-uuid'))
+        self.assertIsNone(ai_jobs.get_job('0' * 32))
+
+        with mock.patch('apps.products.ai_jobs._executor', mock.Mock()):
+            job_id = self.submit()
+        self.assertEqual(ai_jobs.get_job(job_id)['status'], 'PENDING')
+        ContentJob.objects.update(created_at=timezone.now() - timedelta(seconds=ai_jobs.JOB_TIMEOUT + 1))
+        self.assertIsNone(ai_jobs.get_job(job_id))
+        # Expired jobs are cleaned up when the next one is submitted
+        with mock.patch('apps.products.ai_jobs._executor', mock.Mock()):
+            self.submit()
+        self.assertEqual(ContentJob.objects.count(), 1)
+
+
+class ContentCacheTests(SimpleTestCase):
+
+    def generate(self, verdict):
+        with mock.patch('apps.products.ai_utils.cache') as content_cache, \
+                mock.patch('apps.products.ai_utils._generate_product_content', return_value=verdict):
+            content_cache.get.return_value = None
+            try:
+                generate_product_content('Lamp', 'Lighting', b'image')
+            except ContentMismatchError:
+                pass
+        return content_cache.set.call_args.args[2]
+
+    def test_mismatches_are_cached_briefly(self):
+        self.assertEqual(self.generate({'match': True, 'content': {}}), CONTENT_CACHE_TIMEOUT)
+        self.assertEqual(self.generate({'match': False, 'reason': 'Not a lamp'}), MISMATCH_CACHE_TIMEOUT)
+
+
+class EnrichProductsTests(TransactionTestCase):
+    # The command queries from its own threads, so the rows must be committed
+
+    def setUp(self):
+        category = Category.objects.create(name='Lamps', slug='lamps')
+        self.products = Product.objects.bulk_create([
+            Product(category=category, name=f'Lamp {p}', price=Decimal('10.00'), quantity=5) for p in range(5)
+        ])
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'enrich_checkpoint.json')
+        self.broken = {self.products[1].name}
+
+    def generate(self, product_name, category_name, image_bytes):
+        if product_name in self.broken:
+            raise ValueError('Incomplete answer')
+        return {'meta_title': product_name, 'meta_description': 'Bright', 'keywords': 'lamp', 'tags': 'light'}
+
+    def run_command(self, *args):
+        out = StringIO()
+        with mock.patch('apps.products.management.commands.enrich_products.generate_product_content', self.generate):
+            call_command(
+                'enrich_products', '--checkpoint', self.checkpoint, '--chunk-size', '2', '--rate-limit', '100000',
+                *args, stdout=out, stderr=StringIO(),
+            )
+        return out.getvalue()
+
+    def enriched(self):
+        return set(Product.objects.exclude(ai_meta_title='').exclude(ai_meta_title=None).values_list('pk', flat=True))
+
+    def test_completed_run_clears_the_checkpoint(self):
+        output = self.run_command()
+        self.assertIn('4 updated, 1 failed, 5 processed', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        # Nothing skips the failed product on the next run
+        self.broken = set()
+        self.assertIn('1 updated, 0 failed, 1 processed', self.run_command())
+        self.assertEqual(self.enriched(), {product.pk for product in self.products})
+
+    def test_interrupted_run_retries_its_failures_first(self):
+        self.run_command('--limit', '2')
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f), {'last_id': self.products[1].pk, 'failed_ids': [self.products[1].pk]})
+
+        self.broken = set()
+        output = self.run_command()
+        self.assertIn('retrying 1 failed earlier', output)
+        self.assertIn('4 updated, 0 failed, 4 processed', output)
+        self.assertEqual(self.enriched(), {product.pk for product in self.products})
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class FacetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.chairs = Category.objects.create(name='Chairs', slug='chairs')
+        cls.tables = Category.objects.create(name='Tables', slug='tables')
+        # (category, price, quantity)
+        rows = [
+            (cls.chairs, '10.00', 5), (cls.chairs, '24.99', 0), (cls.chairs, '25.00', 3), (cls.chairs, '120.00', 0),
+            (cls.tables, '49.99', 2), (cls.tables, '99.00', 0), (cls.tables, '250.00', 1), (cls.tables, '300.00', 4),
+        ]
+        cls.products = Product.objects.bulk_create([
+            Product(category=category, name=f'Item {i}', price=Decimal(price), quantity=quantity)
+            for i, (category, price, quantity) in enumerate(rows)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def expected_counts(self, filters):
+        # Each facet is counted with the other facets' filters applied
+        def count(skip, **extra):
+            other = {key: value for key, value in filters.items() if key != skip and key not in ('min_price', 'max_price')}
+            return filter_products(Product.objects.all(), {**other, **extra}).count()
+
+        categories = [
+            {'slug': category.slug, 'name': category.name, 'count': count('category_id', category_id=category.id)}
+            for category in (self.chairs, self.tables)
+        ]
+        return {
+            'category': [entry for entry in categories if entry['count']],
+            'price_band': [{'key': key, 'count': count('price_band', price_band=key)} for key in PRICE_BAND_KEYS],
+            'stock': {'in_stock': count('in_stock', in_stock=True), 'out_of_stock': count('in_stock', in_stock=False)},
+        }
+
+    def test_counts_for_combined_filters(self):
+        combinations = [
+            {},
+            {'category_id': self.chairs.id},
+            {'price_band': '25-50'},
+            {'in_stock': True},
+            {'category_id': self.tables.id, 'in_stock': False},
+            {'category_id': self.chairs.id, 'price_band': 'under-25', 'in_stock': True},
+            {'price_band': '250-plus', 'in_stock': True, 'max_price': Decimal('260')},
+        ]
+        for filters in combinations:
+            with self.subTest(filters=filters):
+                self.assertEqual(facet_counts(filters), self.expected_counts(filters))
+
+        counts = facet_counts({'category_id': self.chairs.id, 'in_stock': True})
+        self.assertEqual([entry['count'] for entry in counts['category']], [2, 3])
+        self.assertEqual([entry['count'] for entry in counts['price_band']], [1, 1, 0, 0, 0])
+        self.assertEqual(counts['stock'], {'in_stock': 2, 'out_of_stock': 2})
+
+    def test_list_returns_the_facets_of_its_filters(self):
+        response = self.client.get(reverse('products-list'), {'category': 'tables', 'in_stock': 'true'})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            response.data['facets'], self.expected_counts({'category_id': self.tables.id, 'in_stock': True})
+        )
+
+    def test_cached_counts_are_invalidated(self):
+        with self.assertNumQueries(1):
+            facet_counts({})
+        with self.assertNumQueries(0):
+            facet_counts({})
+
+        # A product moving to another band and out of stock
+        product = self.products[0]
+        product.price = Decimal('60.00')
+        product.quantity = 0
+        product.save()
+        self.assertEqual(facet_counts({}), self.expected_counts({}))
+        self.assertEqual(facet_counts({})['stock'], {'in_stock': 4, 'out_of_stock': 4})
+
+        # A deleted product and a renamed category
+        self.products[-1].delete()
+        self.tables.name = 'Desks'
+        self.tables.save()
+        counts = facet_counts({})
+        self.assertEqual(counts['category'], [
+            {'slug': 'chairs', 'name': 'Chairs', 'count': 4}, {'slug': 'tables', 'name': 'Desks', 'count': 3},
+        ])
+
+        # Stock changes written with bulk_update
+        admin = User.objects.create_user(email='facets@example.com', password='pass', is_staff=True)
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('product-admin-bulk-patch'), [{'id': self.products[1].id, 'quantity': 7}], format='json')
+        self.assertEqual(facet_counts({})['stock'], {'in_stock': 4, 'out_of_stock': 3})
+
+
+def image_upload(name, size):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def stored_size(path):
+    with images.default_storage.open(path, 'rb') as f:
+        return Image.open(f).size
+
+
+# Variants are rendered on the test thread, whose connection must not be closed
+@mock.patch('apps.products.images._executor', InlineExecutor())
+@mock.patch('apps.products.images.close_old_connections', mock.Mock())
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media_root = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.category = Category.objects.create(name='Lamps', slug='lamps')
+
+    def create_product(self, size=(2000, 1000)):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                category=self.category, name='Lamp', price=Decimal('10.00'), image=image_upload('lamp.png', size),
+            )
+        product.refresh_from_db()
+        return product
+
+    def test_upload_generates_every_variant(self):
+        variants = self.create_product().image_variants
+        self.assertEqual(set(variants), {'w160', 'w320', 'w640', 'webp'})
+        self.assertEqual(stored_size(variants['w160']), (160, 80))
+        self.assertEqual(stored_size(variants['w320']), (320, 160))
+        self.assertEqual(stored_size(variants['w640']), (640, 320))
+        self.assertEqual(stored_size(variants['webp']), (images.WEBP_MAX_WIDTH, 640))
+        self.assertTrue(variants['webp'].endswith('.webp'))
+
+    def test_small_images_are_not_upscaled(self):
+        variants = self.create_product(size=(200, 100)).image_variants
+        self.assertEqual(stored_size(variants['w160']), (160, 80))
+        self.assertEqual(stored_size(variants['w640']), (200, 100))
+        self.assertEqual(stored_size(variants['webp']), (200, 100))
+
+    def test_saves_that_keep_the_image_do_not_regenerate(self):
+        product = self.create_product()
+        with mock.patch('apps.products.signals.schedule_variants') as schedule, \
+                self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Desk lamp'
+            product.save()
+        schedule.assert_not_called()
+
+    def test_job_for_a_replaced_image_is_dropped(self):
+        product = self.create_product()
+        old_image = product.image.name
+        with mock.patch('apps.products.signals.schedule_variants'), self.captureOnCommitCallbacks(execute=True):
+            product.image = image_upload('desk.png', (400, 400))
+            product.save()
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+
+        # A job queued for the old image finishes after the replacement
+        images._generate_and_store(product.pk, old_image)
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+    def test_removing_the_image_clears_the_variants(self):
+        product = Product.objects.get(pk=self.create_product().pk)
+        self.assertTrue(product.image_variants)
+        product.image = None
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+
+class GenerateImageVariantsCommandTests(TransactionTestCase):
+    # The command closes the connections before forking its worker processes
+
+    def setUp(self):
+        media_root = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        category = Category.objects.create(name='Lamps', slug='lamps')
+        # Products imported before variants existed; bulk_create skips the signal
+        self.products = Product.objects.bulk_create([
+            Product(
+                category=category, name=f'Lamp {p}', price=Decimal('10.00'),
+                image=images.default_storage.save(f'products/lamp{p}.png', image_upload(f'lamp{p}.png', (800, 600))),
+            )
+            for p in range(3)
+        ])
+        Product.objects.bulk_create([Product(category=category, name='No image', price=Decimal('10.00'))])
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '2', '--batch-size', '2', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_backfill(self):
+        output = self.run_command()
+        self.assertIn('Generated variants for 3 products, 0 failed.', output)
+        for product in Product.objects.exclude(image=''):
+            self.assertEqual(stored_size(product.image_variants['w320']), (320, 240))
+            self.assertEqual(stored_size(product.image_variants['webp']), (800, 600))
+        self.assertFalse(Product.objects.get(name='No image').image_variants)
+
+        # Only products still missing variants are picked up, unless forced
+        self.assertIn('Generated variants for 0 products', self.run_command())
+        self.assertIn('Generated variants for 3 products', self.run_command('--force'))
+
+    def test_broken_images_are_reported(self):
+        with images.default_storage.open(self.products[0].image.name, 'wb') as f:
+            f.write(b'not an image')
+        output = self.run_command()
+        self.assertIn('Generated variants for 2 products, 1 failed.', output)
+        self.assertFalse(Product.objects.get(pk=self.products[0].pk).image_variants)
+
+
+class PopularityTests(SimpleTestCase):
+
+    def test_sales_lose_half_their_weight_every_half_life(self):
+        now = timezone.now()
+        self.assertAlmostEqual(sale_weight(now) / sale_weight(now - timedelta(days=HALF_LIFE_DAYS)), 2.0)
+        score = 8 * sale_weight(now - timedelta(days=3 * HALF_LIFE_DAYS))
+        self.assertAlmostEqual(current_score(score, now), 1.0)
+
+
+class TrendingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from apps.orders.models import ProductDailySales
+        lamps = Category.objects.create(name='Lamps', slug='lamps')
+        chairs = Category.objects.create(name='Chairs', slug='chairs')
+        cls.products = {
+            name: Product.objects.create(category=category, name=name, price=Decimal('10.00'), quantity=20)
+            for name, category in (
+                ('old', lamps), ('last week', lamps), ('today', lamps), ('chair', chairs), ('unsold', lamps),
+            )
+        }
+        today = timezone.localdate()
+        ProductDailySales.objects.bulk_create([
+            ProductDailySales(product=cls.products[name], date=today - timedelta(days=days_ago), units_sold=units, revenue=0)
+            for name, days_ago, units in (
+                ('old', 4 * HALF_LIFE_DAYS, 10), ('last week', HALF_LIFE_DAYS, 2), ('today', 0, 2), ('chair', 0, 5),
+            )
+        ])
+        call_command('refresh_popularity_scores', stdout=StringIO())
+        cls.user = User.objects.create_user(email='trending@example.com', password='pass')
+
+    def setUp(self):
+        cache.clear()
+
+    def trending(self, **params):
+        response = self.client.get(reverse('products-trending'), params)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data]
+
+    def test_recent_sales_outrank_older_ones(self):
+        # 10 units four half-lives ago are worth 0.625 units sold today
+        self.assertEqual(self.trending(), ['chair', 'today', 'last week', 'old'])
+
+    def test_category(self):
+        self.assertEqual(self.trending(category='lamps'), ['today', 'last week', 'old'])
+        response = self.client.get(reverse('products-trending'), {'category': 'tables'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_limit(self):
+        self.assertEqual(self.trending(limit=2), ['chair', 'today'])
+        self.assertEqual(self.trending(limit=0), ['chair'])
+        with mock.patch('apps.products.views.TRENDING_MAX_LIMIT', 3):
+            self.assertEqual(self.trending(limit=1000), ['chair', 'today', 'last week'])
+        response = self.client.get(reverse('products-trending'), {'limit': 'ten'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('limit', response.data)
+
+    @mock.patch('apps.ai_support.signals.request_summary')
+    def test_orders_invalidate_the_cached_list(self, summary):
+        from apps.orders.services import create_order_from_payment_intent
+        self.assertNotIn('unsold', self.trending())
+        payment_intent = {
+            'id': 'pi_trending',
+            'amount': 6000,
+            'metadata': {
+                'user_id': str(self.user.id),
+                'cart': json.dumps({'items': [{'id': self.products['unsold'].id, 'quantity': 6}]}),
+            },
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            create_order_from_payment_intent('evt_trending', payment_intent)
+        self.assertEqual(self.trending(), ['unsold', 'chair', 'today', 'last week', 'old'])
+
+
+class SparseFieldsetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products, _ = seed_catalog(categories=2, products_per_category=3, reviews=2)
+        Product.objects.filter(pk=cls.products[0].pk).update(popularity_score=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_only_the_requested_fields_are_rendered(self):
+        response = self.client.get('/api/products/', {'fields': 'id,name,price'})
+        self.assertEqual(response.data['results'][0].keys(), {'id', 'name', 'price'})
+        response = self.client.get(f'/api/products/{self.products[0].id}/', {'fields': 'name,category,average_rating'})
+        self.assertEqual(response.data, {'name': 'Product 0-0', 'category': 'Category 0', 'average_rating': 1.5})
+        response = self.client.get('/api/products/trending/', {'fields': 'id'})
+        self.assertEqual(response.data, [{'id': self.products[0].id}])
+
+    def test_values_rows_and_instances_render_alike(self):
+        queryset = Product.objects.filter(pk=self.products[0].pk)
+        rows = list(product_values(queryset, 'name,category'))
+        self.assertEqual(rows, [{'name': 'Product 0-0', 'category__name': 'Category 0'}])
+        instance = queryset.select_related('category', 'rating').get()
+        self.assertEqual(
+            ProductReadSerializer(rows, many=True, fields='name,category').data,
+            [ProductReadSerializer(instance, fields=['name', 'category']).data],
+        )
+
+    def test_unknown_fields_are_ignored(self):
+        url = f'/api/products/{self.products[0].id}/'
+        self.assertEqual(self.client.get(url, {'fields': ' name ,password,'}).data, {'name': 'Product 0-0'})
+        # Nothing valid falls back to every field
+        every_field = self.client.get(url).data
+        self.assertEqual(every_field.keys(), ProductReadSerializer.FIELD_SOURCES.keys())
+        self.assertEqual(self.client.get(url, {'fields': 'password'}).data, every_field)
+
+    def test_each_fieldset_is_cached_separately(self):
+        url = f'/api/products/{self.products[0].id}/'
+        names = self.client.get(url, {'fields': 'name'})
+        prices = self.client.get(url, {'fields': 'price'})
+        self.assertNotEqual(names['ETag'], prices['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'fields': 'name'}).data, {'name': 'Product 0-0'})
+            self.assertEqual(self.client.get(url, {'fields': 'price'}).data, {'price': '5.00'})
+        response = self.client.get(url, {'fields': 'price'}, HTTP_IF_NONE_MATCH=names['ETag'])
+        self.assertEqual(response.status_code, 200)
@@ -1,7 +1,7 @@
 
 
 from django.urls import path, include
-from .views import ProductAdminViewSet, CategoryListView, ReviewViewSet, PublicProductViewSet, GenerateAIContentView, ProductRecommendationView, ProductInventoryInsightView
+from .views import ProductAdminViewSet, CategoryListView, ReviewViewSet, PublicProductViewSet, GenerateAIContentView, ProductRecommendationView, ProductInventoryInsightView, CacheStatsView, ProductRatingStatsView, ProductInventoryExportView, ProductImportView, GenerateAIContentJobView
 # from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 
@@ -24,11 +24,16 @@ urlpatterns = [
     
     # Admin-specific URLs should also come before the generic ones.
     path('admin/', include(admin_router.urls)),
+    path('admin/import/', ProductImportView.as_view(), name='product-import'),
     path('admin/generate-content/', GenerateAIContentView.as_view(), name='generate-ai-content'),
+    path('admin/generate-content/jobs/<str:job_id>/', GenerateAIContentJobView.as_view(), name='generate-ai-content-job'),
     path('admin/inventory-insights/', ProductInventoryInsightView.as_view(), name='inventory-insights'),
+    path('admin/inventory-insights/export/', ProductInventoryExportView.as_view(), name='inventory-insights-export'),
+    path('admin/cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
     
     # The generic product recommendations path with a variable <pk>
     path('<int:pk>/recommendations/', ProductRecommendationView.as_view(), name='product-recommendations'),
+    path('<int:pk>/rating-stats/', ProductRatingStatsView.as_view(), name='product-rating-stats'),
 
     # Now, include the generic router URLs. These will handle '/api/products/' and '/api/products/<pk>/'.
     # Because 'categories/' was handled above, it won't be incorrectly captured here.
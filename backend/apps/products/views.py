@@ -1,24 +1,33 @@
 #apps/products/views
 
 from rest_framework import generics, permissions, viewsets, status
-from .models import Product, Category, Review
-from .serializers import ProductSerializer, CategorySerializer, ReviewSerializer, ProductInventoryInsightSerializer
+from .models import Product, Category, Review, ProductRating
+from apps.orders.models import ProductDailySales
+from .serializers import (
+    ProductSerializer, ProductReadSerializer, CategorySerializer, ReviewSerializer,
+    ProductInventoryInsightSerializer, ProductRatingSerializer, ProductBulkPatchSerializer, product_values,
+)
 from .permissions import IsOwnerOrReadOnly
+from .cache import CachedResponseMixin, bump_version, get_cache_stats
+from .facets import facet_counts, filter_products, parse_product_filters
+from .forecasting import attach_forecast, get_catalog_forecast
+from .exports import EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, export_response
+from .importers import IMPORT_FORMATS, ProductImporter, detect_format, iter_rows
 from rest_framework.views import APIView # Add APIView
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response # Add Response
 from django.conf import settings # Add settings
-import google.generativeai as genai
-import json
-from .ai_utils import moderate_review_text
-from django.db.models import Count, Q, Sum, Value, IntegerField
+from .ai_utils import prefilter_review_text, generate_product_content, ContentMismatchError
+from .ai_jobs import JobStatus, submit_content_job, get_job
+from .popularity import TRENDING_LIMIT, TRENDING_MAX_LIMIT
+from .moderation import enqueue_review
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value, IntegerField
 from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
-from PIL import Image  # Import the Image module from Pillow
-import io  # Import io to handle in-memory bytes
-
-#  Configure the library with your API key
-genai.configure(api_key=settings.GEMINI_API_KEY)
 
 # class ProductListView(generics.ListAPIView):
 #     """
@@ -39,36 +48,182 @@ genai.configure(api_key=settings.GEMINI_API_KEY)
 #     # 'lookup_field' tells DRF what model field to use for retrieving the object.
 #     # The default is 'pk' (primary key), which is what we want.
 
-class PublicProductViewSet(viewsets.ReadOnlyModelViewSet):
+class PublicProductViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     A read-only viewset for public listing and retrieval of products.
     This handles both GET /api/products/ and GET /api/products/{id}/.
     The pagination is handled globally by the settings.
+    Responses are cached until a product or category changes.
+    Products are rendered from `.values()` rows; `?fields=id,name,price`
+    limits the payload to the requested fields.
+    GET /api/products/trending/ lists the best sellers by popularity score.
+    The list accepts ?category=, ?price_band=, ?min_price=, ?max_price= and
+    ?in_stock= filters and includes cached facet counts under 'facets'.
     """
     queryset = Product.objects.all().order_by('-created_at')
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.AllowAny]    
+    serializer_class = ProductReadSerializer
+    permission_classes = [permissions.AllowAny]
+    cache_scope = 'products'
+    cache_dependencies = ('products',)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_products(queryset, self.get_product_filters())
+        return product_values(queryset, self.request.query_params.get('fields'))
+
+    def get_product_filters(self) -> dict:
+        if not hasattr(self, '_product_filters'):
+            self._product_filters = parse_product_filters(self.request.query_params)
+        return self._product_filters
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['facets'] = facet_counts(self.get_product_filters())
+        return response
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.request.query_params.get('fields'))
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request, *args, **kwargs):
+        return self.cached_response(self.trending_response, request, *args, **kwargs)
+
+    def trending_response(self, request, *args, **kwargs):
+        """
+        The top `?limit=` (default 20, max 100) products by time-decayed
+        sales, optionally within one `?category=<slug>`. The category is
+        resolved first so the product query is an index scan on
+        (category, -popularity_score).
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', TRENDING_LIMIT)), 1), TRENDING_MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+
+        queryset = Product.objects.filter(popularity_score__gt=0)
+        category_slug = request.query_params.get('category')
+        if category_slug:
+            category = get_object_or_404(Category.objects.only('id'), slug=category_slug)
+            queryset = queryset.filter(category_id=category.id)
+        queryset = queryset.order_by('-popularity_score', '-id')[:limit]
+
+        serializer = self.get_serializer(product_values(queryset, request.query_params.get('fields')), many=True)
+        return Response(serializer.data)
 
 class ProductAdminViewSet(viewsets.ModelViewSet):
     """
     ViewSet for admins to manage products.
     Provides full CRUD functionality.
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category', 'rating')
     serializer_class = ProductSerializer
     # This is the crucial part: only staff users can access these endpoints
     permission_classes = [permissions.IsAdminUser]
+
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_patch(self, request, *args, **kwargs):
+        """
+        Applies a list of {id, price?, quantity?, updated_at?} patches in one
+        transaction. Patches whose 'updated_at' no longer matches the product
+        are reported as conflicts and skipped; the rest are written with a
+        single bulk_update. Returns one result per patch.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'error': 'Expected a non-empty list of patches.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(request.data)
+        patches = []
+        validator = ProductBulkPatchSerializer()
+        for index, entry in enumerate(request.data):
+            try:
+                patches.append((index, validator.run_validation(entry)))
+            except ValidationError as e:
+                results[index] = {'id': entry.get('id') if isinstance(entry, dict) else None, 'status': 'invalid', 'errors': e.detail}
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Lock every targeted row in one query, in primary-key order
+            products = {
+                product.id: product
+                for product in Product.objects.select_for_update()
+                .filter(pk__in=[patch['id'] for _, patch in patches])
+                .only('id', 'price', 'quantity', 'updated_at')
+                .order_by('pk')
+            }
+            changed = {}
+            for index, patch in patches:
+                product = products.get(patch['id'])
+                if product is None:
+                    results[index] = {'id': patch['id'], 'status': 'not_found'}
+                    continue
+                if 'updated_at' in patch and patch['updated_at'] != product.updated_at:
+                    results[index] = {'id': product.id, 'status': 'conflict', 'updated_at': product.updated_at}
+                    continue
+                product.price = patch.get('price', product.price)
+                product.quantity = patch.get('quantity', product.quantity)
+                product.updated_at = now
+                changed[product.id] = product
+                results[index] = {'id': product.id, 'status': 'updated', 'updated_at': now}
+
+            if changed:
+                Product.objects.bulk_update(changed.values(), ['price', 'quantity', 'updated_at'], batch_size=1000)
+                # bulk_update does not send post_save, so invalidate the cached catalog here
+                transaction.on_commit(lambda: bump_version('products'))
+
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'counts': counts, 'results': results}, status=status.HTTP_200_OK)
     
-class CategoryListView(generics.ListAPIView):
-    queryset = Category.objects.all()
+class ProductImportView(APIView):
+    """
+    An admin-only view to import many products from one CSV or JSONL file
+    (multipart field 'file', optional 'format'=csv|jsonl).
+    Invalid rows are reported with their row number and skipped.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'A CSV or JSONL file is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        import_format = detect_format(upload.name, request.data.get('format'))
+        if import_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported import format. Use one of: {', '.join(IMPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        summary = ProductImporter().run(iter_rows(upload.file, import_format))
+        return Response(summary, status=status.HTTP_200_OK)
+
+class CategoryListView(CachedResponseMixin, generics.ListAPIView):
+    queryset = Category.objects.order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
-    
+    cache_scope = 'categories'
+    cache_dependencies = ('categories',)
+
+class CacheStatsView(APIView):
+    """
+    An admin-only view that reports the catalog response cache hit rates
+    of the worker process serving the request.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_cache_stats(), status=status.HTTP_200_OK)
+
 # 3. Add the new AI content generation view
 class GenerateAIContentView(APIView):
     """
     An admin-only view to generate product content using the Gemini API.
-    It validates if the product name and image are related by passing the URL directly to the model.
+    It validates if the product name and image are related by sending a downscaled copy of the image to the model.
+    Results are cached by image, name and category. Send async=true to get a
+    job id back immediately and poll GenerateAIContentJobView for the result.
     """
     permission_classes = [permissions.IsAdminUser]
 
@@ -83,94 +238,53 @@ class GenerateAIContentView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            # Initialize the Gemini Pro model
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
-              # --- Read image bytes into memory ---
-            image_bytes = image_file.read()
-            pil_image = Image.open(io.BytesIO(image_bytes))
-
-            # Craft a detailed prompt for the AI
-            prompt = f"""
-            You are an e-commerce product analyst. Your task is to perform two steps:
-            1.  **Validation**: Analyze the user-provided image and the product name to determine if they are a plausible match for the same product listing.
-            2.  **Content Generation**: If they match, generate marketing content.
-
-            **Product Details:**
-            - Product Name: "{product_name}"
-            - Category: "{category_name}"
-
-            **Validation Rules:**
-            - Your primary goal is to check if the CORE OBJECT in the image matches the CORE OBJECT in the product name.
-            - Be flexible with subjective terms. For example, if the name is "Classic Bag" and the image is a "Stylish Handbag", this IS a match because the core object is a bag.
-            - Similarly, "Leather Ankle Boots" and an image of brown boots IS a match.
-            - A mismatch should only be for clear, undeniable errors. For example, a product named "Laptop" with an image of a shoe IS NOT a match.
-            - The goal is to prevent major category errors, not to police minor stylistic variations.
-
-            **Required Output Format:**
-            Your final output must be a single, clean JSON object. Do not include any text or formatting outside of this JSON object.
-
-            **JSON Structure:**
-            {{
-              "validation": {{
-                "match": boolean,
-                "reason": "In case of mismatch just say "The uploaded image does not appear to match the product name. Please ensure the correct image is uploaded for the name provided. Suggested name - (suggest a name from your thinking)", or 'OK' if they match."
-              }},
-              "content": {{
-                "description": "A compelling, user-friendly product description (around 50-70 words).",
-                "meta_title": "A concise and SEO-friendly meta title (around 50-60 characters).",
-                "meta_description": "An engaging SEO meta description (around 150-160 characters).",
-                "keywords": "A comma-separated list of 5-7 relevant SEO keywords.",
-                "tags": "A comma-separated list of 5-7 relevant tags for product recommendations."
-              }} | null
-            }}
-            """
-
-            # Make the API call to Gemini
-            response = model.generate_content([prompt, pil_image])
-            
-            # The response text should be a JSON string. We need to clean and parse it.
-            response_text = response.text.strip().replace('```json', '').replace('```', '')
-            ai_data = json.loads(response_text)
-
-           # Validates if the Image and Product name matches
-            validation_result = ai_data.get('validation', {})
-            if not validation_result.get('match'):
-                return Response(
-                    {'error': validation_result.get('reason', 'Image and product name do not match.')},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        image_bytes = image_file.read()
 
-            content = ai_data.get('content')
-
-             # Validate that the response contains the keys we expect
-            if not content:
-                raise ValueError("AI validation passed, but the 'content' block is missing or null.")
-
-            required_keys = ['description', 'meta_title', 'meta_description', 'keywords', 'tags']
-            missing_keys = [key for key in required_keys if key not in content]
-
-            if missing_keys:
-                raise ValueError(f"AI response is missing required content fields: {', '.join(missing_keys)}")
+        if str(request.data.get('async', '')).lower() in ('1', 'true', 'yes'):
+            job_id = submit_content_job(product_name, category_name, image_bytes)
+            return Response(
+                {'job_id': job_id, 'status': JobStatus.PENDING},
+                status=status.HTTP_202_ACCEPTED
+            )
 
+        try:
+            content = generate_product_content(product_name, category_name, image_bytes)
             return Response(content, status=status.HTTP_200_OK)
 
+        except ContentMismatchError as e:
+            # Validates if the Image and Product name matches
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             # Handle potential errors from the API call or JSON parsing
             return Response(
                 {'error': f'An error occurred while generating AI content: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+class GenerateAIContentJobView(APIView):
+    """
+    An admin-only view to poll an asynchronous content generation job.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_job(job_id)
+        if job is None:
+            return Response({'error': 'Job not found or expired.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job, status=status.HTTP_200_OK)
             
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for creating, viewing, updating, and deleting reviews.
+    Approved reviews are served from the cache until a review changes.
     """
-    queryset = Review.objects.all()
+    # The author is rendered with every review, so join it instead of one query per review
+    queryset = Review.objects.select_related('user')
     serializer_class = ReviewSerializer
     # Apply permissions: Must be logged in to do anything, and can only edit/delete your own.
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    cache_scope = 'reviews'
+    cache_dependencies = ('reviews',)
 
     def get_queryset(self):
         # This view should be nested under a product, so we filter by product_pk
@@ -178,33 +292,20 @@ class ReviewViewSet(viewsets.ModelViewSet):
             return self.queryset.filter(product_id=self.kwargs['product_pk'], status=Review.Status.APPROVED)
         return self.queryset.none() # Return nothing if not accessed via a product
 
-    def get_serializer_context(self):
-        # Pass the product and request to the serializer
-        context = super().get_serializer_context()
-        if 'product_pk' in self.kwargs:
-            context['product'] = Product.objects.get(pk=self.kwargs['product_pk'])
-        return context
-    
-    
-    # 2. Override perform_create to add moderation
+    # 2. Override perform_create to queue the review for moderation
     def perform_create(self, serializer):
-        # First, save the review with the default 'PENDING' status
+        # The product is only needed when a review is created, not on every read
+        product = get_object_or_404(Product.objects.only('id'), pk=self.kwargs.get('product_pk'))
+        # Obvious violations are rejected locally, everything else is saved
+        # as 'PENDING' and moderated in the background
+        classification = prefilter_review_text(serializer.validated_data['text'])
         review = serializer.save(
             user=self.request.user,
-            product=self.get_serializer_context()['product']
+            product=product,
+            status=classification or Review.Status.PENDING,
         )
-
-        # Now, send the text to the AI for moderation
-        classification = moderate_review_text(review.text)
-
-        # Update the status based on the AI's response
-        if classification == 'APPROVED':
-            review.status = Review.Status.APPROVED
-        elif classification == 'REJECTED':
-            review.status = Review.Status.REJECTED
-        
-        # The status remains 'PENDING' if the AI fails or is unsure
-        review.save()
+        if review.status == Review.Status.PENDING:
+            transaction.on_commit(lambda: enqueue_review(review.id))
 
     # 3. Override perform_update to add re-moderation on edit
     def perform_update(self, serializer):
@@ -215,24 +316,35 @@ class ReviewViewSet(viewsets.ModelViewSet):
         review.text = serializer.validated_data.get('text', review.text)
         review.rating = serializer.validated_data.get('rating', review.rating)
         
-        # IMPORTANT: Reset status to PENDING before re-moderating
-        review.status = Review.Status.PENDING
-        review.save() # Save the pending status first
-
-        # Re-moderate the new text
-        classification = moderate_review_text(review.text)
-        if classification == 'APPROVED':
-            review.status = Review.Status.APPROVED
-        elif classification == 'REJECTED':
-            review.status = Review.Status.REJECTED
-        
+        # IMPORTANT: Reset status to PENDING (or REJECTED by the prefilter) before re-moderating
+        review.status = prefilter_review_text(review.text) or Review.Status.PENDING
         review.save()
+
+        if review.status == Review.Status.PENDING:
+            transaction.on_commit(lambda: enqueue_review(review.id))
         
+class ProductRatingStatsView(APIView):
+    """
+    API view to get the rating aggregates of a product: average, count,
+    sum and the 1-5 star histogram.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            rating = ProductRating.objects.get(product_id=pk)
+        except ProductRating.DoesNotExist:
+            if not Product.objects.filter(pk=pk).exists():
+                return Response({'error': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
+            # No approved reviews yet
+            rating = ProductRating(product_id=pk)
+        return Response(ProductRatingSerializer(rating).data, status=status.HTTP_200_OK)
+
 class ProductRecommendationView(generics.ListAPIView):
     """
     API view to get product recommendations based on shared AI tags.
     """
-    serializer_class = ProductSerializer
+    serializer_class = ProductReadSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
 
@@ -242,7 +354,7 @@ class ProductRecommendationView(generics.ListAPIView):
         
         try:
             # Get the product we're finding recommendations for
-            current_product = Product.objects.get(pk=product_id)
+            current_product = Product.objects.only('id', 'category_id', 'ai_tags').get(pk=product_id)
         except Product.DoesNotExist:
             # If the product doesn't exist, return an empty list
             return Product.objects.none()
@@ -250,7 +362,8 @@ class ProductRecommendationView(generics.ListAPIView):
         # Get the AI tags of the current product, if they exist
         if not current_product.ai_tags:
             # Fallback: If no tags, recommend other products from the same category
-            return Product.objects.filter(category=current_product.category).exclude(pk=product_id)[:4]
+            return Product.objects.filter(category_id=current_product.category_id)\
+                .select_related('category', 'rating').exclude(pk=product_id)[:4]
 
         # Split the tags string into a list of individual tags
         current_tags = [tag.strip() for tag in current_product.ai_tags.split(',')]
@@ -268,23 +381,25 @@ class ProductRecommendationView(generics.ListAPIView):
         # 3. Annotate: Count how many tags each product shares
         # 4. Order: Put the products with the most shared tags first
         # 5. Limit: Return only the top 4 recommendations
-        recommended_products = Product.objects.filter(tag_query)\
+        recommended_products = list(Product.objects.filter(tag_query)\
+            .select_related('category', 'rating')\
             .exclude(pk=product_id)\
             .annotate(shared_tags=Count('pk', filter=tag_query))\
-            .order_by('-shared_tags', '-created_at')[:4]
+            .order_by('-shared_tags', '-created_at')[:4])
 
         # Fallback if not enough recommendations are found
-        if recommended_products.count() < 4:
+        if len(recommended_products) < 4:
             # Get IDs of already recommended products to exclude them
-            recommended_ids = list(recommended_products.values_list('id', flat=True))
+            recommended_ids = [product.id for product in recommended_products]
             recommended_ids.append(product_id)
             
             # Get more products from the same category to fill up the list
-            category_products = Product.objects.filter(category=current_product.category)\
-                .exclude(pk__in=recommended_ids)[:4 - recommended_products.count()]
+            category_products = Product.objects.filter(category_id=current_product.category_id)\
+                .select_related('category', 'rating')\
+                .exclude(pk__in=recommended_ids)[:4 - len(recommended_products)]
             
-            # Combine the two querysets
-            recommended_products = list(recommended_products) + list(category_products)
+            # Combine the two lists
+            recommended_products += list(category_products)
 
         return recommended_products
     
@@ -297,28 +412,65 @@ class ProductInventoryInsightView(generics.ListAPIView):
     serializer_class = ProductInventoryInsightSerializer
     pagination_class = None # Show all products on one page for this dashboard
 
+    def list(self, request, *args, **kwargs):
+        # Stock-out predictions are computed for all products in one vectorized pass
+        products = attach_forecast(list(self.get_queryset()))
+        serializer = self.get_serializer(products, many=True)
+        return Response(serializer.data)
+
     def get_queryset(self):
-        # Define the time period for "recent" sales
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-
-        # The main query that aggregates all data
-        queryset = Product.objects.annotate(
-            # Calculate total units sold for all time.
-            # Coalesce ensures that if a product has no sales, it returns 0 instead of None.
-            total_units_sold=Coalesce(
-                Sum('order_items__quantity'),
-                Value(0),
-                output_field=IntegerField()
-            ),
-            # Calculate units sold only in the last 30 days using a filter on the aggregation.
-            sales_last_30_days=Coalesce(
-                Sum(
-                    'order_items__quantity',
-                    filter=Q(order_items__order__created_at__gte=thirty_days_ago)
-                ),
-                Value(0),
-                output_field=IntegerField()
-            )
-        ).order_by('name') # Order alphabetically by default
+        return inventory_insight_queryset()
 
-        return queryset
\ No newline at end of file
+class ProductInventoryExportView(APIView):
+    """
+    An admin-only view that streams the inventory insights of every product
+    as CSV or NDJSON (?output=csv|ndjson), reading the products through a
+    server-side cursor in chunks.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported output format. Use one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        columns = list(ProductInventoryInsightSerializer.Meta.fields)
+        return export_response(self.rows(), columns, export_format, 'inventory-insights')
+
+    def rows(self):
+        forecast = get_catalog_forecast()
+        chunk = []
+        for product in inventory_insight_queryset().iterator(chunk_size=DEFAULT_CHUNK_SIZE):
+            chunk.append(product)
+            if len(chunk) == DEFAULT_CHUNK_SIZE:
+                yield from self.serialize(chunk, forecast)
+                chunk = []
+        if chunk:
+            yield from self.serialize(chunk, forecast)
+
+    def serialize(self, products, forecast):
+        # The forecast is attached a chunk at a time to keep it vectorized
+        attach_forecast(products, forecast)
+        return ProductInventoryInsightSerializer(products, many=True).data
+
+def inventory_insight_queryset():
+    """
+    Products annotated with their lifetime and last-30-days units sold.
+    """
+    # The last 30 days, today included
+    since = timezone.localdate() - timedelta(days=29)
+
+    # The lifetime total is a counter on the product, and the recent sales
+    # read at most 30 rollup rows per product through its (product, date)
+    # key, so the cost of this query depends on the catalog size only
+    recent_sales = ProductDailySales.objects.filter(product=OuterRef('pk'), date__gte=since)\
+        .order_by().values('product').annotate(units=Sum('units_sold')).values('units')
+    queryset = Product.objects.annotate(
+        total_units_sold=F('units_sold'),
+        # Coalesce ensures that if a product has no recent sales, it returns 0 instead of None.
+        sales_last_30_days=Coalesce(Subquery(recent_sales), Value(0), output_field=IntegerField()),
+    ).order_by('name') # Order alphabetically by default
+
+    return queryset
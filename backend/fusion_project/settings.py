@@ -190,6 +190,17 @@ CHANNEL_LAYERS = {
 
 STRIPE_WEBHOOK_SECRET = env('STRIPE_WEBHOOK_SECRET')
 
+# Cache Configuration
+# Used for the catalog response cache. Switch to
+# 'django.core.cache.backends.redis.RedisCache' when running several workers,
+# so that version bumps are seen by every process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fusion-cache',
+    },
+}
+
 # Gemini AI Configuration
 GEMINI_API_KEY = env('GEMINI_API_KEY')
 
@@ -212,6 +223,11 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        # Debounced order summary regeneration
+        'apps.ai_support.summaries': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
         # --- THIS IS THE NEW ADDITION ---
         # This new entry tells Django to capture logs from your new doc_qa signals
         # and print them to the console.
@@ -219,6 +235,21 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'INFO', # Captures INFO, WARNING, ERROR, etc.
         },
+        # Background review moderation worker
+        'apps.products.moderation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        # Asynchronous AI content generation jobs
+        'apps.products.ai_jobs': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        # Stripe order processing and the inbox worker (process_stripe_inbox)
+        'apps.orders': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
     },
 }
 MEDIA_URL = '/media/'
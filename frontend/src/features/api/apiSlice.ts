@@ -12,8 +12,9 @@ import type {
   User,
   Category,
   ProductFormData,
-  Order,
+  OrderHistoryEntry,
   PaginatedResponse,
+  CursorPaginatedResponse,
   AIGeneratedContent,
   Review,
   ProductInventoryInsight,
@@ -41,6 +42,15 @@ export interface Document {
   user_email: string;
 }
 
+// DRF cursor pagination returns `next` as a full URL; only its cursor is sent back
+const ordersUrl = (next?: string | void) => {
+  if (!next) return "/orders/";
+  const cursor = next.includes("cursor=")
+    ? new URL(next, "http://localhost").searchParams.get("cursor")
+    : next;
+  return cursor ? `/orders/?cursor=${encodeURIComponent(cursor)}` : "/orders/";
+};
+
 const baseQuery = fetchBaseQuery({
   baseUrl: "http://127.0.0.1:8000/api",
   prepareHeaders: (headers, { getState }) => {
@@ -217,8 +227,9 @@ export const apiSlice = createApi({
     }),
 
     // --- OTHER QUERIES & MUTATIONS ---
-    getOrders: builder.query<PaginatedResponse<Order>, number | void>({
-      query: (page = 1) => `/orders/?page=${page}`,
+    // Pass the `next` URL of the previous page (or its bare cursor) to load more orders
+    getOrders: builder.query<CursorPaginatedResponse<OrderHistoryEntry>, string | void>({
+      query: ordersUrl,
       providesTags: (result) =>
         result
           ? [
@@ -1,12 +1,12 @@
 // src/pages/OrderHistoryPage.tsx - CORRECTED
 
 import { useGetOrdersQuery } from "../features/api/apiSlice";
-import type { Order } from "../types";
+import type { OrderHistoryEntry } from "../types";
 import { Header } from "../components/Header";
 import { BackButton } from "../components/BackButton";
 import { Link } from "react-router-dom";
 
-function OrderCard({ order }: { order: Order }) {
+function OrderCard({ order }: { order: OrderHistoryEntry }) {
   const orderDate = new Date(order.created_at).toLocaleDateString("en-US", {
     year: "numeric",
     month: "long",
@@ -38,13 +38,13 @@ function OrderCard({ order }: { order: Order }) {
           {order.items.map((item) => (
             <div key={item.id} className="flex items-center space-x-4">
               <img
-                src={item.product.image}
-                alt={item.product.name}
+                src={item.thumbnail ?? undefined}
+                alt={item.name}
                 className="w-20 h-20 object-cover rounded-md border"
               />
               <div className="flex-1">
                 <p className="font-semibold text-gray-900">
-                  {item.product.name}
+                  {item.name}
                 </p>
                 <p className="text-sm text-gray-600">Qty: {item.quantity}</p>
                 <p className="text-sm text-gray-600">
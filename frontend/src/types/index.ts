@@ -69,6 +69,31 @@ export interface PaginatedResponse<T> {
   results: T[];
 }
 
+// Compact order line returned by the order history list
+export interface OrderHistoryItem {
+  id: number;
+  product_id: number;
+  name: string;
+  thumbnail: string | null;
+  price: string;
+  quantity: number;
+}
+
+export interface OrderHistoryEntry {
+  id: number;
+  created_at: string;
+  total_price: string;
+  paid: boolean;
+  items: OrderHistoryItem[];
+}
+
+// Cursor-paginated lists have no total count; follow `next` for more
+export interface CursorPaginatedResponse<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
 export interface Message {
   id: number;
   user: string; // Will be the user's email string